@@ -0,0 +1,167 @@
+"""Stand in for the dirac-dms-* command line tools used by CliEngine
+
+The catalog and storage element are a local directory given by the
+URA_FAKE_DIRAC_ROOT environment variable. Each invocation sleeps
+URA_FAKE_DIRAC_LATENCY seconds first to mimic the start up and round
+trip cost of the real tools.
+
+Outputs mimic the formats printed by the real tools and parsed by
+ura.dirac_engines.CliEngine, e.g. metadata as a pprint dump with
+datetime values.
+
+Usage: fake_dirac.py <command> [args], see install() to put wrappers
+named after each command on the PATH.
+"""
+import os
+import shutil
+import stat
+import sys
+import time
+import uuid
+from datetime import datetime
+from pprint import pformat
+from zlib import adler32
+
+COMMANDS = ("dirac-dms-find-lfns",
+            "dirac-dms-lfn-metadata",
+            "dirac-dms-get-file",
+            "dirac-dms-add-file",
+            "dirac-dms-remove-files")
+
+
+def _pth(lfn):
+    return os.path.join(os.environ["URA_FAKE_DIRAC_ROOT"], lfn.lstrip("/"))
+
+
+def find_lfns(args):
+    path = args[0].split("=", 1)[1]
+    lfns = []
+    for dirpath, dirnames, filenames in os.walk(_pth(path)):
+        rel = os.path.relpath(dirpath, os.environ["URA_FAKE_DIRAC_ROOT"])
+        for name in filenames:
+            lfns.append("/" + os.path.normpath(os.path.join(rel, name)))
+
+    print("Found %d files" % len(lfns))
+    for lfn in sorted(lfns):
+        print(lfn)
+    return 0
+
+
+def lfn_metadata(args):
+    successful = {}
+    failed = {}
+    for lfn in args:
+        pth = _pth(lfn)
+        if os.path.isfile(pth):
+            with open(pth, 'rb') as f:
+                checksum = "%08x" % (adler32(f.read()) & 0xffffffff)
+            st = os.stat(pth)
+            successful[lfn] = dict(Checksum=checksum,
+                                   ChecksumType="Adler32",
+                                   CreationDate=datetime.utcfromtimestamp(int(st.st_ctime)),
+                                   GUID=str(uuid.uuid3(uuid.NAMESPACE_URL, lfn)).upper(),
+                                   Mode=stat.S_IMODE(st.st_mode),
+                                   ModificationDate=datetime.utcfromtimestamp(int(st.st_mtime)),
+                                   Size=long(st.st_size),
+                                   Status="AprioriGood")
+        else:
+            failed[lfn] = "No such file or directory"
+
+    print("Getting metadata of %d files" % len(args))
+    print(pformat(dict(Failed=failed, Successful=successful)))
+    return 0
+
+
+def get_file(args):
+    successful = {}
+    failed = {}
+    for lfn in args:
+        try:
+            shutil.copyfile(_pth(lfn), os.path.basename(lfn))
+            successful[lfn] = os.path.abspath(os.path.basename(lfn))
+        except IOError:
+            failed[lfn] = "No such file or directory"
+
+    print(pformat(dict(Failed=failed, Successful=successful)))
+    return 1 if failed else 0
+
+
+def _add(lfn, pth):
+    dst = _pth(lfn)
+    if os.path.exists(dst):
+        print("ERROR Failed to upload %s: file already exists" % lfn)
+        return False
+
+    if not os.path.isdir(os.path.dirname(dst)):
+        try:
+            os.makedirs(os.path.dirname(dst))
+        except OSError:
+            pass
+    shutil.copyfile(pth, dst)
+    print("Successfully uploaded %s" % lfn)
+    return True
+
+
+def add_file(args):
+    if len(args) == 3:
+        return 0 if _add(args[0], args[1]) else 1
+
+    with open(args[0]) as f:
+        items = [line.split() for line in f if line.strip()]
+
+    for lfn, pth, se in items:
+        _add(lfn, pth)
+    return 0
+
+
+def remove_files(args):
+    failed = []
+    for lfn in args:
+        try:
+            os.remove(_pth(lfn))
+        except OSError:
+            failed.append(lfn)
+
+    for lfn in failed:
+        print("Failed to remove %s: no such file" % lfn)
+    if len(failed) == 0:
+        print("Successfully removed %d files" % len(args))
+    return 0
+
+
+def install(bin_dir, latency=0.):
+    """Create executable wrappers for each command.
+
+    Args:
+        bin_dir: (str) directory to put on the PATH
+        latency: (float) delay in seconds of each invocation
+
+    Returns:
+        (dict): environment variables to set besides PATH
+    """
+    script = os.path.abspath(__file__)
+    if script.endswith(".pyc"):
+        script = script[:-1]
+
+    for cmd in COMMANDS:
+        pth = os.path.join(bin_dir, cmd)
+        with open(pth, 'w') as f:
+            f.write('#!/bin/sh\nexec "%s" "%s" %s "$@"\n' % (sys.executable, script, cmd))
+        os.chmod(pth, os.stat(pth).st_mode | stat.S_IEXEC)
+
+    return {"URA_FAKE_DIRAC_LATENCY": str(latency)}
+
+
+def main(argv):
+    time.sleep(float(os.environ.get("URA_FAKE_DIRAC_LATENCY", "0")))
+    cmd, args = argv[0], argv[1:]
+    func = {"dirac-dms-find-lfns": find_lfns,
+            "dirac-dms-lfn-metadata": lfn_metadata,
+            "dirac-dms-get-file": get_file,
+            "dirac-dms-add-file": add_file,
+            "dirac-dms-remove-files": remove_files}[cmd]
+    return func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
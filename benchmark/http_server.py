@@ -0,0 +1,147 @@
+"""In process HTTP server used as a stand in for remote endpoints
+
+Resources are files below a local directory:
+
+ - GET and HEAD serve them, honoring Range headers, with Content-Length,
+   Last-Modified and ETag headers
+ - POST stores the body, plain or sent with chunked transfer encoding
+"""
+import os
+import shutil
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from email.utils import formatdate
+from SocketServer import ThreadingMixIn
+from threading import Thread
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wbufsize = -1
+    root = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _pth(self):
+        return os.path.join(self.root, self.path.split("?")[0].lstrip("/"))
+
+    def _empty(self, code):
+        self.send_response(code)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _serve(self, body):
+        pth = self._pth()
+        if not os.path.isfile(pth):
+            self._empty(404)
+            return
+
+        st = os.stat(pth)
+        start, end = 0, st.st_size - 1
+        code = 200
+        rng = self.headers.get("Range")
+        if rng is not None and rng.startswith("bytes="):
+            first, last = rng[6:].split("-")
+            start = int(first)
+            if last:
+                end = min(end, int(last))
+            if start >= st.st_size:
+                self._empty(416)
+                return
+            code = 206
+
+        self.send_response(code)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Last-Modified", formatdate(st.st_mtime, usegmt=True))
+        self.send_header("ETag", '"%x-%x"' % (st.st_size, int(st.st_mtime * 1e6)))
+        if code == 206:
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, end, st.st_size))
+        self.end_headers()
+
+        if body:
+            with open(pth, 'rb') as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = f.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+
+    def do_HEAD(self):
+        self._serve(False)
+
+    def do_GET(self):
+        self._serve(True)
+
+    def _iter_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return
+                yield self.rfile.read(size)
+                self.rfile.readline()
+        else:
+            remaining = int(self.headers.get("Content-Length", 0))
+            while remaining > 0:
+                chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    return
+                yield chunk
+                remaining -= len(chunk)
+
+    def do_POST(self):
+        pth = self._pth()
+        if not os.path.isdir(os.path.dirname(pth)):
+            os.makedirs(os.path.dirname(pth))
+        with open(pth, 'wb') as f:
+            for chunk in self._iter_body():
+                f.write(chunk)
+        self._empty(201)
+
+
+class LocalHTTPServer(object):
+    """Serve a local directory from a background thread.
+
+    Args:
+        root: (str) directory holding resources
+        handler: (class) subclass of Handler used to answer requests
+    """
+
+    def __init__(self, root, handler=Handler):
+        class BoundHandler(handler):
+            pass
+
+        BoundHandler.root = root
+        self.root = root
+        self.server = _Server(("127.0.0.1", 0), BoundHandler)
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def clear(self):
+        """Remove all resources.
+        """
+        for name in os.listdir(self.root):
+            pth = os.path.join(self.root, name)
+            if os.path.isdir(pth):
+                shutil.rmtree(pth)
+            else:
+                os.remove(pth)
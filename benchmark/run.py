@@ -0,0 +1,310 @@
+"""Measure throughput and latency of api operations on every backend
+
+Backends are exercised against local stand ins:
+
+ - local: files in a temporary directory on real disk
+ - http: in process server (see http_server.py) through requests_api
+ - dirac: CliEngine running fake dirac-dms-* tools (see fake_dirac.py)
+   with a configurable latency per invocation
+
+For each backend, payload size and number of files, every operation is
+timed on each file (bulk operations once for all files). Results are
+written as JSON so runs made on different commits can be compared:
+
+    python benchmark/run.py -o before.json
+    # change code
+    python benchmark/run.py -o after.json --compare before.json
+"""
+import json
+import os
+import platform
+import sys
+from argparse import ArgumentParser
+from shutil import rmtree
+from subprocess import check_output
+from tempfile import mkdtemp
+from time import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ura import api, bulk, dirac_api, requests_api  # noqa: E402
+from ura.dirac_engines import CliEngine  # noqa: E402
+
+import fake_dirac  # noqa: E402
+from http_server import LocalHTTPServer  # noqa: E402
+
+OPERATIONS = ("write", "exists", "stat", "read", "read_range", "open_read",
+              "ls", "bulk_exists", "bulk_read", "remove")
+
+
+class LocalSetup(object):
+    name = "local"
+
+    def __enter__(self):
+        self.root = mkdtemp()
+        self.base = self.root
+        return self
+
+    def __exit__(self, *args):
+        rmtree(self.root)
+
+    def prepare(self, dir_url):
+        os.makedirs(dir_url)
+
+    def clear(self):
+        rmtree(self.root)
+        os.mkdir(self.root)
+
+
+class HttpSetup(object):
+    name = "http"
+
+    def __enter__(self):
+        self.root = mkdtemp()
+        self.server = LocalHTTPServer(self.root).__enter__()
+        self.base = self.server.url
+        return self
+
+    def __exit__(self, *args):
+        self.server.__exit__(*args)
+        requests_api.set_session(None)
+        rmtree(self.root)
+
+    def prepare(self, dir_url):
+        pass
+
+    def clear(self):
+        self.server.clear()
+
+
+class DiracSetup(object):
+    name = "dirac"
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __enter__(self):
+        self.root = mkdtemp()
+        self.bin_dir = os.path.join(self.root, "bin")
+        self.store = os.path.join(self.root, "store")
+        os.mkdir(self.bin_dir)
+        os.mkdir(self.store)
+
+        self.environ = dict(os.environ)
+        os.environ.update(fake_dirac.install(self.bin_dir, self.latency))
+        os.environ["URA_FAKE_DIRAC_ROOT"] = self.store
+        os.environ["PATH"] = self.bin_dir + os.pathsep + os.environ["PATH"]
+        dirac_api.set_engine(CliEngine())
+        self.base = "dirac://"
+        return self
+
+    def __exit__(self, *args):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        dirac_api.set_engine(None)
+        rmtree(self.root)
+
+    def prepare(self, dir_url):
+        pass
+
+    def clear(self):
+        rmtree(self.store)
+        os.mkdir(self.store)
+        dirac_api.invalidate()
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _summary(backend, op, size, nfiles, latencies, wall, nbytes):
+    return dict(backend=backend, op=op, size=size, files=nfiles,
+                calls=len(latencies),
+                wall=wall,
+                mean=sum(latencies) / len(latencies),
+                p50=_percentile(latencies, 0.5),
+                p95=_percentile(latencies, 0.95),
+                max=max(latencies),
+                bytes_per_s=nbytes / wall if wall > 0 else None)
+
+
+def _timed(func, args_list):
+    """Call func on each set of arguments.
+
+    Returns:
+        (list of float, float): latency of each call and total time
+    """
+    latencies = []
+    t0 = time()
+    for args in args_list:
+        start = time()
+        func(*args)
+        latencies.append(time() - start)
+    return latencies, time() - t0
+
+
+def _consume(url):
+    for chunk in api.open_read(url, binary=True):
+        pass
+
+
+def _run_op(op, urls, dir_url, payload):
+    """Run an operation on all urls.
+
+    Returns:
+        (list of float, float, int): latencies, wall time, bytes moved
+    """
+    size = len(payload)
+    nfiles = len(urls)
+    if op == "write":
+        lat, wall = _timed(api.write, [(url, payload, True) for url in urls])
+        return lat, wall, size * nfiles
+    if op in ("exists", "stat", "remove"):
+        lat, wall = _timed(getattr(api, op), [(url,) for url in urls])
+        return lat, wall, 0
+    if op == "read":
+        lat, wall = _timed(api.read, [(url, True) for url in urls])
+        return lat, wall, size * nfiles
+    if op == "read_range":
+        length = min(size, 4096)
+        lat, wall = _timed(api.read_range, [(url, 0, length, True) for url in urls])
+        return lat, wall, length * nfiles
+    if op == "open_read":
+        lat, wall = _timed(_consume, [(url,) for url in urls])
+        return lat, wall, size * nfiles
+    if op == "ls":
+        lat, wall = _timed(api.ls, [(dir_url,)])
+        return lat, wall, 0
+    if op == "bulk_exists":
+        lat, wall = _timed(lambda: list(bulk.exists_many(urls)), [()])
+        return lat, wall, 0
+    if op == "bulk_read":
+        lat, wall = _timed(lambda: list(bulk.read_many(urls, binary=True)), [()])
+        return lat, wall, size * nfiles
+
+    raise ValueError("unknown operation '%s'" % op)
+
+
+def run_backend(setup, sizes, file_counts, operations):
+    """Benchmark all operations for a backend.
+
+    Returns:
+        (list of dict): one summary per (op, size, files)
+    """
+    results = []
+    for size in sizes:
+        payload = os.urandom(size)
+        for nfiles in file_counts:
+            dir_url = "%s/bench/s%d_n%d" % (setup.base, size, nfiles)
+            urls = ["%s/f%04d.bin" % (dir_url, i) for i in range(nfiles)]
+            setup.prepare(dir_url)
+            for op in operations:
+                try:
+                    lat, wall, nbytes = _run_op(op, urls, dir_url, payload)
+                except NotImplementedError:
+                    continue
+                results.append(_summary(setup.name, op, size, nfiles, lat, wall, nbytes))
+                sys.stderr.write("%-6s %-12s size=%-9d files=%-5d mean=%.5fs p95=%.5fs\n"
+                                 % (setup.name, op, size, nfiles,
+                                    results[-1]['mean'], results[-1]['p95']))
+            setup.clear()
+
+    return results
+
+
+def _commit():
+    try:
+        return check_output(["git", "rev-parse", "HEAD"],
+                            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except Exception:
+        return None
+
+
+def compare(results, reference, threshold):
+    """Report cases slower than in a reference run.
+
+    Args:
+        results: (list of dict) current summaries
+        reference: (list of dict) summaries of reference run
+        threshold: (float) relative slow down reported, e.g. 0.2
+
+    Returns:
+        (list of (dict, float)): regressed cases and their ratio
+    """
+    def key(res):
+        return res['backend'], res['op'], res['size'], res['files']
+
+    ref = dict((key(res), res) for res in reference)
+    regressions = []
+    for res in results:
+        old = ref.get(key(res))
+        if old is not None and old['mean'] > 0:
+            ratio = res['mean'] / old['mean']
+            if ratio > 1 + threshold:
+                regressions.append((res, ratio))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default="local,http,dirac",
+                        help="comma separated list of backends")
+    parser.add_argument("--sizes", default="1024,1048576",
+                        help="comma separated payload sizes in bytes")
+    parser.add_argument("--files", default="1,20",
+                        help="comma separated numbers of files")
+    parser.add_argument("--ops", default=",".join(OPERATIONS),
+                        help="comma separated operations")
+    parser.add_argument("--dirac-latency", type=float, default=0.05,
+                        help="delay in seconds of each fake dirac-dms command")
+    parser.add_argument("-o", "--output", default=None,
+                        help="json file to write results, default stdout")
+    parser.add_argument("--compare", default=None,
+                        help="json file of a reference run")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slow down reported as regression")
+    args = parser.parse_args(argv)
+
+    sizes = [int(v) for v in args.sizes.split(",")]
+    file_counts = [int(v) for v in args.files.split(",")]
+    operations = args.ops.split(",")
+    setups = dict(local=LocalSetup(),
+                  http=HttpSetup(),
+                  dirac=DiracSetup(args.dirac_latency))
+
+    results = []
+    for name in args.backends.split(","):
+        with setups[name] as setup:
+            results.extend(run_backend(setup, sizes, file_counts, operations))
+
+    report = dict(meta=dict(commit=_commit(),
+                            python=platform.python_version(),
+                            platform=platform.platform(),
+                            time=time(),
+                            dirac_latency=args.dirac_latency),
+                  results=results)
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            reference = json.load(f)['results']
+        regressions = compare(results, reference, args.threshold)
+        for res, ratio in regressions:
+            sys.stderr.write("REGRESSION %s %s size=%d files=%d: %.2fx slower\n"
+                             % (res['backend'], res['op'], res['size'], res['files'], ratio))
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""This file contains a non blocking version of the common api
+
+Each function submits the operation to a shared pool of worker threads
+and returns immediately an AsyncResult (see multiprocessing.pool).
+Its 'get' method blocks until the operation is over and either returns
+its result or raises the error raised by the operation.
+
+Operations are dispatched to backends as in api.
+"""
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+
+from . import api, timeouts
+from .stream import DEFAULT_CHUNK_SIZE
+
+MAX_WORKERS = 16
+
+_pool = [None]
+_pool_lock = Lock()
+
+
+def get_pool():
+    """Access the pool of threads shared by all calls of this module.
+
+    Returns:
+        (ThreadPool)
+    """
+    pool = _pool[0]
+    if pool is None:
+        with _pool_lock:
+            if _pool[0] is None:
+                _pool[0] = ThreadPool(MAX_WORKERS)
+            pool = _pool[0]
+
+    return pool
+
+
+def set_max_workers(nb):
+    """Change the max number of operations running concurrently.
+
+    Warnings: operations already submitted are finished on the old pool.
+
+    Args:
+        nb: (int) number of worker threads
+
+    Returns:
+        None
+    """
+    global MAX_WORKERS
+
+    with _pool_lock:
+        MAX_WORKERS = nb
+        old = _pool[0]
+        _pool[0] = None
+
+    if old is not None:
+        old.close()
+
+
+def submit(func, *args, **kwds):
+    """Run any function in the shared pool.
+
+    Args:
+        func: (callable) function to call
+        args: (list) positional arguments for func
+        kwds: (dict) keyword arguments for func, 'callback' is
+              reserved to pass a function called with the result
+              once available
+
+    Returns:
+        (AsyncResult)
+    """
+    callback = kwds.pop('callback', None)
+    return get_pool().apply_async(timeouts.propagate(func), args, kwds, callback)
+
+
+def ls(url, callback=None):
+    """List all available resources at the given location
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        callback: (callable) called with the result when available
+
+    Returns:
+        (AsyncResult): of (list of (url, Bool)), see api.ls
+    """
+    return submit(api.ls, url, callback=callback)
+
+
+def exists(url, callback=None):
+    """Check the existence of a resource.
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        callback: (callable) called with the result when available
+
+    Returns:
+        (AsyncResult): of (Bool), see api.exists
+    """
+    return submit(api.exists, url, callback=callback)
+
+
+def touch(url, callback=None):
+    """Create a resource.
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        callback: (callable) called with the result when available
+
+    Returns:
+        (AsyncResult): of (Bool), see api.touch
+    """
+    return submit(api.touch, url, callback=callback)
+
+
+def remove(url, callback=None):
+    """Remove a resource.
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        callback: (callable) called with the result when available
+
+    Returns:
+        (AsyncResult): of (Bool), see api.remove
+    """
+    return submit(api.remove, url, callback=callback)
+
+
+def read(url, binary=False, callback=None):
+    """Read the content of a resource.
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        binary: (Bool) whether to open the resource as a binary file
+        callback: (callable) called with the result when available
+
+    Returns:
+        (AsyncResult): of (string|ByteArray), see api.read
+    """
+    return submit(api.read, url, binary, callback=callback)
+
+
+def write(url, content, binary=False, callback=None):
+    """Write the content in a resource.
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        content: (string|ByteArray) content of the resource
+        binary: (Bool) whether to write the resource as a binary file
+        callback: (callable) called with the result when available
+
+    Returns:
+        (AsyncResult): see api.write
+    """
+    return submit(api.write, url, content, binary, callback=callback)
+
+
+def write_stream(url, content, binary=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                 callback=None):
+    """Write content provided chunk by chunk in a resource.
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        content: (file|iter of string|ByteArray) either a file like
+                 object opened for reading or an iterable of chunks
+        binary: (Bool) whether to write the resource as a binary file
+        chunk_size: (int) max size of chunks read from file like objects
+        callback: (callable) called with the result when available
+
+    Returns:
+        (AsyncResult): see api.write_stream
+    """
+    return submit(api.write_stream, url, content, binary, chunk_size,
+                  callback=callback)
@@ -1,6 +1,154 @@
 """This file contains the common api to access resources
+
+Each function dispatches the url to the backend registered for its
+scheme. Backends are plain modules exposing the same functions
+(see local_api, requests_api, dirac_api). They are imported lazily
+the first time a url with their scheme is used and kept afterward.
+
+Third party backends can be declared through the 'ura.backends'
+entry point group, the entry point name being the scheme.
+
+Remote operations are retried according to the policy associated to
+their scheme (see retry module) and bounded by the current deadline
+(see timeouts module).
 """
+from importlib import import_module
+from threading import Lock
 from urllib2 import URLError
+from urlparse import SplitResult, urlsplit
+
+from . import metrics, retry, timeouts
+from .stream import DEFAULT_CHUNK_SIZE
+
+ENTRY_POINT_GROUP = "ura.backends"
+
+# scheme -> dotted name of module, module or entry point
+_backends = {
+    "": "ura.local_api",
+    "file": "ura.local_api",
+    "http": "ura.requests_api",
+    "https": "ura.requests_api",
+    "dirac": "ura.dirac_api",
+}
+
+# scheme -> imported module, filled on first use of each scheme
+_resolved = {}
+
+_entry_points_loaded = [False]
+_lock = Lock()
+
+
+def register_backend(scheme, backend):
+    """Associate a backend to a given url scheme.
+
+    Args:
+        scheme: (str) url scheme, e.g. 'http'
+        backend: (module|str) module implementing the api or
+                 dotted name of this module to import it lazily
+
+    Returns:
+        None
+    """
+    with _lock:
+        scheme = scheme.lower()
+        _backends[scheme] = backend
+        for key in [key for key in _resolved if key.lower() == scheme]:
+            del _resolved[key]
+
+
+def _load_entry_points():
+    """Register backends declared through entry points.
+
+    Backends explicitly registered take precedence.
+
+    Returns:
+        None
+    """
+    _entry_points_loaded[0] = True
+    try:
+        from pkg_resources import iter_entry_points
+    except ImportError:
+        return
+
+    for ep in iter_entry_points(ENTRY_POINT_GROUP):
+        _backends.setdefault(ep.name.lower(), ep)
+
+
+def get_backend(url):
+    """Find the backend associated to the scheme of the url.
+
+    Raises: URLError if no backend is associated to this scheme
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+
+    Returns:
+        (module): backend implementing the api
+    """
+    try:
+        return _resolved[url.scheme]
+    except KeyError:
+        pass
+
+    with _lock:
+        scheme = url.scheme.lower()
+        backend = _backends.get(scheme)
+        if backend is None and not _entry_points_loaded[0]:
+            _load_entry_points()
+            backend = _backends.get(scheme)
+
+        if backend is None:
+            raise URLError("no backend for scheme '%s'" % scheme)
+
+        if isinstance(backend, basestring):
+            backend = import_module(backend)
+        elif hasattr(backend, "load"):  # entry point
+            backend = backend.load()
+
+        _resolved[url.scheme] = backend
+
+    return backend
+
+
+def _split(url):
+    """Ensure url is a split result.
+
+    Args:
+        url: (str|urlparse.SplitResult) Resource locator
+
+    Returns:
+        (urlparse.SplitResult)
+    """
+    if isinstance(url, SplitResult):
+        return url
+
+    return urlsplit(url)
+
+
+def _call(op, url, args):
+    """Dispatch an operation to the backend of the url.
+
+    Args:
+        op: (str) name of operation
+        url: (urlparse.SplitResult) Resource locator
+        args: (tuple) arguments of the operation
+
+    Raises: URLError if current deadline has expired
+
+    Returns:
+        (any): result of operation
+    """
+    timeouts.remaining()  # fail fast once deadline has expired
+    backend = get_backend(url)
+    func = getattr(backend, op)
+    policy = retry._policies.get(url.scheme)
+    if policy is not None:
+        func = policy.wrap(op, func)
+
+    if not metrics._enabled[0]:
+        return func(*args)
+
+    return metrics.measure(backend, op, url, func, args)
 
 
 def ls(url):
@@ -15,8 +163,27 @@ def ls(url):
         (list of (url, Bool)): list of urls and flag set to True
                                if url is a directory like resource.
     """
-    del url
-    raise NotImplementedError
+    url = _split(url)
+    return _call("ls", url, (url,))
+
+
+def walk(url, max_depth=None, pattern=None):
+    """Recursively iterate over all resources below the given location
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        max_depth: (int) max depth of resources to visit, 1 means
+                   direct children only, None means no limit
+        pattern: (str) only yield resources whose name match this
+                 shell like pattern (e.g. '*.txt'), all directories
+                 are visited anyway
+
+    Returns:
+        (iter of (url, Bool)): urls and flag set to True
+                               if url is a directory like resource.
+    """
+    url = _split(url)
+    return _call("walk", url, (url, max_depth, pattern))
 
 
 def exists(url):
@@ -28,8 +195,25 @@ def exists(url):
     Returns:
         (Bool): True if resource is accessible
     """
-    del url
-    raise NotImplementedError
+    url = _split(url)
+    return _call("exists", url, (url,))
+
+
+def stat(url):
+    """Fetch metadata associated to a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+
+    Returns:
+        (dict): with keys 'size' (int), 'mtime' (float, seconds since
+                epoch) and 'etag' (str), None if backend do not provide
+                this information
+    """
+    url = _split(url)
+    return _call("stat", url, (url,))
 
 
 def touch(url):
@@ -44,8 +228,8 @@ def touch(url):
     Returns:
         (Bool): operation has been successful
     """
-    del url
-    raise NotImplementedError
+    url = _split(url)
+    return _call("touch", url, (url,))
 
 
 def remove(url):
@@ -59,14 +243,14 @@ def remove(url):
     Returns:
         (Bool): operation has been successful
     """
-    del url
-    raise NotImplementedError
+    url = _split(url)
+    return _call("remove", url, (url,))
 
 
 def read(url, binary=False):
     """Read the content of a resource.
 
-    Raises: IOError if resource is not accessible
+    Raises: URLError if resource is not accessible
 
     Args:
         url: (urlparse.SplitResult) Resource locator
@@ -75,15 +259,50 @@ def read(url, binary=False):
     Returns:
         (string|ByteArray): content of the resource
     """
-    del url
-    del binary
-    raise NotImplementedError
+    url = _split(url)
+    return _call("read", url, (url, binary))
+
+
+def read_range(url, offset, length=None, binary=False):
+    """Read part of the content of a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        offset: (int) position of first byte to read
+        length: (int) max number of bytes to read, None means
+                up to the end of the resource
+        binary: (Bool) whether to open the resource as a binary file
+
+    Returns:
+        (string|ByteArray): requested part of the content
+    """
+    url = _split(url)
+    return _call("read_range", url, (url, offset, length, binary))
+
+
+def open_read(url, binary=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read the content of a resource chunk by chunk.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        binary: (Bool) whether to open the resource as a binary file
+        chunk_size: (int) max size of each chunk
+
+    Returns:
+        (iter of string|ByteArray): successive chunks of content
+    """
+    url = _split(url)
+    return _call("open_read", url, (url, binary, chunk_size))
 
 
 def write(url, content, binary=False):
     """Write the content in a resource.
 
-    Raises: IOError if resource is not accessible
+    Raises: URLError if resource is not accessible
 
     Args:
         url: (urlparse.SplitResult) Resource locator
@@ -93,7 +312,62 @@ def write(url, content, binary=False):
     Returns:
         (None)
     """
-    del url
-    del content
-    del binary
-    raise NotImplementedError
+    url = _split(url)
+    return _call("write", url, (url, content, binary))
+
+
+def write_stream(url, content, binary=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write content provided chunk by chunk in a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        content: (file|iter of string|ByteArray) either a file like
+                 object opened for reading or an iterable of chunks
+        binary: (Bool) whether to write the resource as a binary file
+        chunk_size: (int) max size of chunks read from file like objects
+
+    Returns:
+        (None)
+    """
+    url = _split(url)
+    return _call("write_stream", url, (url, content, binary, chunk_size))
+
+
+def upload(local_pth, url):
+    """Send the content of a local file into a resource.
+
+    The file is streamed or handed over directly to the backend,
+    never loaded in memory.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        local_pth: (str) path to local file
+        url: (urlparse.SplitResult) Resource locator
+
+    Returns:
+        (None)
+    """
+    url = _split(url)
+    return _call("upload", url, (local_pth, url))
+
+
+def download(url, local_pth):
+    """Store the content of a resource into a local file.
+
+    The content is streamed or moved directly in place, never loaded
+    in memory.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        local_pth: (str) path to local file, overwritten if it exists
+
+    Returns:
+        None
+    """
+    url = _split(url)
+    return _call("download", url, (url, local_pth))
@@ -0,0 +1,304 @@
+"""This file contains functions operating on many resources at once
+
+Operations are run concurrently by a shared pool of threads. Each
+function yields a (url, result, error) tuple per item, error being
+the exception raised by the operation on this item (result is then
+None) so a single failure do not abort the whole batch.
+
+Backends exposing batch functions (e.g. dirac_api.exists_many) receive
+their urls grouped in batches of BATCH_SIZE (module attribute of the
+backend) handled by a single call. Batch functions only handle file like
+resources, directory like ones (path ending with '/') are always
+dispatched one by one. Batch calls go through the api front end like
+single ones (deadline, retry policy, metrics), recorded under the name
+of the batch function and the url of the first item.
+"""
+import sys
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+from threading import Lock
+from urllib2 import URLError
+
+from . import api, timeouts
+
+MAX_WORKERS = 8
+POOL_SIZE = 32
+
+_pool = [None]
+_pool_lock = Lock()
+
+
+def get_pool():
+    """Access the pool of threads shared by bulk and recursive operations.
+
+    Created on first use so calls do not pay the start up and shut down
+    of their own threads.
+
+    Warnings: jobs run in this pool must not wait for other jobs of
+    this pool, e.g. by calling bulk functions.
+
+    Returns:
+        (ThreadPool)
+    """
+    pool = _pool[0]
+    if pool is None:
+        with _pool_lock:
+            if _pool[0] is None:
+                _pool[0] = ThreadPool(POOL_SIZE)
+            pool = _pool[0]
+
+    return pool
+
+
+def set_pool_size(nb):
+    """Change the number of threads of the shared pool.
+
+    Warnings: jobs already submitted are finished on the old pool.
+
+    Args:
+        nb: (int) number of worker threads
+
+    Returns:
+        None
+    """
+    global POOL_SIZE
+
+    with _pool_lock:
+        POOL_SIZE = nb
+        old = _pool[0]
+        _pool[0] = None
+
+    if old is not None:
+        old.close()
+
+
+def _guarded(func, arg):
+    """Call func and catch any error to report it to the caller.
+    """
+    try:
+        return True, func(arg)
+    except Exception:
+        return False, sys.exc_info()
+
+
+def imap_unordered(func, args, max_workers=MAX_WORKERS):
+    """Apply a function on each argument in the shared pool.
+
+    At most max_workers calls run concurrently for this map. Limits and
+    deadline of the calling thread are propagated to workers.
+
+    Args:
+        func: (callable) function of a single argument
+        args: (iter of any) arguments
+        max_workers: (int) max number of concurrent calls
+
+    Returns:
+        (iter of any): results as soon as they are available
+    """
+    func = timeouts.propagate(func)
+    pool = get_pool()
+    done = Queue()
+    args = iter(args)
+    running = 0
+    exhausted = False
+    while True:
+        while not exhausted and running < max_workers:
+            try:
+                arg = next(args)
+            except StopIteration:
+                exhausted = True
+                break
+            pool.apply_async(_guarded, (func, arg), callback=done.put)
+            running += 1
+
+        if running == 0:
+            return
+
+        ok, res = done.get()
+        running -= 1
+        if not ok:
+            raise res[0], res[1], res[2]
+        yield res
+
+
+def _single_job(func, ind, url, extra):
+    """Apply an operation on a single resource and catch any error.
+
+    Returns:
+        (list of (int, (url, any, Exception)))
+    """
+    try:
+        return [(ind, (url, func(url, *extra), None))]
+    except Exception as e:
+        return [(ind, (url, None, e))]
+
+
+def _batch_job(op, batch_args, inds, items):
+    """Apply a batch operation on many resources and catch any error.
+
+    Returns:
+        (list of (int, (url, any, Exception)))
+    """
+    try:
+        return zip(inds, api._call(op, items[0][0], batch_args(items)))
+    except Exception as e:
+        return [(ind, (url, None, e)) for ind, (url, extra) in zip(inds, items)]
+
+
+def _call(job):
+    """Run a job in a worker thread.
+    """
+    func, args = job
+    return func(*args)
+
+
+def _jobs(op, batch_args, items):
+    """Split items into jobs, grouping items whose backend provides
+    a batch version of the operation.
+
+    Args:
+        op: (str) name of operation in api
+        batch_args: (callable) function taking a list of (url, extra)
+                    and returning arguments of the batch operation
+        items: (iter of (url, list)) url and extra arguments
+
+    Returns:
+        (list of (callable, tuple)): jobs
+    """
+    single = getattr(api, op)
+    jobs = []
+    groups = {}
+    for ind, (url, extra) in enumerate(items):
+        url = api._split(url)
+        try:
+            backend = api.get_backend(url)
+        except URLError:  # error will be reported by single job
+            backend = None
+
+        if hasattr(backend, op + "_many") and not url.path.endswith("/"):
+            groups.setdefault(backend, []).append((ind, (url, extra)))
+        else:
+            jobs.append((_single_job, (single, ind, url, extra)))
+
+    for backend, group in groups.items():
+        size = getattr(backend, "BATCH_SIZE", len(group))
+        for i in range(0, len(group), size):
+            inds, batch = zip(*group[i:i + size])
+            jobs.append((_batch_job, (op + "_many", batch_args, inds, list(batch))))
+
+    return jobs
+
+
+def run_many(op, batch_args, items, max_workers=MAX_WORKERS, ordered=True):
+    """Apply an operation on many resources concurrently.
+
+    Args:
+        op: (str) name of operation in api
+        batch_args: (callable) function taking a list of (url, extra)
+                    and returning arguments of the batch operation
+        items: (iter of (url, list)) url and extra arguments to pass
+               to the operation for each resource
+        max_workers: (int) max number of concurrent operations
+        ordered: (Bool) whether to yield results in the order of items
+                 or as soon as they are available
+
+    Returns:
+        (iter of (url, any, Exception)): url, result and error for
+                                         each item
+    """
+    jobs = _jobs(op, batch_args, items)
+    if len(jobs) == 0:
+        return
+
+    pending = {}
+    next_ind = 0
+    for res in imap_unordered(_call, jobs, max_workers):
+        for ind, ret in res:
+            if ordered:
+                pending[ind] = ret
+            else:
+                yield ret
+
+        while next_ind in pending:
+            yield pending.pop(next_ind)
+            next_ind += 1
+
+
+def exists_many(urls, max_workers=MAX_WORKERS, ordered=True):
+    """Check the existence of many resources.
+
+    Args:
+        urls: (iter of urlparse.SplitResult) Resource locators
+        max_workers: (int) max number of concurrent operations
+        ordered: (Bool) whether to yield results in the order of urls
+                 or as soon as they are available
+
+    Returns:
+        (iter of (url, Bool, Exception)): see api.exists
+    """
+    def batch_args(batch):
+        return ([url for url, extra in batch],)
+
+    return run_many("exists", batch_args, ((url, ()) for url in urls),
+                    max_workers, ordered)
+
+
+def read_many(urls, binary=False, max_workers=MAX_WORKERS, ordered=True):
+    """Read the content of many resources.
+
+    Args:
+        urls: (iter of urlparse.SplitResult) Resource locators
+        binary: (Bool) whether to open the resources as binary files
+        max_workers: (int) max number of concurrent operations
+        ordered: (Bool) whether to yield results in the order of urls
+                 or as soon as they are available
+
+    Returns:
+        (iter of (url, string|ByteArray, Exception)): see api.read
+    """
+    def batch_args(batch):
+        return [url for url, extra in batch], binary
+
+    return run_many("read", batch_args, ((url, (binary,)) for url in urls),
+                    max_workers, ordered)
+
+
+def write_many(items, binary=False, max_workers=MAX_WORKERS, ordered=True):
+    """Write content in many resources.
+
+    Args:
+        items: (iter of (url, string|ByteArray)) resource locator and
+               associated content
+        binary: (Bool) whether to write the resources as binary files
+        max_workers: (int) max number of concurrent operations
+        ordered: (Bool) whether to yield results in the order of items
+                 or as soon as they are available
+
+    Returns:
+        (iter of (url, any, Exception)): see api.write
+    """
+    def batch_args(batch):
+        return [(url, extra[0]) for url, extra in batch], binary
+
+    return run_many("write", batch_args,
+                    ((url, (content, binary)) for url, content in items),
+                    max_workers, ordered)
+
+
+def remove_many(urls, max_workers=MAX_WORKERS, ordered=True):
+    """Remove many resources.
+
+    Args:
+        urls: (iter of urlparse.SplitResult) Resource locators
+        max_workers: (int) max number of concurrent operations
+        ordered: (Bool) whether to yield results in the order of urls
+                 or as soon as they are available
+
+    Returns:
+        (iter of (url, Bool, Exception)): see api.remove
+    """
+    def batch_args(batch):
+        return ([url for url, extra in batch],)
+
+    return run_many("remove", batch_args, ((url, ()) for url in urls),
+                    max_workers, ordered)
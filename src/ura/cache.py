@@ -0,0 +1,358 @@
+"""This file contains a caching layer for metadata of resources
+
+A CachedBackend wraps any backend (or the api front end itself) and
+memoizes results of exists, ls and stat, including negative answers.
+Entries expire after a delay that can be set per url scheme and the
+least recently used ones are evicted when the cache is full.
+
+Writes made through the wrapper, including batch ones (write_many,
+remove_many), invalidate the entries of the modified resource, of its
+descendants and of all its ancestors. Batch exists_many only asks the
+backend for urls not already in cache.
+
+Can be registered as a backend itself, e.g.:
+
+    api.register_backend("dirac", CachedBackend(dirac_api))
+"""
+import posixpath
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from urllib2 import URLError
+
+from . import api
+from .stream import DEFAULT_CHUNK_SIZE
+
+
+class CachedBackend(object):
+    """Memoize metadata queries made to a backend.
+
+    Args:
+        backend: (module) backend to wrap, default to api front end
+        maxsize: (int) max number of entries in cache
+        ttl: (float) default delay in seconds before entries expire
+        ttls: (dict of str: float) specific delay for some url schemes
+    """
+
+    def __init__(self, backend=api, maxsize=1024, ttl=60., ttls=None):
+        self.backend = backend
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __getattr__(self, name):
+        # operations not cached are forwarded to the backend
+        func = getattr(self.backend, name)
+        if name == 'exists_many':
+            return self._exists_many
+        if name == 'write_many':
+            return lambda items, *args: self._invalidating(
+                func, [url for url, content in items], items, *args)
+        if name == 'remove_many':
+            return lambda urls, *args: self._invalidating(func, urls, urls, *args)
+
+        return func
+
+    def stats(self):
+        """Counters of cache efficiency.
+
+        Returns:
+            (dict): with keys 'hits', 'misses' and 'size'
+        """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, size=len(self._entries))
+
+    def clear(self):
+        """Forget all entries.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, url):
+        """Forget entries related to a resource.
+
+        Entries of the resource itself, of its descendants and of all
+        its ancestors (e.g. created by the write) are removed.
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+
+        Returns:
+            None
+        """
+        url = api._split(url)
+        pth = url.path.rstrip("/")
+        base = url._replace(path=pth).geturl()
+        prefix = url._replace(path=pth + "/").geturl()
+        ancestors = set()
+        while pth not in ("", "/"):
+            pth = posixpath.dirname(pth)
+            ancestors.add(url._replace(path=pth).geturl())
+            ancestors.add(url._replace(path=pth.rstrip("/") + "/").geturl())
+
+        with self._lock:
+            for key in list(self._entries):
+                op, key_url = key
+                if key_url == base or key_url.startswith(prefix) or key_url in ancestors:
+                    del self._entries[key]
+
+    def _invalidating(self, func, urls, *args):
+        """Call a batch write then invalidate all resources it touched.
+        """
+        try:
+            return func(*args)
+        finally:
+            for url in urls:
+                self.invalidate(url)
+
+    def _lookup(self, key):
+        """Fetch a valid entry and count hits and misses.
+
+        Returns:
+            (float, any, URLError): entry, None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > time():
+                self._entries[key] = entry  # most recently used
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            return None
+
+    def _store(self, key, scheme, value, error):
+        """Add an entry and evict least recently used ones.
+        """
+        ttl = self.ttls.get(scheme, self.ttl)
+        with self._lock:
+            self._entries[key] = (time() + ttl, value, error)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _cached(self, op, url):
+        """Fetch result of an operation from cache or from backend.
+
+        Args:
+            op: (str) name of operation
+            url: (urlparse.SplitResult) Resource locator
+
+        Returns:
+            (any): result of operation
+        """
+        url = api._split(url)
+        key = (op, url.geturl())
+        entry = self._lookup(key)
+        if entry is not None:
+            expire, value, error = entry
+        else:
+            try:
+                value, error = getattr(self.backend, op)(url), None
+            except URLError as e:
+                value, error = None, e
+
+            self._store(key, url.scheme, value, error)
+
+        if error is not None:
+            raise error
+
+        return value
+
+    def _exists_many(self, urls):
+        """Check the existence of many resources, asking the backend
+        only for those not in cache.
+
+        Args:
+            urls: (list of urlparse.SplitResult) Resource locators
+
+        Returns:
+            (list of (url, Bool, Exception)): see bulk.exists_many
+        """
+        urls = list(urls)
+        ret = [None] * len(urls)
+        missing = []
+        for ind, url in enumerate(urls):
+            entry = self._lookup(("exists", url.geturl()))
+            if entry is None:
+                missing.append(ind)
+            else:
+                expire, value, error = entry
+                ret[ind] = (url, value, error)
+
+        if len(missing) > 0:
+            res = self.backend.exists_many([urls[ind] for ind in missing])
+            for ind, (url, value, error) in zip(missing, res):
+                if error is None or isinstance(error, URLError):
+                    self._store(("exists", url.geturl()), url.scheme, value, error)
+                ret[ind] = (url, value, error)
+
+        return ret
+
+    def ls(self, url):
+        """List all available resources at the given location
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+
+        Returns:
+            (list of (url, Bool)): see api.ls
+        """
+        return self._cached("ls", url)
+
+    def exists(self, url):
+        """Check the existence of a resource.
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+
+        Returns:
+            (Bool): True if resource is accessible
+        """
+        return self._cached("exists", url)
+
+    def stat(self, url):
+        """Fetch metadata associated to a resource.
+
+        Raises: URLError if resource is not accessible
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+
+        Returns:
+            (dict): see api.stat
+        """
+        return self._cached("stat", url)
+
+    def touch(self, url):
+        """Create a resource.
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+
+        Returns:
+            (Bool): operation has been successful
+        """
+        try:
+            return self.backend.touch(url)
+        finally:
+            self.invalidate(url)
+
+    def remove(self, url):
+        """Remove a resource.
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+
+        Returns:
+            (Bool): operation has been successful
+        """
+        try:
+            return self.backend.remove(url)
+        finally:
+            self.invalidate(url)
+
+    def write(self, url, content, binary=False):
+        """Write the content in a resource.
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+            content: (string|ByteArray) content of the resource
+            binary: (Bool) whether to write the resource as a binary file
+
+        Returns:
+            see api.write
+        """
+        try:
+            return self.backend.write(url, content, binary)
+        finally:
+            self.invalidate(url)
+
+    def write_stream(self, url, content, binary=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Write content provided chunk by chunk in a resource.
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+            content: (file|iter of string|ByteArray) either a file like
+                     object opened for reading or an iterable of chunks
+            binary: (Bool) whether to write the resource as a binary file
+            chunk_size: (int) max size of chunks read from file like objects
+
+        Returns:
+            see api.write_stream
+        """
+        try:
+            return self.backend.write_stream(url, content, binary, chunk_size)
+        finally:
+            self.invalidate(url)
+
+    def upload(self, local_pth, url, *args, **kwds):
+        """Send the content of a local file into a resource.
+
+        Args:
+            local_pth: (str) path to local file
+            url: (urlparse.SplitResult) Resource locator
+            args, kwds: extra arguments of backend upload
+
+        Returns:
+            see backend upload
+        """
+        try:
+            return self.backend.upload(local_pth, url, *args, **kwds)
+        finally:
+            self.invalidate(url)
+
+    def download(self, url, local_pth):
+        """Store the content of a resource into a local file.
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+            local_pth: (str) path to local file, overwritten if it exists
+
+        Returns:
+            see backend download
+        """
+        try:
+            return self.backend.download(url, local_pth)
+        finally:
+            self.invalidate(local_pth)
+
+    def copy(self, src, dst, *args, **kwds):
+        """Copy a resource, see backend copy.
+
+        Args:
+            src: (urlparse.SplitResult) Resource locator of source
+            dst: (urlparse.SplitResult) Resource locator of destination
+            args, kwds: extra arguments of backend copy
+
+        Returns:
+            see backend copy
+        """
+        try:
+            return self.backend.copy(src, dst, *args, **kwds)
+        finally:
+            self.invalidate(dst)
+
+    def move(self, src, dst, *args, **kwds):
+        """Move a resource, see backend move.
+
+        Args:
+            src: (urlparse.SplitResult) Resource locator of source
+            dst: (urlparse.SplitResult) Resource locator of destination
+            args, kwds: extra arguments of backend move
+
+        Returns:
+            see backend move
+        """
+        try:
+            return self.backend.move(src, dst, *args, **kwds)
+        finally:
+            self.invalidate(src)
+            self.invalidate(dst)
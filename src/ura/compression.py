@@ -0,0 +1,391 @@
+"""This file contains a codec layer to compress content of resources
+
+Content is compressed on write and decompressed on read chunk by chunk,
+never loaded whole in memory when streaming. The codec is either given
+explicitly or selected from the suffix of the url:
+
+ - '.gz': gzip
+ - '.zz': zlib
+ - '.bz2': bz2
+ - '.xz': xz, requires the lzma module (python3 or backports.lzma)
+
+Over http(s), codecs with a standard Content-Encoding (gzip, deflate)
+are negotiated through headers when given explicitly: bodies are sent
+compressed along with a Content-Encoding header and compressed
+responses are decoded by requests. Otherwise the compressed bytes are
+the content of the resource, as for other backends. Calls go through
+the api front end either way, with the header value as extra argument
+of the backend.
+"""
+import bz2
+import os
+import zlib
+from tempfile import mkstemp
+from threading import Lock
+from urllib2 import URLError
+
+from . import api
+from .stream import DEFAULT_CHUNK_SIZE, iter_chunks, iter_file
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+AUTO = "auto"
+LEVEL = 6
+
+HTTP_SCHEMES = ("http", "https")
+
+
+class Codec(object):
+    """Description of a compression format.
+
+    Args:
+        name: (str) unique name of codec
+        suffix: (str) suffix of urls using this codec, e.g. '.gz'
+        compressor: (callable) build a compressor object from a level
+        decompressor: (callable) build a decompressor object
+        content_encoding: (str) http Content-Encoding, None if none
+    """
+
+    def __init__(self, name, suffix, compressor, decompressor, content_encoding=None):
+        self.name = name
+        self.suffix = suffix
+        self.compressor = compressor
+        self.decompressor = decompressor
+        self.content_encoding = content_encoding
+
+    def compress(self, chunks, level=LEVEL):
+        """Compress content chunk by chunk.
+
+        Args:
+            chunks: (iter of string|ByteArray) raw content
+            level: (int) compression level, from 1 (fast) to 9 (small)
+
+        Returns:
+            (iter of ByteArray): compressed content
+        """
+        comp = self.compressor(level)
+        for chunk in chunks:
+            if isinstance(chunk, unicode):
+                chunk = chunk.encode('utf-8')
+            data = comp.compress(chunk)
+            if data:
+                yield data
+
+        data = comp.flush()
+        if data:
+            yield data
+
+    def decompress(self, chunks):
+        """Decompress content chunk by chunk.
+
+        Raises: URLError if content is not valid for this codec or
+                is truncated
+
+        Args:
+            chunks: (iter of ByteArray) compressed content
+
+        Returns:
+            (iter of ByteArray): raw content
+        """
+        decomp = self.decompressor()
+        try:
+            for chunk in chunks:
+                data = decomp.decompress(chunk)
+                if data:
+                    yield data
+
+            if not _at_eof(decomp):
+                raise URLError("truncated %s content" % self.name)
+
+            if hasattr(decomp, 'flush'):
+                data = decomp.flush()
+                if data:
+                    yield data
+        except (IOError, EOFError, zlib.error) as e:
+            raise URLError("invalid %s content: %s" % (self.name, e))
+        except Exception as e:
+            if lzma is not None and isinstance(e, lzma.LZMAError):
+                raise URLError("invalid %s content: %s" % (self.name, e))
+            raise
+
+
+def _at_eof(decomp):
+    """Check whether a decompressor reached the end of its stream.
+
+    Python 2 zlib and bz2 objects have no 'eof' attribute, an extra
+    byte is fed instead: it is left unused (zlib) or refused (bz2) only
+    once the stream is complete.
+    """
+    if hasattr(decomp, 'eof'):
+        return decomp.eof
+
+    try:
+        decomp.decompress(b"\0")
+    except EOFError:
+        return True
+    except (IOError, zlib.error):
+        return False
+
+    return len(getattr(decomp, 'unused_data', b"")) > 0
+
+
+def _lzma_compressor(level):
+    if lzma is None:
+        raise ValueError("codec 'xz' requires the lzma module")
+    return lzma.LZMACompressor(preset=level)
+
+
+def _lzma_decompressor():
+    if lzma is None:
+        raise ValueError("codec 'xz' requires the lzma module")
+    return lzma.LZMADecompressor()
+
+
+_codecs = {}
+_lock = Lock()
+
+
+def register_codec(codec):
+    """Make a codec available by name and url suffix.
+
+    Args:
+        codec: (Codec) description of codec, replace any codec
+               with the same name
+
+    Returns:
+        None
+    """
+    with _lock:
+        _codecs[codec.name] = codec
+
+
+register_codec(Codec("gzip", ".gz",
+                     lambda level: zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS),
+                     lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+                     "gzip"))
+register_codec(Codec("zlib", ".zz",
+                     lambda level: zlib.compressobj(level),
+                     zlib.decompressobj,
+                     "deflate"))
+register_codec(Codec("bz2", ".bz2", bz2.BZ2Compressor, bz2.BZ2Decompressor))
+register_codec(Codec("xz", ".xz", _lzma_compressor, _lzma_decompressor))
+
+
+def get_codec(url, codec=AUTO):
+    """Find codec to use for a resource.
+
+    Raises: ValueError if codec is unknown
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        codec: (str|Codec) name of codec, AUTO to select codec from
+               url suffix, None for no compression
+
+    Returns:
+        (Codec): None if content is not compressed
+    """
+    if codec is None or isinstance(codec, Codec):
+        return codec
+
+    with _lock:
+        if codec == AUTO:
+            for cdc in _codecs.values():
+                if url.path.endswith(cdc.suffix):
+                    return cdc
+            return None
+
+        try:
+            return _codecs[codec]
+        except KeyError:
+            raise ValueError("unknown codec '%s'" % codec)
+
+
+def _content_encoding(url, codec):
+    """Content-Encoding to negotiate with the server, if any.
+
+    Only codecs given explicitly are negotiated, a suffix denotes
+    a resource whose content is compressed.
+    """
+    if codec is None or codec == AUTO or url.scheme not in HTTP_SCHEMES:
+        return None
+
+    return get_codec(url, codec).content_encoding
+
+
+def open_read(url, binary=False, chunk_size=DEFAULT_CHUNK_SIZE, codec=AUTO):
+    """Read and decompress the content of a resource chunk by chunk.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        binary: (Bool) whether to open the resource as a binary file
+        chunk_size: (int) max size of each chunk
+        codec: (str|Codec) see get_codec
+
+    Returns:
+        (iter of string|ByteArray): successive chunks of content
+    """
+    url = api._split(url)
+    cdc = get_codec(url, codec)
+    if cdc is None:
+        return api.open_read(url, binary, chunk_size)
+
+    chunks = api.open_read(url, True, chunk_size)
+    if _content_encoding(url, codec) is not None:  # decoded by requests
+        return chunks
+
+    return cdc.decompress(chunks)
+
+
+def read(url, binary=False, codec=AUTO):
+    """Read and decompress the content of a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        binary: (Bool) whether to open the resource as a binary file
+        codec: (str|Codec) see get_codec
+
+    Returns:
+        (string|ByteArray): content of the resource
+    """
+    url = api._split(url)
+    if get_codec(url, codec) is None:
+        return api.read(url, binary)
+
+    return b"".join(open_read(url, binary, DEFAULT_CHUNK_SIZE, codec))
+
+
+def write_stream(url, content, binary=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                 codec=AUTO, level=LEVEL):
+    """Compress and write content provided chunk by chunk in a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        content: (file|iter of string|ByteArray) either a file like
+                 object opened for reading or an iterable of chunks
+        binary: (Bool) whether to write the resource as a binary file
+        chunk_size: (int) max size of chunks read from file like objects
+        codec: (str|Codec) see get_codec
+        level: (int) compression level, from 1 (fast) to 9 (small)
+
+    Returns:
+        (None)
+    """
+    url = api._split(url)
+    cdc = get_codec(url, codec)
+    if cdc is None:
+        return api.write_stream(url, content, binary, chunk_size)
+
+    chunks = cdc.compress(iter_chunks(content, chunk_size), level)
+    encoding = _content_encoding(url, codec)
+    if encoding is not None:
+        return api._call("write_stream", url, (url, chunks, True, chunk_size, encoding))
+
+    return api.write_stream(url, chunks, True, chunk_size)
+
+
+def write(url, content, binary=False, codec=AUTO, level=LEVEL):
+    """Compress and write the content in a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        content: (string|ByteArray) content of the resource
+        binary: (Bool) whether to write the resource as a binary file
+        codec: (str|Codec) see get_codec
+        level: (int) compression level, from 1 (fast) to 9 (small)
+
+    Returns:
+        (None)
+    """
+    url = api._split(url)
+    cdc = get_codec(url, codec)
+    if cdc is None:
+        return api.write(url, content, binary)
+
+    data = b"".join(cdc.compress([content], level))
+    encoding = _content_encoding(url, codec)
+    if encoding is not None:
+        return api._call("write", url, (url, data, True, encoding))
+
+    return api.write(url, data, True)
+
+
+def upload(local_pth, url, codec=AUTO, level=LEVEL):
+    """Compress a local file and send it into a resource.
+
+    The file is compressed in a temporary file, never loaded in memory.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        local_pth: (str) path to local file
+        url: (urlparse.SplitResult) Resource locator
+        codec: (str|Codec) see get_codec
+        level: (int) compression level, from 1 (fast) to 9 (small)
+
+    Returns:
+        (None)
+    """
+    url = api._split(url)
+    cdc = get_codec(url, codec)
+    if cdc is None:
+        return api.upload(local_pth, url)
+
+    try:
+        fid, tmp_pth = mkstemp(suffix=".tmp")
+    except OSError as e:
+        raise URLError(e)
+
+    try:
+        try:
+            with os.fdopen(fid, 'wb') as f, open(local_pth, 'rb') as src:
+                for chunk in cdc.compress(iter_file(src), level):
+                    f.write(chunk)
+        except (IOError, OSError) as e:
+            raise URLError(e)
+
+        encoding = _content_encoding(url, codec)
+        if encoding is not None:
+            return api._call("upload", url, (tmp_pth, url, encoding))
+
+        return api.upload(tmp_pth, url)
+    finally:
+        os.remove(tmp_pth)
+
+
+def download(url, local_pth, codec=AUTO):
+    """Decompress the content of a resource into a local file.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        local_pth: (str) path to local file, overwritten if it exists
+        codec: (str|Codec) see get_codec
+
+    Returns:
+        None
+    """
+    url = api._split(url)
+    if get_codec(url, codec) is None:
+        return api.download(url, local_pth)
+
+    try:
+        with open(local_pth, 'wb') as f:
+            for chunk in open_read(url, True, DEFAULT_CHUNK_SIZE, codec):
+                f.write(chunk)
+    except IOError as e:
+        raise URLError(e)
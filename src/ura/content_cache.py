@@ -0,0 +1,306 @@
+"""This file contains a node local cache for content of remote resources
+
+Content is stored in a directory that can be shared by many processes.
+Each entry is a single file, populated in a temporary file and renamed
+once complete so readers never see partial entries. When the directory
+grows above a given size, least recently used entries are removed.
+
+The default directory is private to the current user: if it already
+exists but is owned by someone else or accessible to other users, it is
+not trusted and the cache is disabled. If the cache directory can not be
+used (full disk, permissions), resources are read directly from their
+backend.
+
+Before being served, cached content is revalidated:
+
+ - http(s): conditional GET with If-None-Match and the stored ETag
+ - other schemes: metadata (checksum, or size and modification time)
+   returned by the stat function of the backend
+"""
+import getpass
+import json
+import os
+import stat
+from hashlib import sha1
+from tempfile import gettempdir, mkstemp
+from urllib2 import URLError
+
+from . import api
+
+HTTP_SCHEMES = ("http", "https")
+
+
+def _default_root():
+    """Directory used to store entries of the current user.
+    """
+    try:
+        user = getpass.getuser()
+    except (ImportError, KeyError):  # uid without passwd entry
+        user = str(os.getuid())
+
+    return os.path.join(gettempdir(), "ura_cache_%s" % user)
+
+
+def _is_private(root):
+    """Check that only the current user can access a directory.
+    """
+    try:
+        st = os.lstat(root)
+    except OSError:
+        return False
+
+    if not stat.S_ISDIR(st.st_mode) or st.st_mode & 0o077:
+        return False
+
+    return not hasattr(os, 'getuid') or st.st_uid == os.getuid()
+
+
+class ContentCache(object):
+    """Cache content of resources on local disk.
+
+    Args:
+        root: (str) directory used to store entries, default to a
+              directory of the current user in the temporary directory
+        max_size: (int) max total size in bytes of entries
+    """
+
+    def __init__(self, root=None, max_size=10 * 1024 ** 3):
+        private = root is None
+        if private:
+            root = _default_root()
+
+        self.root = root
+        self.max_size = max_size
+        if not os.path.isdir(root):
+            try:
+                os.makedirs(root, 0o700 if private else 0o777)
+            except OSError:  # created concurrently or unusable
+                pass
+
+        # a predictable shared path might have been created by someone else
+        self._trusted = not private or _is_private(root)
+
+    def _entry_pth(self, url):
+        """Path of the file storing the entry for a url.
+        """
+        return os.path.join(self.root, sha1(url.geturl()).hexdigest() + ".entry")
+
+    def _load(self, url):
+        """Load the entry associated to a url.
+
+        Returns:
+            (dict, str): metadata and content, (None, None) if no entry
+        """
+        try:
+            with open(self._entry_pth(url), 'rb') as f:
+                meta = json.loads(f.readline())
+                cnt = f.read()
+        except (IOError, ValueError):
+            return None, None
+
+        if meta.get('url') != url.geturl():  # hash collision
+            return None, None
+
+        try:
+            os.utime(self._entry_pth(url), None)  # mark as recently used
+        except OSError:
+            pass
+
+        return meta, cnt
+
+    def _store(self, url, meta, src_pth):
+        """Atomically create the entry for a url.
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+            meta: (dict) metadata of entry
+            src_pth: (str) local file with content, removed afterward
+
+        Returns:
+            (str): content of the resource
+        """
+        try:
+            with open(src_pth, 'rb') as f:
+                cnt = f.read()
+        finally:
+            os.remove(src_pth)
+
+        if meta.get('validator') is None:  # not cacheable
+            return cnt
+
+        fid, tmp_pth = mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fid, 'wb') as f:
+                f.write(json.dumps(dict(meta, url=url.geturl())) + "\n")
+                f.write(cnt)
+
+            os.rename(tmp_pth, self._entry_pth(url))
+        except (IOError, OSError):
+            if os.path.exists(tmp_pth):
+                os.remove(tmp_pth)
+            return cnt
+
+        self.evict()
+        return cnt
+
+    def _tmp_pth(self):
+        """Path to a new temporary file in cache directory.
+        """
+        fid, pth = mkstemp(dir=self.root, suffix=".tmp")
+        os.close(fid)
+        return pth
+
+    def _fetch_http(self, url, meta):
+        """Revalidate or fetch a http resource.
+
+        Returns:
+            (dict, str): metadata and content of resource, None if
+                         cached entry is still valid
+        """
+        from . import requests_api
+
+        etag = None if meta is None else meta.get('validator')
+        tmp_pth = self._tmp_pth()
+        try:
+            modified, etag, encoding = requests_api.fetch_if_none_match(url, tmp_pth, etag)
+        except URLError:
+            os.remove(tmp_pth)
+            raise
+
+        if not modified:
+            os.remove(tmp_pth)
+            return None
+
+        meta = dict(validator=etag, encoding=encoding)
+        return meta, self._store(url, meta, tmp_pth)
+
+    def _fetch_stat(self, url, meta):
+        """Revalidate or fetch a resource using its metadata.
+
+        Returns:
+            (dict, str): metadata and content of resource, None if
+                         cached entry is still valid
+        """
+        st = api.stat(url)
+        if st.get('etag') is not None:
+            validator = st['etag']
+        elif st.get('mtime') is not None:
+            validator = "%s-%s" % (st.get('size'), st['mtime'])
+        else:
+            validator = None
+
+        if meta is not None and validator is not None and meta.get('validator') == validator:
+            return None
+
+        tmp_pth = self._tmp_pth()
+        try:
+            with open(tmp_pth, 'wb') as f:
+                for chunk in api.open_read(url, binary=True):
+                    f.write(chunk)
+        except (IOError, URLError):
+            os.remove(tmp_pth)
+            raise
+
+        meta = dict(validator=validator, encoding=None)
+        return meta, self._store(url, meta, tmp_pth)
+
+    def read(self, url, binary=False):
+        """Read the content of a resource through the cache.
+
+        Raises: URLError if resource is not accessible
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+            binary: (Bool) whether to open the resource as a binary file
+
+        Returns:
+            (string|ByteArray): content of the resource
+        """
+        url = api._split(url)
+        if not self._trusted:
+            return api.read(url, binary)
+
+        meta, cnt = self._load(url)
+        try:
+            if url.scheme in HTTP_SCHEMES:
+                fetched = self._fetch_http(url, meta)
+            else:
+                fetched = self._fetch_stat(url, meta)
+        except URLError:
+            raise
+        except EnvironmentError:  # cache directory not usable
+            return api.read(url, binary)
+
+        if fetched is not None:
+            meta, cnt = fetched
+
+        encoding = meta.get('encoding')
+        if binary or encoding is None:
+            return cnt
+        else:
+            return cnt.decode(encoding, 'replace')
+
+    def invalidate(self, url):
+        """Remove the entry associated to a resource.
+
+        Args:
+            url: (urlparse.SplitResult) Resource locator
+
+        Returns:
+            None
+        """
+        if not self._trusted:
+            return
+
+        try:
+            os.remove(self._entry_pth(api._split(url)))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove least recently used entries until total size is
+        below max_size.
+
+        Returns:
+            None
+        """
+        if not self._trusted:
+            return
+
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            if name.endswith(".entry"):
+                pth = os.path.join(self.root, name)
+                try:
+                    st = os.stat(pth)
+                except OSError:  # removed concurrently
+                    continue
+                entries.append((st.st_mtime, st.st_size, pth))
+                total += st.st_size
+
+        entries.sort()
+        for mtime, size, pth in entries:
+            if total <= self.max_size:
+                return
+            try:
+                os.remove(pth)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Remove all entries.
+
+        Returns:
+            None
+        """
+        if not self._trusted:
+            return
+
+        for name in os.listdir(self.root):
+            if name.endswith(".entry"):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
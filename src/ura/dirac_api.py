@@ -1,10 +1,22 @@
 """This file contains the common api to access resources
+
+All exchanges with DIRAC go through an engine (see dirac_engines).
+By default dirac-dms-* command line tools are used; set_engine
+allows to keep a DIRAC session in the process instead, or to use
+a local stand in for tests.
 """
 import os
 import shutil
-from subprocess import check_output, CalledProcessError
+from calendar import timegm
+from datetime import datetime
+from fnmatch import fnmatch
+from tempfile import mkdtemp
+from time import time
+from threading import Lock
 from urllib2 import URLError
-from urlparse import SplitResult
+
+from .dirac_engines import CliEngine
+from .stream import DEFAULT_CHUNK_SIZE, iter_chunks, iter_file
 
 """
 dirac-dms-add-file <LFN> <FILE> <SE>
@@ -17,12 +29,179 @@ dirac-dms-lfn-metadata <LFN>
 dirac-dms-find-lfns Path=/vo.france-grilles.fr/user/j/jchopard
 """
 
+# storage element used for uploads
+SE = "DIRAC-USER"
+
+# max number of LFNs passed to a single engine call
+BATCH_SIZE = 100
+
+# seconds during which a catalog listing is reused by ls and exists
+INDEX_TTL = 60.
+
+_engine = [None]
+_engine_lock = Lock()
+
+# root LFN -> (creation time, tree of nested dict, None for files)
+_indexes = {}
+_index_lock = Lock()
+_MISSING = object()
+_UNKNOWN = object()
+
+
+def get_engine():
+    """Access the engine used to talk to DIRAC.
+
+    Returns:
+        (CliEngine|SessionEngine|LocalEngine)
+    """
+    engine = _engine[0]
+    if engine is None:
+        with _engine_lock:
+            if _engine[0] is None:
+                _engine[0] = CliEngine()
+            engine = _engine[0]
+
+    return engine
+
+
+def set_engine(engine):
+    """Set the engine used to talk to DIRAC.
+
+    Args:
+        engine: (CliEngine|SessionEngine|LocalEngine) engine to use,
+                None to go back to command line tools
+
+    Returns:
+        None
+    """
+    with _engine_lock:
+        _engine[0] = engine
+
+    invalidate()
+
+
+def invalidate(url=None):
+    """Forget cached catalog listings.
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator, listings containing
+             this resource or below it are forgotten. If None, forget
+             everything.
+
+    Returns:
+        None
+    """
+    with _index_lock:
+        if url is None:
+            _indexes.clear()
+            return
+
+        pth = url.path.rstrip("/")
+        for root in list(_indexes):
+            if _is_below(pth, root) or _is_below(root, pth):
+                del _indexes[root]
+
+
+def _is_below(pth, root):
+    """Check whether pth is root or one of its descendants.
+    """
+    return pth == root or pth.startswith(root + "/") or root == ""
+
+
+def _build_tree(root, lfns):
+    """Organize a flat list of LFNs into a tree.
+
+    Raises: URLError if some LFN is not below root
+
+    Args:
+        root: (str) root LFN without trailing slash
+        lfns: (list of str) LFNs below root
+
+    Returns:
+        (dict): nested dict, name -> subtree, None for files
+    """
+    tree = {}
+    for lfn in lfns:
+        if not _is_below(lfn, root):
+            raise URLError("bad path")
+
+        names = [name for name in lfn[len(root):].split("/") if len(name) > 0]
+        node = tree
+        for name in names[:-1]:
+            child = node.get(name)
+            if child is None:
+                child = {}
+                node[name] = child
+            node = child
+        if len(names) > 0:
+            node.setdefault(names[-1], None)
+
+    return tree
+
+
+def _lookup(pth):
+    """Find the node associated to pth in a fresh cached listing.
+
+    Args:
+        pth: (str) LFN without trailing slash
+
+    Returns:
+        (dict|None): nested dict for directories, None for files,
+                     _MISSING if pth is not in a listing covering it
+                     and _UNKNOWN if no fresh listing covers pth
+    """
+    now = time()
+    with _index_lock:
+        for root, (created, tree) in list(_indexes.items()):
+            if now - created > INDEX_TTL:
+                del _indexes[root]
+            elif _is_below(pth, root):
+                node = tree
+                for name in pth[len(root):].split("/"):
+                    if len(name) > 0:
+                        if node is None or name not in node:
+                            return _MISSING
+                        node = node[name]
+                return node
+
+    return _UNKNOWN
+
+
+def _dir_node(pth):
+    """Find the subtree below a directory.
+
+    Use cached listings if possible, otherwise list the whole subtree
+    once and cache it.
+
+    Args:
+        pth: (str) LFN without trailing slash
+
+    Returns:
+        (dict): nested dict, name -> subtree, None for files
+    """
+    node = _lookup(pth)
+    if node is _UNKNOWN:
+        node = _build_tree(pth, get_engine().find_lfns(pth))
+        with _index_lock:
+            for root in list(_indexes):
+                if _is_below(root, pth):
+                    del _indexes[root]
+            _indexes[pth] = (time(), node)
+
+    if node is None or node is _MISSING:
+        return {}
+
+    return node
+
 
 def ls(url):
     """List all available resources at the given location
 
     Warnings: work only on directory like resources.
 
+    The whole subtree is fetched once and kept for INDEX_TTL seconds
+    so listing subdirectories do not query the catalog again.
+
     Args:
         url: (urlparse.SplitResult) Resource locator
 
@@ -30,30 +209,46 @@ def ls(url):
         (list of (url, Bool)): list of urls and flag set to True
                                if url is a directory like resource.
     """
-    root = url.path
-    res = check_output(["dirac-dms-find-lfns Path=%s" % root], shell=True)
-
-    pths = {}
-
-    for line in res.splitlines()[1:]:
-        line = line.strip()
-        if len(line) > 0:
-            if line.startswith(root):
-                pth = line[len(root):][1:]
-                dname = os.path.dirname(pth)
-                if len(dname) > 0:
-                    pths[dname] = True
-                else:
-                    pths[pth] = False
-            else:
-                raise URLError("bad path")
+    node = _dir_node(url.path.rstrip("/"))
+    return [(name, child is not None) for name, child in node.items()]
+
+
+def walk(url, max_depth=None, pattern=None):
+    """Recursively iterate over all resources below the given location
 
-    return pths.items()
+    The whole subtree is fetched with a single catalog query (see ls).
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        max_depth: (int) max depth of resources to visit, 1 means
+                   direct children only, None means no limit
+        pattern: (str) only yield resources whose name match this
+                 shell like pattern (e.g. '*.txt'), all directories
+                 are visited anyway
+
+    Returns:
+        (iter of (url, Bool)): LFNs and flag set to True
+                               if LFN is a directory like resource.
+    """
+    root = url.path.rstrip("/")
+    stack = [(root, _dir_node(root), 1)]
+    while len(stack) > 0:
+        pth, node, depth = stack.pop()
+        for name in sorted(node, reverse=True):
+            child = node[name]
+            if child is not None and (max_depth is None or depth < max_depth):
+                stack.append((pth + "/" + name, child, depth + 1))
+
+        for name in sorted(node):
+            if pattern is None or fnmatch(name, pattern):
+                yield pth + "/" + name, node[name] is not None
 
 
 def exists(url):
     """Check the existence of a resource.
 
+    Answered from cached listings when possible.
+
     Args:
         url: (urlparse.SplitResult) Resource locator
 
@@ -61,19 +256,72 @@ def exists(url):
         (Bool): True if resource is accessible
     """
     if url.path[-1] == "/":  # bad way of checking if it is a directory
-        root, dname = os.path.split(url.path[:-1])
-        root_url = SplitResult(url.scheme, url.netloc, root, url.query, url.fragment)
-        return any(name == dname for name, isdir in ls(root_url))
+        return len(_dir_node(url.path.rstrip("/"))) > 0
     else:
-        # res = open("d.json").read()#check_output(["dirac-dms-lfn-metadata %s" % url.path], shell=True)
-        # i = res.index("Successful")
-        # # failed = res[1:(i - 4)]
-        # success = res[(i - 1):-2]
-        # # print "failed", failed
-        # # print "success", success
-        # return len(success) > 16
-        res = check_output(["dirac-dms-data-size %s" % url.path], shell=True)
-        return not res.startswith("Failed")
+        node = _lookup(url.path)
+        if node is not _UNKNOWN:
+            return node is not _MISSING
+
+        successful, failed = get_engine().metadata([url.path])
+        return url.path in successful
+
+
+def stat(url):
+    """Fetch metadata associated to a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+
+    Returns:
+        (dict): with keys 'size' (int), 'mtime' (float, seconds since
+                epoch) and 'etag' (checksum of file), None if catalog
+                do not provide this information
+    """
+    successful, failed = get_engine().metadata([url.path])
+    if url.path not in successful:
+        raise URLError(failed.get(url.path, "unable to fetch metadata"))
+
+    meta = successful[url.path]
+    mtime = meta.get('ModificationDate')
+    if isinstance(mtime, datetime):
+        mtime = float(timegm(mtime.utctimetuple()))
+    elif not isinstance(mtime, (int, long, float)):
+        mtime = None
+
+    return dict(size=meta.get('Size'), mtime=mtime, etag=meta.get('Checksum'))
+
+
+def _fetch_error(failed, lfn):
+    """Error reporting a file that could not be fetched.
+
+    The reason is kept as is, e.g. a CalledProcessError considered
+    transient by retry policies.
+    """
+    return URLError(failed.get(lfn, "unable to fetch given resource"))
+
+
+def _upload(url, loc_pth, overwrite=False):
+    """Upload a local file.
+
+    Raises: URLError if upload command failed as a whole
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        loc_pth: (str) path to local file
+        overwrite: (Bool) whether to replace an existing file
+
+    Returns:
+        (Bool): operation has been successful
+    """
+    successful, failed = get_engine().add_files([(url.path, loc_pth)], SE, overwrite)
+    invalidate(url)
+    reason = failed.get(url.path)
+    if isinstance(reason, Exception):
+        raise URLError(reason)
+
+    return url.path in successful
 
 
 def touch(url):
@@ -82,31 +330,24 @@ def touch(url):
     Used mostly to create file in a single unit of computation
     for locking systems.
 
-    Warnings: will create temporarily a file with same name in
-    current working directory.
-
     Args:
         url: (urlparse.SplitResult) Resource locator
 
     Returns:
         (Bool): operation has been successful
     """
-    loc_file = os.path.basename(url.path)
+    tmp_dir = mkdtemp(prefix="ura_dirac_")
     try:
-        with open(loc_file, 'w') as f:
+        loc_pth = os.path.join(tmp_dir, os.path.basename(url.path))
+        with open(loc_pth, 'w') as f:
             # os.utime(url.path, None) # won't work on dirac, need to put some stuff in the file to upload it
             f.write("lorem ipsum")
 
-        try:
-            res = check_output(["dirac-dms-add-file %s %s DIRAC-USER" % (url.path, loc_file)], shell=True)
-            lines = res.splitlines()
-            return lines[-1].startswith("Successfully")
-        except CalledProcessError:
-            return False
-        finally:
-            os.remove(loc_file)
+        return _upload(url, loc_pth)
     except IOError as e:
         raise URLError(e)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
 def remove(url):
@@ -123,8 +364,9 @@ def remove(url):
     if url.path[-1] == "/":  # bad way of checking if it is a directory
         raise NotImplementedError
     else:
-        res = check_output(["dirac-dms-remove-files %s" % url.path], shell=True)
-        return res.startswith("Successfully")
+        successful, failed = get_engine().remove_files([url.path])
+        invalidate(url)
+        return url.path in successful
 
 
 def read(url, binary=False):
@@ -132,9 +374,6 @@ def read(url, binary=False):
 
     Raises: URLError if resource is not accessible
 
-    Warnings: will create temporarily a file with same name in
-    current working directory.
-
     Args:
         url: (urlparse.SplitResult) Resource locator
         binary: (Bool) whether to open the resource as a binary file
@@ -142,47 +381,160 @@ def read(url, binary=False):
     Returns:
         (string|ByteArray): content of the resource
     """
-    loc_pth = os.path.basename(url.path)
+    tmp_dir, f = _stage(url, binary)
     try:
-        res = check_output(["dirac-dms-get-file %s" % url.path], shell=True)
-    except CalledProcessError as e:
+        return f.read()
+    except IOError as e:
         raise URLError(e)
+    finally:
+        f.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
-    if res.startswith("ERROR Failed"):
-        raise URLError("unable to fetch given resource")
 
-    if binary:
-        mode = 'rb'
-    else:
-        mode = 'r'
+def _stage(url, binary):
+    """Fetch a resource in a private temporary directory.
 
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        binary: (Bool) whether to open the resource as a binary file
+
+    Returns:
+        (str, file): staging directory and staged file opened for reading
+    """
+    tmp_dir = mkdtemp(prefix="ura_dirac_")
     try:
-        with open(loc_pth, mode) as f:
-            cnt = f.read()
-            os.remove(loc_pth)
-            return cnt
+        successful, failed = get_engine().get_files([url.path], tmp_dir)
+        if url.path not in successful:
+            raise _fetch_error(failed, url.path)
+
+        if binary:
+            mode = 'rb'
+        else:
+            mode = 'r'
+
+        return tmp_dir, open(successful[url.path], mode)
+    except URLError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
     except IOError as e:
-        os.remove(loc_pth)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
         raise URLError(e)
 
 
-def write(url, content, binary=False):
-    """Write the content in a resource.
+def _iter_staged(f, tmp_dir, chunk_size):
+    """Iterate over a staged file and clean staging area afterward.
+
+    Args:
+        f: (file) opened staged file
+        tmp_dir: (str) staging directory to remove at the end
+        chunk_size: (int) max size of each chunk
+
+    Returns:
+        (iter of string|ByteArray): chunks of content
+    """
+    try:
+        for chunk in iter_file(f, chunk_size):
+            yield chunk
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def open_read(url, binary=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read the content of a resource chunk by chunk.
+
+    The resource is first staged in a private temporary directory
+    then read from there, the staged copy being removed once the
+    iteration is over.
 
     Raises: URLError if resource is not accessible
 
-    Warnings: will create temporarily a file with same name in
-    current working directory.
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        binary: (Bool) whether to open the resource as a binary file
+        chunk_size: (int) max size of each chunk
+
+    Returns:
+        (iter of string|ByteArray): successive chunks of content
+    """
+    tmp_dir, f = _stage(url, binary)
+    return _iter_staged(f, tmp_dir, chunk_size)
+
+
+def read_range(url, offset, length=None, binary=False):
+    """Read part of the content of a resource.
+
+    Warnings: DIRAC has no partial transfer, the whole resource
+    is staged in a private temporary directory first.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        offset: (int) position of first byte to read
+        length: (int) max number of bytes to read, None means
+                up to the end of the resource
+        binary: (Bool) whether to open the resource as a binary file
+
+    Returns:
+        (string|ByteArray): requested part of the content
+    """
+    tmp_dir, f = _stage(url, binary)
+    try:
+        f.seek(offset)
+        if length is None:
+            return f.read()
+        else:
+            return f.read(length)
+    except IOError as e:
+        raise URLError(e)
+    finally:
+        f.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def write(url, content, binary=False, overwrite=True):
+    """Write the content in a resource.
+
+    Raises: URLError if resource is not accessible
 
     Args:
         url: (urlparse.SplitResult) Resource locator
         content: (string|ByteArray) content of the resource
         binary: (Bool) whether to write the resource as a binary file
+        overwrite: (Bool) whether to replace an existing resource
+
+    Returns:
+        (Bool): operation has been successful
+    """
+    return write_stream(url, [content], binary, overwrite=overwrite)
+
+
+def write_stream(url, content, binary=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                 overwrite=True):
+    """Write content provided chunk by chunk in a resource.
+
+    Content is staged once in a private temporary directory
+    before being uploaded. Existing resources are replaced in a
+    single operation when the engine allows it (see add_files
+    in dirac_engines).
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        content: (file|iter of string|ByteArray) either a file like
+                 object opened for reading or an iterable of chunks
+        binary: (Bool) whether to write the resource as a binary file
+        chunk_size: (int) max size of chunks read from file like objects
+        overwrite: (Bool) whether to replace an existing resource
 
     Returns:
-        (None)
+        (Bool): operation has been successful
     """
-    loc_pth = os.path.basename(url.path)
+    tmp_dir = mkdtemp(prefix="ura_dirac_")
+    loc_pth = os.path.join(tmp_dir, os.path.basename(url.path))
 
     if binary:
         mode = 'wb'
@@ -190,19 +542,298 @@ def write(url, content, binary=False):
         mode = 'w'
 
     try:
-        with open(loc_pth, mode) as f:
-            f.write(content)
-    except IOError as e:
+        try:
+            with open(loc_pth, mode) as f:
+                for chunk in iter_chunks(content, chunk_size):
+                    f.write(chunk)
+        except IOError as e:
+            raise URLError(e)
+
+        return _upload(url, loc_pth, overwrite)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def upload(local_pth, url, overwrite=True):
+    """Upload a local file without reading it.
+
+    The file is handed directly to the engine, no copy is made.
+
+    Raises: URLError if local file is not accessible
+
+    Args:
+        local_pth: (str) path to local file
+        url: (urlparse.SplitResult) Resource locator
+        overwrite: (Bool) whether to replace an existing resource
+
+    Returns:
+        (Bool): operation has been successful
+    """
+    if not os.path.isfile(local_pth):
+        raise URLError("local file '%s' does not exists" % local_pth)
+
+    return _upload(url, os.path.abspath(local_pth), overwrite)
+
+
+def download(url, local_pth):
+    """Download a resource in a local file without reading it.
+
+    The resource is staged in a private temporary directory created
+    next to local_pth then moved in place.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        local_pth: (str) path to local file, overwritten if it exists
+
+    Returns:
+        None
+    """
+    local_pth = os.path.abspath(local_pth)
+    try:
+        tmp_dir = mkdtemp(prefix="ura_dirac_", dir=os.path.dirname(local_pth))
+    except OSError as e:
         raise URLError(e)
 
     try:
-        if exists(url):
-            remove(url)
+        successful, failed = get_engine().get_files([url.path], tmp_dir)
+        if url.path not in successful:
+            raise _fetch_error(failed, url.path)
 
-        res = check_output(["dirac-dms-add-file %s %s DIRAC-USER" % (url.path, loc_pth)], shell=True)
-        lines = res.splitlines()
-        return lines[-1].startswith("Successfully")
-    except CalledProcessError:
-        return False
+        os.rename(successful[url.path], local_pth)
+    except OSError as e:
+        raise URLError(e)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def copy(src, dst):
+    """Copy a file like resource.
+
+    DIRAC has no catalog side copy, the file is staged in a private
+    temporary directory then uploaded again.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        src: (urlparse.SplitResult) Resource locator of source
+        dst: (urlparse.SplitResult) Resource locator of destination
+
+    Returns:
+        (Bool): operation has been successful
+    """
+    tmp_dir = mkdtemp(prefix="ura_dirac_")
+    try:
+        successful, failed = get_engine().get_files([src.path], tmp_dir)
+        if src.path not in successful:
+            raise _fetch_error(failed, src.path)
+
+        return _upload(dst, successful[src.path], overwrite=True)
     finally:
-        os.remove(loc_pth)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def move(src, dst):
+    """Move a file like resource.
+
+    Use a catalog rename when the engine supports it, otherwise
+    copy then remove the source.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        src: (urlparse.SplitResult) Resource locator of source
+        dst: (urlparse.SplitResult) Resource locator of destination
+
+    Returns:
+        (Bool): operation has been successful
+    """
+    engine = get_engine()
+    if hasattr(engine, "rename_files"):
+        successful, failed = engine.rename_files([(src.path, dst.path)])
+        invalidate(src)
+        invalidate(dst)
+        return src.path in successful
+
+    if not copy(src, dst):
+        return False
+
+    return remove(src)
+
+
+def _batches(urls):
+    """Group urls in batches of at most BATCH_SIZE elements.
+
+    Args:
+        urls: (list of urlparse.SplitResult) Resource locators
+
+    Returns:
+        (iter of list of urlparse.SplitResult)
+    """
+    for i in range(0, len(urls), BATCH_SIZE):
+        yield urls[i:i + BATCH_SIZE]
+
+
+def exists_many(urls):
+    """Check the existence of many resources in a single engine call
+    per batch of BATCH_SIZE urls.
+
+    Warnings: only for file like resources.
+
+    Args:
+        urls: (list of urlparse.SplitResult) Resource locators
+
+    Returns:
+        (list of (url, Bool, Exception)): result for each url
+    """
+    ret = []
+    for batch in _batches(list(urls)):
+        try:
+            successful, failed = get_engine().metadata([url.path for url in batch])
+            ret.extend((url, url.path in successful, None) for url in batch)
+        except URLError as e:
+            ret.extend((url, None, e) for url in batch)
+
+    return ret
+
+
+def read_many(urls, binary=False):
+    """Read the content of many resources in a single engine call
+    per batch of BATCH_SIZE urls.
+
+    Resources are staged in a private temporary directory.
+
+    Args:
+        urls: (list of urlparse.SplitResult) Resource locators
+        binary: (Bool) whether to open the resources as binary files
+
+    Returns:
+        (list of (url, string|ByteArray, Exception)): result for each url
+    """
+    if binary:
+        mode = 'rb'
+    else:
+        mode = 'r'
+
+    urls = list(urls)
+    ret = [None] * len(urls)
+    todo = list(enumerate(urls))
+    while len(todo) > 0:
+        # files are staged under their basename, avoid collisions
+        names = set()
+        batch = []
+        postponed = []
+        for ind, url in todo:
+            name = os.path.basename(url.path)
+            if name in names or len(batch) == BATCH_SIZE:
+                postponed.append((ind, url))
+            else:
+                names.add(name)
+                batch.append((ind, url))
+        todo = postponed
+
+        tmp_dir = mkdtemp(prefix="ura_dirac_")
+        try:
+            try:
+                successful, failed = get_engine().get_files([url.path for ind, url in batch],
+                                                            tmp_dir)
+            except URLError as e:
+                for ind, url in batch:
+                    ret[ind] = (url, None, e)
+                continue
+
+            for ind, url in batch:
+                if url.path not in successful:
+                    ret[ind] = (url, None, _fetch_error(failed, url.path))
+                    continue
+
+                try:
+                    with open(successful[url.path], mode) as f:
+                        ret[ind] = (url, f.read(), None)
+                except IOError as e:
+                    ret[ind] = (url, None, URLError(e))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return ret
+
+
+def remove_many(urls):
+    """Remove many resources in a single engine call per batch
+    of BATCH_SIZE urls.
+
+    Warnings: only for file like resources.
+
+    Args:
+        urls: (list of urlparse.SplitResult) Resource locators
+
+    Returns:
+        (list of (url, Bool, Exception)): result for each url
+    """
+    ret = []
+    for batch in _batches(list(urls)):
+        try:
+            successful, failed = get_engine().remove_files([url.path for url in batch])
+            for url in batch:
+                invalidate(url)
+            ret.extend((url, url.path in successful, None) for url in batch)
+        except URLError as e:
+            ret.extend((url, None, e) for url in batch)
+
+    return ret
+
+
+def write_many(items, binary=False):
+    """Write content in many resources.
+
+    All contents are staged in a private temporary directory and
+    uploaded by a single engine call per batch of BATCH_SIZE urls.
+    Existing resources are replaced.
+
+    Args:
+        items: (list of (urlparse.SplitResult, string|ByteArray))
+               resource locators and associated content
+        binary: (Bool) whether to write the resources as binary files
+
+    Returns:
+        (list of (url, Bool, Exception)): result for each url
+    """
+    if binary:
+        mode = 'wb'
+    else:
+        mode = 'w'
+
+    items = list(items)
+    ret = []
+    for i in range(0, len(items), BATCH_SIZE):
+        batch = items[i:i + BATCH_SIZE]
+        urls = [url for url, content in batch]
+        tmp_dir = mkdtemp(prefix="ura_dirac_")
+        try:
+            try:
+                loc_items = []
+                for ind, (url, content) in enumerate(batch):
+                    loc_pth = os.path.join(tmp_dir, "%d_%s" % (ind, os.path.basename(url.path)))
+                    with open(loc_pth, mode) as f:
+                        f.write(content)
+                    loc_items.append((url.path, loc_pth))
+            except IOError as e:
+                ret.extend((url, None, URLError(e)) for url in urls)
+                continue
+
+            try:
+                successful, failed = get_engine().add_files(loc_items, SE, overwrite=True)
+                for url in urls:
+                    invalidate(url)
+                    reason = failed.get(url.path)
+                    if isinstance(reason, Exception):
+                        ret.append((url, None, URLError(reason)))
+                    else:
+                        ret.append((url, url.path in successful, None))
+            except URLError as e:
+                ret.extend((url, None, e) for url in urls)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return ret
@@ -0,0 +1,701 @@
+"""This file contains the engines used by dirac_api to talk to DIRAC
+
+All engines expose the same methods and return structured results
+mimicking DIRAC: a (successful, failed) pair of dict indexed by LFN.
+Failure reasons are messages, or the CalledProcessError of a command
+that failed as a whole so callers can tell transient failures apart.
+
+ - CliEngine: run dirac-dms-* commands, one process per call
+ - SessionEngine: keep a DIRAC client session alive in the current
+   process, requires DIRAC python packages
+ - LocalEngine: stand in storing LFNs in a local directory, for tests
+"""
+import ast
+import datetime
+import errno
+import os
+import shutil
+import signal
+from subprocess import CalledProcessError, check_output, PIPE, Popen
+from threading import Timer
+from urllib2 import URLError
+from zlib import adler32
+
+from . import metrics, timeouts
+
+
+# delay in seconds between SIGTERM and SIGKILL of a command timing out
+KILL_GRACE = 10.
+
+
+class TimeoutExpired(CalledProcessError):
+    """Raised when a command is killed for running too long.
+    """
+
+    def __init__(self, cmd, timeout, output=None, returncode=-signal.SIGTERM):
+        CalledProcessError.__init__(self, returncode, cmd, output)
+        self.timeout = timeout
+
+    def __str__(self):
+        return "Command '%s' timed out after %s seconds" % (self.cmd, self.timeout)
+
+
+def _signal(proc, sig):
+    """Send a signal to a process and all its children.
+
+    Returns:
+        (Bool): whether the signal has been sent
+    """
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(proc.pid, sig)
+        elif sig == signal.SIGTERM:
+            proc.terminate()
+        else:
+            proc.kill()
+    except OSError:  # already dead
+        return False
+
+    return True
+
+
+def _terminate(proc, killed):
+    """Ask a process to stop, kill it if still running after KILL_GRACE.
+    """
+    if proc.returncode is not None:  # finished meanwhile
+        return
+
+    if _signal(proc, signal.SIGTERM):
+        timer = Timer(KILL_GRACE, _signal, (proc, getattr(signal, 'SIGKILL', signal.SIGTERM)))
+        timer.start()
+        killed.append(timer)
+
+
+def _check_output(args, cwd=None):
+    """Run a command and return its output, counting spawned processes.
+
+    The command runs in its own process group. If it runs longer than
+    the 'subprocess' timeout (none by default, but bounded by the
+    current deadline) it receives SIGTERM, then SIGKILL with all its
+    children after KILL_GRACE seconds.
+
+    Raises: CalledProcessError if command fails or times out,
+            URLError if current deadline has already expired
+    """
+    timeout = timeouts.get('subprocess')
+    metrics.count_subprocess("dirac_api")
+    if timeout is None:
+        return check_output(args, cwd=cwd)
+
+    proc = Popen(args, cwd=cwd, stdout=PIPE,
+                 preexec_fn=getattr(os, 'setsid', None))
+    killed = []
+    timer = Timer(timeout, _terminate, (proc, killed))
+    timer.start()
+    try:
+        output = proc.communicate()[0]
+    finally:
+        timer.cancel()
+        timer.join()  # _terminate might still be running
+
+    if killed:
+        killed[0].cancel()
+        if hasattr(os, 'killpg'):  # children left behind by the command
+            _signal(proc, signal.SIGKILL)
+        raise TimeoutExpired(args, timeout, output, proc.returncode)
+
+    if proc.returncode != 0:
+        raise CalledProcessError(proc.returncode, args, output)
+
+    return output
+
+
+_CONSTANTS = {'None': None, 'True': True, 'False': False}
+_CONSTRUCTORS = {'datetime.datetime': datetime.datetime,
+                 'datetime.date': datetime.date,
+                 'datetime.timedelta': datetime.timedelta}
+
+
+def _dotted_name(node):
+    """Name of a function called in an expression, e.g. 'datetime.date'.
+    """
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return "%s.%s" % (_dotted_name(node.value), node.attr)
+
+    raise ValueError("unsupported expression")
+
+
+def _eval_node(node):
+    """Evaluate a python literal that might contain datetime objects.
+
+    Like ast.literal_eval, with support for the datetime constructors
+    found in the pprint of DIRAC results.
+
+    Raises: ValueError if node is anything else
+    """
+    if isinstance(node, ast.Expression):
+        return _eval_node(node.body)
+    if isinstance(node, ast.Str):
+        return node.s
+    if isinstance(node, ast.Num):
+        return node.n
+    if isinstance(node, ast.Name) and node.id in _CONSTANTS:
+        return _CONSTANTS[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return -_eval_node(node.operand)
+    if isinstance(node, ast.Tuple):
+        return tuple(_eval_node(elt) for elt in node.elts)
+    if isinstance(node, ast.List):
+        return [_eval_node(elt) for elt in node.elts]
+    if isinstance(node, ast.Set):
+        return set(_eval_node(elt) for elt in node.elts)
+    if isinstance(node, ast.Dict):
+        return dict((_eval_node(key), _eval_node(value))
+                    for key, value in zip(node.keys, node.values))
+    if isinstance(node, ast.Call) and not node.keywords \
+            and getattr(node, 'starargs', None) is None \
+            and getattr(node, 'kwargs', None) is None:
+        func = _CONSTRUCTORS.get(_dotted_name(node.func))
+        if func is not None:
+            return func(*[_eval_node(arg) for arg in node.args])
+
+    raise ValueError("unsupported expression")
+
+
+def _parse_result(res):
+    """Parse the {'Failed': .., 'Successful': ..} dict printed by
+    dirac-dms commands.
+
+    Values are python literals and datetime objects, as printed by
+    pprint.
+
+    Args:
+        res: (str) output of command
+
+    Returns:
+        (dict, dict): successful and failed LFNs
+    """
+    try:
+        txt = res[res.index("{"):res.rindex("}") + 1]
+        ret = _eval_node(ast.parse(txt, mode='eval'))
+        return ret['Successful'], ret['Failed']
+    except (ValueError, SyntaxError, KeyError, TypeError):
+        raise URLError("unable to parse dirac output")
+
+
+def _fetched_lfns(res):
+    """Find LFNs reported as fetched in the output of a failed get-file.
+
+    Args:
+        res: (str) output of command
+
+    Returns:
+        (dict): LFNs associated to their local path, empty if output
+                can not be parsed
+    """
+    try:
+        return _parse_result(res or "")[0]
+    except URLError:
+        return {}
+
+
+def _failed_lfns(res, lfns):
+    """Find LFNs reported as failures in the output of a command.
+
+    Args:
+        res: (str) output of command
+        lfns: (list of str) LFNs used in command
+
+    Returns:
+        (set of str): LFNs mentioned in error lines
+    """
+    lfns = set(lfns)
+    failed = set()
+    for line in res.splitlines():
+        low = line.lower()
+        if "fail" in low or "error" in low:
+            words = set(word.strip("'\",:;()[]{}") for word in line.split())
+            failed.update(words & lfns)
+
+    return failed
+
+
+def _existing_lfns(res, lfns):
+    """Find LFNs refused by an upload because they already exist.
+
+    Args:
+        res: (str) output of command
+        lfns: (list of str) LFNs used in command
+
+    Returns:
+        (set of str): LFNs mentioned in 'already exists' error lines,
+                      all LFNs if a single one was uploaded
+    """
+    existing = set()
+    for line in (res or "").splitlines():
+        low = line.lower()
+        if "already exist" in low or "file exists" in low:
+            if len(lfns) == 1:
+                return set(lfns)
+            words = set(word.strip("'\",:;()[]{}") for word in line.split())
+            existing.update(words & set(lfns))
+
+    return existing
+
+
+def _split_result(lfns, failed, reason):
+    """Build structured result from a set of failed LFNs.
+
+    Returns:
+        (dict, dict): successful and failed LFNs
+    """
+    successful = dict((lfn, True) for lfn in lfns if lfn not in failed)
+    failed = dict((lfn, reason) for lfn in lfns if lfn in failed)
+    return successful, failed
+
+
+class CliEngine(object):
+    """Run dirac-dms-* command line tools.
+    """
+
+    def _run(self, args, cwd=None):
+        """Run a command and return its output.
+
+        Raises: URLError if command fails
+        """
+        try:
+            return _check_output(args, cwd=cwd)
+        except CalledProcessError as e:
+            raise URLError(e)
+
+    def find_lfns(self, path):
+        """List all files below a path in the catalog.
+
+        Args:
+            path: (str) root LFN
+
+        Returns:
+            (list of str): LFNs
+        """
+        res = self._run(["dirac-dms-find-lfns", "Path=%s" % path])
+        lines = (line.strip() for line in res.splitlines()[1:])
+        return [line for line in lines if len(line) > 0]
+
+    def metadata(self, lfns):
+        """Fetch catalog metadata of files.
+
+        Args:
+            lfns: (list of str) LFNs
+
+        Returns:
+            (dict, dict): successful LFNs associated to their metadata
+                          and failed LFNs associated to a reason
+        """
+        return _parse_result(self._run(["dirac-dms-lfn-metadata"] + list(lfns)))
+
+    def get_files(self, lfns, dest_dir):
+        """Download files in a local directory.
+
+        Args:
+            lfns: (list of str) LFNs, must have distinct basenames
+            dest_dir: (str) local directory
+
+        Returns:
+            (dict, dict): successful LFNs associated to local path
+                          and failed LFNs associated to a reason
+        """
+        try:
+            _check_output(["dirac-dms-get-file"] + list(lfns), cwd=dest_dir)
+            fetched = None
+            reason = "unable to fetch given resource"
+        except TimeoutExpired as e:  # files left behind might be partial
+            fetched = {}
+            reason = e
+        except CalledProcessError as e:  # trust only files reported
+            fetched = _fetched_lfns(e.output)
+            reason = e
+
+        successful = {}
+        failed = {}
+        for lfn in lfns:
+            pth = os.path.join(dest_dir, os.path.basename(lfn))
+            if os.path.exists(pth) and (fetched is None or lfn in fetched):
+                successful[lfn] = pth
+            else:
+                failed[lfn] = reason
+                if os.path.exists(pth):
+                    os.remove(pth)
+
+        return successful, failed
+
+    def _add_files(self, items, se):
+        """Upload local files with a single command.
+
+        Returns:
+            (dict, dict, set): successful and failed LFNs, and failed
+                               LFNs refused because they already exist
+        """
+        lfns = [lfn for lfn, pth in items]
+        if len(items) == 1:
+            lfn, pth = items[0]
+            try:
+                res = _check_output(["dirac-dms-add-file", lfn, pth, se])
+            except CalledProcessError as e:
+                return {}, {lfn: e}, _existing_lfns(e.output, lfns)
+
+            if res.splitlines()[-1].startswith("Successfully"):
+                return {lfn: True}, {}, set()
+            else:
+                return {}, {lfn: res}, _existing_lfns(res, lfns)
+
+        list_pth = os.path.join(os.path.dirname(items[0][1]), "ura_add_files.txt")
+        with open(list_pth, 'w') as f:
+            for lfn, pth in items:
+                f.write("%s %s %s\n" % (lfn, pth, se))
+
+        try:
+            res = _check_output(["dirac-dms-add-file", list_pth])
+        except CalledProcessError as e:
+            return {}, dict((lfn, e) for lfn in lfns), _existing_lfns(e.output, lfns)
+        finally:
+            os.remove(list_pth)
+
+        successful, failed = _split_result(lfns, _failed_lfns(res, lfns), "upload failed")
+        return successful, failed, _existing_lfns(res, lfns) & set(failed)
+
+    def add_files(self, items, se, overwrite=False):
+        """Upload local files and register them in the catalog.
+
+        Warnings: command line tools can neither replace nor rename a
+        file. When overwriting, only uploads refused because the LFN
+        already exists are retried after removing the existing file,
+        which is missing in between. Other failures (storage element
+        unavailable, proxy, timeout) leave the existing file untouched.
+
+        Args:
+            items: (list of (str, str)) LFN and local path of each file
+            se: (str) name of storage element
+            overwrite: (Bool) whether to replace existing files
+
+        Returns:
+            (dict, dict): successful and failed LFNs
+        """
+        successful, failed, existing = self._add_files(items, se)
+        if not overwrite or len(existing) == 0:
+            return successful, failed
+
+        retry = [(lfn, pth) for lfn, pth in items if lfn in existing]
+        removed, not_removed = self.remove_files([lfn for lfn, pth in retry])
+        retry = [(lfn, pth) for lfn, pth in retry if lfn in removed]
+        if len(retry) > 0:
+            new_successful, new_failed, new_existing = self._add_files(retry, se)
+            successful.update(new_successful)
+            for lfn in new_successful:
+                del failed[lfn]
+            failed.update(new_failed)
+
+        return successful, failed
+
+    def remove_files(self, lfns):
+        """Remove files from storage and catalog.
+
+        Args:
+            lfns: (list of str) LFNs
+
+        Returns:
+            (dict, dict): successful and failed LFNs
+        """
+        res = self._run(["dirac-dms-remove-files"] + list(lfns))
+        if len(lfns) == 1 and not res.startswith("Successfully"):
+            return {}, {lfns[0]: res}
+
+        return _split_result(lfns, _failed_lfns(res, lfns), "remove failed")
+
+
+class SessionEngine(object):
+    """Keep a DIRAC client session in the current process.
+
+    Proxy and configuration are loaded once, when the engine is
+    created, instead of once per command.
+    """
+
+    def __init__(self):
+        from DIRAC.Core.Base import Script
+        Script.parseCommandLine(ignoreErrors=True)
+
+        from DIRAC.DataManagementSystem.Client.DataManager import DataManager
+        from DIRAC.Resources.Catalog.FileCatalog import FileCatalog
+
+        self._dm = DataManager()
+        self._fc = FileCatalog()
+
+    @staticmethod
+    def _value(res):
+        """Extract value of a DIRAC S_OK/S_ERROR structure.
+
+        Raises: URLError if res is an error
+        """
+        if not res['OK']:
+            raise URLError(res['Message'])
+
+        return res['Value']
+
+    def _result(self, res):
+        """Extract successful and failed dict of a DIRAC result.
+        """
+        value = self._value(res)
+        return value['Successful'], value['Failed']
+
+    def find_lfns(self, path):
+        """List all files below a path in the catalog.
+
+        Args:
+            path: (str) root LFN
+
+        Returns:
+            (list of str): LFNs
+        """
+        return list(self._value(self._fc.findFilesByMetadata({}, path)))
+
+    def metadata(self, lfns):
+        """Fetch catalog metadata of files.
+
+        Args:
+            lfns: (list of str) LFNs
+
+        Returns:
+            (dict, dict): successful LFNs associated to their metadata
+                          and failed LFNs associated to a reason
+        """
+        return self._result(self._fc.getFileMetadata(list(lfns)))
+
+    def get_files(self, lfns, dest_dir):
+        """Download files in a local directory.
+
+        Args:
+            lfns: (list of str) LFNs, must have distinct basenames
+            dest_dir: (str) local directory
+
+        Returns:
+            (dict, dict): successful LFNs associated to local path
+                          and failed LFNs associated to a reason
+        """
+        successful, failed = self._result(self._dm.getFile(list(lfns), destinationDir=dest_dir))
+        return (dict((lfn, os.path.join(dest_dir, os.path.basename(lfn)))
+                     for lfn in successful),
+                failed)
+
+    def add_files(self, items, se, overwrite=False):
+        """Upload local files and register them in the catalog.
+
+        Args:
+            items: (list of (str, str)) LFN and local path of each file
+            se: (str) name of storage element
+            overwrite: (Bool) whether to replace existing files in a
+                       single operation
+
+        Returns:
+            (dict, dict): successful and failed LFNs
+        """
+        successful = {}
+        failed = {}
+        for lfn, pth in items:
+            res = self._dm.putAndRegister(lfn, pth, se, overwrite=overwrite)
+            if res['OK'] and lfn in res['Value']['Successful']:
+                successful[lfn] = True
+            elif res['OK']:
+                failed[lfn] = res['Value']['Failed'].get(lfn)
+            else:
+                failed[lfn] = res['Message']
+
+        return successful, failed
+
+    def remove_files(self, lfns):
+        """Remove files from storage and catalog.
+
+        Args:
+            lfns: (list of str) LFNs
+
+        Returns:
+            (dict, dict): successful and failed LFNs
+        """
+        return self._result(self._dm.removeFile(list(lfns)))
+
+    def rename_files(self, items):
+        """Rename files in the catalog, data is not moved.
+
+        Args:
+            items: (list of (str, str)) old and new LFN of each file
+
+        Returns:
+            (dict, dict): successful and failed old LFNs
+        """
+        return self._result(self._fc.renameFile(dict(items)))
+
+
+def _makedirs(dpth):
+    """Create a directory and its parents if needed.
+
+    Tolerate directories created concurrently by other threads.
+    """
+    try:
+        os.makedirs(dpth)
+    except OSError as e:
+        if e.errno != errno.EEXIST or not os.path.isdir(dpth):
+            raise
+
+
+class LocalEngine(object):
+    """Stand in for DIRAC storing files in a local directory.
+
+    Args:
+        root: (str) local directory mapped to the root of the catalog
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _pth(self, lfn):
+        """Local path associated to a LFN.
+        """
+        return os.path.join(self.root, lfn.lstrip("/"))
+
+    def find_lfns(self, path):
+        """List all files below a path in the catalog.
+
+        Args:
+            path: (str) root LFN
+
+        Returns:
+            (list of str): LFNs
+        """
+        lfns = []
+        for dirpath, dirnames, filenames in os.walk(self._pth(path)):
+            rel = os.path.relpath(dirpath, self.root).replace("\\", "/")
+            for name in filenames:
+                lfns.append("/" + os.path.normpath(os.path.join(rel, name)).replace("\\", "/"))
+
+        return sorted(lfns)
+
+    def metadata(self, lfns):
+        """Fetch catalog metadata of files.
+
+        Args:
+            lfns: (list of str) LFNs
+
+        Returns:
+            (dict, dict): successful LFNs associated to their metadata
+                          and failed LFNs associated to a reason
+        """
+        successful = {}
+        failed = {}
+        for lfn in lfns:
+            pth = self._pth(lfn)
+            if os.path.isfile(pth):
+                with open(pth, 'rb') as f:
+                    checksum = "%08x" % (adler32(f.read()) & 0xffffffff)
+                st = os.stat(pth)
+                successful[lfn] = dict(Size=st.st_size,
+                                       ModificationDate=st.st_mtime,
+                                       Checksum=checksum)
+            else:
+                failed[lfn] = "No such file or directory"
+
+        return successful, failed
+
+    def get_files(self, lfns, dest_dir):
+        """Download files in a local directory.
+
+        Args:
+            lfns: (list of str) LFNs, must have distinct basenames
+            dest_dir: (str) local directory
+
+        Returns:
+            (dict, dict): successful LFNs associated to local path
+                          and failed LFNs associated to a reason
+        """
+        successful = {}
+        failed = {}
+        for lfn in lfns:
+            pth = os.path.join(dest_dir, os.path.basename(lfn))
+            try:
+                shutil.copyfile(self._pth(lfn), pth)
+                successful[lfn] = pth
+            except IOError as e:
+                failed[lfn] = str(e)
+
+        return successful, failed
+
+    def add_files(self, items, se, overwrite=False):
+        """Upload local files and register them in the catalog.
+
+        Args:
+            items: (list of (str, str)) LFN and local path of each file
+            se: (str) name of storage element
+            overwrite: (Bool) whether to atomically replace existing files
+
+        Returns:
+            (dict, dict): successful and failed LFNs
+        """
+        del se
+        successful = {}
+        failed = {}
+        for lfn, pth in items:
+            dst = self._pth(lfn)
+            if os.path.exists(dst) and not overwrite:
+                failed[lfn] = "File exists"
+                continue
+
+            try:
+                _makedirs(os.path.dirname(dst))
+                shutil.copyfile(pth, dst + ".part")
+                os.rename(dst + ".part", dst)
+                successful[lfn] = True
+            except (IOError, OSError) as e:
+                failed[lfn] = str(e)
+
+        return successful, failed
+
+    def remove_files(self, lfns):
+        """Remove files from storage and catalog.
+
+        Args:
+            lfns: (list of str) LFNs
+
+        Returns:
+            (dict, dict): successful and failed LFNs
+        """
+        successful = {}
+        failed = {}
+        for lfn in lfns:
+            try:
+                os.remove(self._pth(lfn))
+                successful[lfn] = True
+            except OSError as e:
+                failed[lfn] = str(e)
+
+        return successful, failed
+
+    def rename_files(self, items):
+        """Rename files in the catalog, data is not moved.
+
+        Args:
+            items: (list of (str, str)) old and new LFN of each file
+
+        Returns:
+            (dict, dict): successful and failed old LFNs
+        """
+        successful = {}
+        failed = {}
+        for src, dst in items:
+            try:
+                dst_pth = self._pth(dst)
+                _makedirs(os.path.dirname(dst_pth))
+                os.rename(self._pth(src), dst_pth)
+                successful[src] = True
+            except OSError as e:
+                failed[src] = str(e)
+
+        return successful, failed
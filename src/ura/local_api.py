@@ -1,34 +1,336 @@
 """This file contains the common api to access resources
 """
+import errno
+import mmap
 import os
 import shutil
+from fnmatch import fnmatch
+from stat import S_IMODE
+from tempfile import mkstemp
+from threading import local
 from urllib2 import URLError
 
+from .stream import DEFAULT_CHUNK_SIZE, iter_chunks, iter_file
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# durability modes of writes
+NONE = "none"  # write in place, rely on OS to flush data
+ATOMIC = "atomic"  # write in temporary file then rename it
+FSYNC = "fsync"  # as atomic and flush file and directory to disk
+
+DURABILITY = NONE
+
+# read once, os.umask can only be queried by changing it
+_umask = os.umask(0)
+os.umask(_umask)
+
+_groups = local()
+
+
+class GroupCommit(object):
+    """Defer durability work of many writes to a single commit.
+
+    Files written in ATOMIC or FSYNC mode inside the group are kept
+    in temporary files. When the group exits, all pending files are
+    flushed together (FSYNC), renamed in place then their directories
+    are flushed once each. Readers do not see the new content before
+    the commit. If an error escapes the group, nothing is committed.
+
+    Groups are local to the thread that opened them.
+    """
+
+    def __init__(self):
+        self.pending = []
+
+    def __enter__(self):
+        stack = getattr(_groups, 'stack', None)
+        if stack is None:
+            stack = []
+            _groups.stack = stack
+        stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _groups.stack.pop()
+        pending = self.pending
+        self.pending = []
+
+        if exc_type is not None:
+            for tmp_pth, pth, durability in pending:
+                _remove_quietly(tmp_pth)
+            return False
+
+        try:
+            self.commit(pending)
+        except OSError as e:
+            raise URLError(e)
+
+        return False
+
+    @staticmethod
+    def commit(pending):
+        """Make pending files durable and visible.
+
+        Args:
+            pending: (list of (str, str, str)) path to temporary file,
+                     path to final file and durability mode
+
+        Returns:
+            None
+        """
+        for tmp_pth, pth, durability in pending:
+            if durability == FSYNC:
+                _fsync(tmp_pth)
+
+        dirs = set()
+        for tmp_pth, pth, durability in pending:
+            os.rename(tmp_pth, pth)
+            if durability == FSYNC:
+                dirs.add(os.path.dirname(os.path.abspath(pth)))
+
+        for dpth in dirs:
+            _fsync(dpth)
+
+
+def group_commit():
+    """Open a group of writes committed together.
+
+    Examples:
+        with group_commit():
+            for url, cnt in outputs:
+                write(url, cnt, durability=FSYNC)
+
+    Returns:
+        (GroupCommit): context manager
+    """
+    return GroupCommit()
+
+
+def _current_group():
+    """Innermost group opened by current thread, if any.
+    """
+    stack = getattr(_groups, 'stack', None)
+    if stack:
+        return stack[-1]
+
+    return None
+
+
+def _fsync(pth):
+    """Flush a file or directory to disk.
+
+    Args:
+        pth: (str) path to file or directory
+
+    Returns:
+        None
+    """
+    try:
+        fd = os.open(pth, os.O_RDONLY)
+    except OSError:
+        if os.path.isdir(pth):  # some platforms can not open dirs
+            return
+        raise
+
+    try:
+        os.fsync(fd)
+    except OSError:
+        if not os.path.isdir(pth):
+            raise
+    finally:
+        os.close(fd)
+
+
+def _remove_quietly(pth):
+    """Remove a file, ignoring errors.
+    """
+    try:
+        os.remove(pth)
+    except OSError:
+        pass
+
+
+def _file_mode(pth):
+    """Permissions of a file about to be replaced.
+
+    Args:
+        pth: (str) path to file
+
+    Returns:
+        (int): mode of existing file, otherwise mode of a new file
+               created by open
+    """
+    try:
+        return S_IMODE(os.stat(pth).st_mode)
+    except OSError:
+        return 0o666 & ~_umask
+
+
+def _write_chunks(pth, chunks, binary, durability):
+    """Write chunks of content in a file with the given durability.
+
+    Raises: IOError, OSError if file is not accessible
+
+    Args:
+        pth: (str) path to file
+        chunks: (iter of string|ByteArray) content
+        binary: (Bool) whether to write the file as a binary file
+        durability: (str) one of NONE, ATOMIC or FSYNC, None means
+                    module default DURABILITY
+
+    Returns:
+        None
+    """
+    if binary:
+        mode = 'wb'
+    else:
+        mode = 'w'
+
+    if durability is None:
+        durability = DURABILITY
+
+    if durability == NONE:
+        with open(pth, mode) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return
+
+    if durability not in (ATOMIC, FSYNC):
+        raise ValueError("unknown durability mode '%s'" % durability)
+
+    dname, name = os.path.split(pth)
+    fid, tmp_pth = mkstemp(prefix=".%s." % name, suffix=".tmp", dir=dname or ".")
+    try:
+        os.chmod(tmp_pth, _file_mode(pth))  # mkstemp creates files as 0600
+        with os.fdopen(fid, mode) as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+        group = _current_group()
+        if group is not None:
+            group.pending.append((tmp_pth, pth, durability))
+        else:
+            GroupCommit.commit([(tmp_pth, pth, durability)])
+    except:
+        _remove_quietly(tmp_pth)
+        raise
+
+
+def _iter_dir(root):
+    """Iterate over entries of a directory.
+
+    Use scandir when available (python 3.5+ or scandir package) to
+    get the type of each entry without an extra stat.
+
+    Raises: OSError if root is not accessible
+
+    Args:
+        root: (str) path to directory
+
+    Returns:
+        (iter of (str, Bool)): name of entries and flag set to True
+                               for directories
+    """
+    if scandir is None:
+        names = os.listdir(root)
+        return ((name, os.path.isdir(os.path.join(root, name))) for name in names)
+
+    return _iter_entries(scandir(root))
 
-def ls(url):
-    """List all available resources at the given location
+
+def _iter_entries(it):
+    """Iterate over a scandir iterator and close it when done.
+    """
+    try:
+        for entry in it:
+            yield entry.name, entry.is_dir()
+    finally:
+        close = getattr(it, 'close', None)  # python 3.6+
+        if close is not None:
+            close()
+
+
+def iter_ls(url):
+    """Iterate over all available resources at the given location
 
     Warnings: work only on directory like resources.
 
+    Raises: URLError if resource is not accessible
+
     Args:
         url: (urlparse.SplitResult) Resource locator
 
     Returns:
-        (list of (url, Bool)): list of urls and flag set to True
+        (iter of (url, Bool)): urls and flag set to True
                                if url is a directory like resource.
     """
     root = url.path
 
     try:
-        ret = []
-        for name in os.listdir(root):
-            pth = os.path.join(root, name)
-            ret.append((pth.replace("\\", "/"), os.path.isdir(pth)))
-
-        return ret
+        entries = _iter_dir(root)
     except OSError as e:
         raise URLError(e)
 
+    return ((os.path.join(root, name).replace("\\", "/"), isdir)
+            for name, isdir in entries)
+
+
+def ls(url):
+    """List all available resources at the given location
+
+    Warnings: work only on directory like resources.
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+
+    Returns:
+        (list of (url, Bool)): list of urls and flag set to True
+                               if url is a directory like resource.
+    """
+    return list(iter_ls(url))
+
+
+def walk(url, max_depth=None, pattern=None):
+    """Recursively iterate over all resources below the given location
+
+    Directories are visited depth first.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        max_depth: (int) max depth of resources to visit, 1 means
+                   direct children only, None means no limit
+        pattern: (str) only yield resources whose name match this
+                 shell like pattern (e.g. '*.txt'), all directories
+                 are visited anyway
+
+    Returns:
+        (iter of (url, Bool)): urls and flag set to True
+                               if url is a directory like resource.
+    """
+    stack = [(iter_ls(url), 1)]
+    while len(stack) > 0:
+        entries, depth = stack[-1]
+        for pth, isdir in entries:
+            if pattern is None or fnmatch(os.path.basename(pth), pattern):
+                yield pth, isdir
+            if isdir and (max_depth is None or depth < max_depth):
+                try:
+                    stack.append((iter_ls(url._replace(path=pth)), depth + 1))
+                except URLError:  # removed or not readable
+                    continue
+                break
+        else:
+            stack.pop()
+
 
 def exists(url):
     """Check the existence of a resource.
@@ -42,6 +344,26 @@ def exists(url):
     return os.path.exists(url.path)
 
 
+def stat(url):
+    """Fetch metadata associated to a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+
+    Returns:
+        (dict): with keys 'size' (int), 'mtime' (float, seconds since
+                epoch) and 'etag' (always None for local files)
+    """
+    try:
+        st = os.stat(url.path)
+    except OSError as e:
+        raise URLError(e)
+
+    return dict(size=st.st_size, mtime=st.st_mtime, etag=None)
+
+
 def _ensure_dir(pth):
     """Recursively ensure that all dir in pth have been created
 
@@ -57,10 +379,14 @@ def _ensure_dir(pth):
 
     if not os.path.exists(dpth):
         _ensure_dir(dpth)
-        os.mkdir(dpth)
+        try:
+            os.mkdir(dpth)
+        except OSError as e:
+            if e.errno != errno.EEXIST:  # created concurrently
+                raise
 
 
-def touch(url):
+def touch(url, durability=None):
     """Create a resource.
 
     Used mostly to create file in a single unit of computation
@@ -68,13 +394,18 @@ def touch(url):
 
     Args:
         url: (urlparse.SplitResult) Resource locator
+        durability: (str) one of NONE, ATOMIC or FSYNC, None means
+                    module default DURABILITY
 
     Returns:
         (Bool): operation has been successful
     """
     _ensure_dir(url.path)
-    with open(url.path, 'w'):
-        os.utime(url.path, None)
+    if (durability or DURABILITY) == NONE:
+        with open(url.path, 'w'):
+            os.utime(url.path, None)
+    else:
+        _write_chunks(url.path, [], False, durability)
     return True
 
 
@@ -122,26 +453,250 @@ def read(url, binary=False):
         raise URLError(e)
 
 
-def write(url, content, binary=False):
-    """Write the content in a resource.
+def read_range(url, offset, length=None, binary=False):
+    """Read part of the content of a resource.
 
     Raises: URLError if resource is not accessible
 
     Args:
         url: (urlparse.SplitResult) Resource locator
-        content: (string|ByteArray) conte of the resource
-        binary: (Bool) whether to write the resource as a binary file
+        offset: (int) position of first byte to read
+        length: (int) max number of bytes to read, None means
+                up to the end of the resource
+        binary: (Bool) whether to open the resource as a binary file
 
     Returns:
-        (None)
+        (string|ByteArray): requested part of the content
     """
     if binary:
-        mode = 'wb'
+        mode = 'rb'
     else:
-        mode = 'w'
+        mode = 'r'
 
     try:
         with open(url.path, mode) as f:
-            f.write(content)
+            f.seek(offset)
+            if length is None:
+                return f.read()
+            else:
+                return f.read(length)
     except IOError as e:
         raise URLError(e)
+
+
+def read_mmap(url):
+    """Map the content of a resource in memory without copying it.
+
+    Pages are shared with the OS cache hence with every other process
+    mapping the same file. The returned object supports the buffer
+    interface (e.g. numpy.frombuffer) and slicing.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+
+    Returns:
+        (mmap.mmap|str): read only view on the content of the resource,
+                         empty string for empty resources
+    """
+    try:
+        with open(url.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return ""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, mmap.error) as e:
+        raise URLError(e)
+
+
+def open_read(url, binary=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read the content of a resource chunk by chunk.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        binary: (Bool) whether to open the resource as a binary file
+        chunk_size: (int) max size of each chunk
+
+    Returns:
+        (iter of string|ByteArray): successive chunks of content
+    """
+    if binary:
+        mode = 'rb'
+    else:
+        mode = 'r'
+
+    try:
+        f = open(url.path, mode)
+    except IOError as e:
+        raise URLError(e)
+
+    return iter_file(f, chunk_size)
+
+
+def write(url, content, binary=False, durability=None):
+    """Write the content in a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        content: (string|ByteArray) conte of the resource
+        binary: (Bool) whether to write the resource as a binary file
+        durability: (str) one of NONE, ATOMIC or FSYNC, None means
+                    module default DURABILITY
+
+    Returns:
+        (None)
+    """
+    try:
+        _write_chunks(url.path, [content], binary, durability)
+    except (IOError, OSError) as e:
+        raise URLError(e)
+
+
+def write_stream(url, content, binary=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                 durability=None):
+    """Write content provided chunk by chunk in a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        content: (file|iter of string|ByteArray) either a file like
+                 object opened for reading or an iterable of chunks
+        binary: (Bool) whether to write the resource as a binary file
+        chunk_size: (int) max size of chunks read from file like objects
+        durability: (str) one of NONE, ATOMIC or FSYNC, None means
+                    module default DURABILITY
+
+    Returns:
+        (None)
+    """
+    try:
+        _write_chunks(url.path, iter_chunks(content, chunk_size), binary, durability)
+    except (IOError, OSError) as e:
+        raise URLError(e)
+
+
+def upload(local_pth, url):
+    """Copy a local file into a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        local_pth: (str) path to local file
+        url: (urlparse.SplitResult) Resource locator
+
+    Returns:
+        (None)
+    """
+    try:
+        shutil.copyfile(local_pth, url.path)
+    except (IOError, OSError) as e:
+        raise URLError(e)
+
+
+def download(url, local_pth):
+    """Copy a resource into a local file.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        local_pth: (str) path to local file, overwritten if it exists
+
+    Returns:
+        None
+    """
+    try:
+        shutil.copyfile(url.path, local_pth)
+    except (IOError, OSError) as e:
+        raise URLError(e)
+
+
+def _copy_file(src, dst):
+    """Copy content of a file without going through python buffers
+    when the OS allows it.
+
+    Args:
+        src: (str) path to source file
+        dst: (str) path to destination file
+
+    Returns:
+        None
+    """
+    if not hasattr(os, "sendfile"):
+        shutil.copyfile(src, dst)
+        return
+
+    with open(src, 'rb') as fsrc:
+        with open(dst, 'wb') as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+
+
+def copy(src, dst, link=False):
+    """Copy a resource, recursively for directories.
+
+    Args:
+        src: (urlparse.SplitResult) Resource locator of source
+        dst: (urlparse.SplitResult) Resource locator of destination
+        link: (Bool) whether to create hard links instead of copying
+              file contents, both resources will then share the same
+              content
+
+    Returns:
+        None
+    """
+    try:
+        if os.path.isdir(src.path):
+            for name in os.listdir(src.path):
+                copy(src._replace(path=os.path.join(src.path, name)),
+                     dst._replace(path=os.path.join(dst.path, name)),
+                     link)
+            if not os.path.isdir(dst.path):
+                os.makedirs(dst.path)
+            return
+
+        _ensure_dir(dst.path)
+        if link:
+            try:
+                if os.path.exists(dst.path):
+                    os.remove(dst.path)
+                os.link(src.path, dst.path)
+                return
+            except OSError:  # e.g. not on the same device
+                pass
+
+        _copy_file(src.path, dst.path)
+    except (IOError, OSError) as e:
+        raise URLError(e)
+
+
+def move(src, dst):
+    """Move a resource, recursively for directories.
+
+    Args:
+        src: (urlparse.SplitResult) Resource locator of source
+        dst: (urlparse.SplitResult) Resource locator of destination
+
+    Returns:
+        None
+    """
+    try:
+        _ensure_dir(dst.path)
+        try:
+            os.rename(src.path, dst.path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(src.path, dst.path)
+    except (IOError, OSError) as e:
+        raise URLError(e)
@@ -0,0 +1,342 @@
+"""This file contains instrumentation of operations made through the api
+
+When enabled, every call dispatched by the api front end records, per
+backend and operation:
+
+ - number of calls and of errors
+ - latency histogram (seconds)
+ - number of bytes moved
+
+and backends record the number of subprocesses they spawn. Streaming
+operations (open_read, write_stream, walk) are measured up to the
+exhaustion of their iterator.
+
+Recorded data are available as a snapshot dict, as text in the
+Prometheus exposition format, or pushed to user callbacks as events.
+
+Disabled by default, the cost is then a single flag check per call.
+"""
+import os
+from threading import Lock
+from time import time
+
+# upper bounds of latency histogram buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1., 5., 10., 60., float('inf'))
+
+_enabled = [False]
+_lock = Lock()
+
+# (backend, op) -> dict of counters
+_stats = {}
+
+# backend -> number of subprocesses spawned
+_subprocesses = {}
+
+_callbacks = []
+
+
+def enable():
+    """Start recording operations.
+
+    Returns:
+        None
+    """
+    _enabled[0] = True
+
+
+def disable():
+    """Stop recording operations, recorded data are kept.
+
+    Returns:
+        None
+    """
+    _enabled[0] = False
+
+
+def is_enabled():
+    """Check whether operations are recorded.
+
+    Returns:
+        (Bool)
+    """
+    return _enabled[0]
+
+
+def reset():
+    """Forget all recorded data.
+
+    Returns:
+        None
+    """
+    with _lock:
+        _stats.clear()
+        _subprocesses.clear()
+
+
+def add_callback(callback):
+    """Register a function called after each recorded operation.
+
+    The callback receives a dict with keys 'backend', 'op', 'url',
+    'start', 'duration', 'bytes' and 'error' (None or the message of
+    the exception). It is called in the thread that made the call and
+    must not raise.
+
+    Args:
+        callback: (callable) function taking an event dict
+
+    Returns:
+        None
+    """
+    with _lock:
+        _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    """Unregister a callback.
+
+    Args:
+        callback: (callable) function previously registered
+
+    Returns:
+        None
+    """
+    with _lock:
+        if callback in _callbacks:
+            _callbacks.remove(callback)
+
+
+def backend_name(backend):
+    """Short name used to identify a backend in recorded data.
+
+    Args:
+        backend: (module|object) backend implementing the api
+
+    Returns:
+        (str): e.g. 'local_api'
+    """
+    name = getattr(backend, '__name__', None) or type(backend).__name__
+    return name.rsplit(".", 1)[-1]
+
+
+def record(backend, op, url, start, duration, nbytes=0, error=None):
+    """Record a single operation.
+
+    Args:
+        backend: (str) name of backend
+        op: (str) name of operation
+        url: (str) resource locator
+        start: (float) time at which operation started
+        duration: (float) duration of operation in seconds
+        nbytes: (int) number of bytes moved
+        error: (str) message of error raised, None if successful
+
+    Returns:
+        None
+    """
+    key = (backend, op)
+    with _lock:
+        st = _stats.get(key)
+        if st is None:
+            st = dict(calls=0, errors=0, bytes=0, latency_sum=0.,
+                      buckets=[0] * len(BUCKETS))
+            _stats[key] = st
+
+        st['calls'] += 1
+        st['bytes'] += nbytes
+        st['latency_sum'] += duration
+        if error is not None:
+            st['errors'] += 1
+        for i, bound in enumerate(BUCKETS):
+            if duration <= bound:
+                st['buckets'][i] += 1
+                break
+
+        callbacks = list(_callbacks)
+
+    if callbacks:
+        event = dict(backend=backend, op=op, url=url, start=start,
+                     duration=duration, bytes=nbytes, error=error)
+        for callback in callbacks:
+            callback(event)
+
+
+def count_subprocess(backend):
+    """Record the spawn of a subprocess.
+
+    Args:
+        backend: (str) name of backend
+
+    Returns:
+        None
+    """
+    if not _enabled[0]:
+        return
+
+    with _lock:
+        _subprocesses[backend] = _subprocesses.get(backend, 0) + 1
+
+
+def _size(content):
+    """Number of bytes in some content, 0 if unknown.
+    """
+    try:
+        return len(content)
+    except TypeError:
+        return 0
+
+
+def _local_size(pth):
+    """Size of local file, 0 if not accessible.
+    """
+    try:
+        return os.path.getsize(pth)
+    except OSError:
+        return 0
+
+
+def _measure_iter(backend, op, url, start, chunks, count_bytes):
+    """Record operation when an iterator is exhausted or closed.
+    """
+    nbytes = 0
+    error = None
+    try:
+        for chunk in chunks:
+            if count_bytes:
+                nbytes += _size(chunk)
+            yield chunk
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        record(backend, op, url, start, time() - start, nbytes, error)
+
+
+def measure(backend, op, url, func, args):
+    """Call a backend operation and record it.
+
+    Args:
+        backend: (module|object) backend implementing the api
+        op: (str) name of operation
+        url: (urlparse.SplitResult) Resource locator
+        func: (callable) operation of backend
+        args: (tuple) arguments of operation
+
+    Returns:
+        (any): result of operation
+    """
+    name = backend_name(backend)
+    url = url.geturl()
+    start = time()
+
+    if op == 'write_stream':  # count bytes as they are consumed
+        args = list(args)
+        counter = [0]
+
+        def counting(chunks):
+            for chunk in chunks:
+                counter[0] += _size(chunk)
+                yield chunk
+
+        from .stream import iter_chunks
+        args[1] = counting(iter_chunks(args[1], args[3]))
+    else:
+        counter = None
+
+    try:
+        res = func(*args)
+    except Exception as e:
+        record(name, op, url, start, time() - start, 0, str(e))
+        raise
+
+    if op in ('open_read', 'walk'):
+        return _measure_iter(name, op, url, start, res, op == 'open_read')
+
+    if op in ('read', 'read_range'):
+        nbytes = _size(res)
+    elif op == 'write':
+        nbytes = _size(args[1])
+    elif op == 'write_stream':
+        nbytes = counter[0]
+    elif op == 'upload':
+        nbytes = _local_size(args[0])
+    elif op == 'download':
+        nbytes = _local_size(args[1])
+    elif op == 'read_many':
+        nbytes = sum(_size(cnt) for item_url, cnt, err in res if err is None)
+    elif op == 'write_many':
+        nbytes = sum(_size(cnt) for item_url, cnt in args[0])
+    else:
+        nbytes = 0
+
+    record(name, op, url, start, time() - start, nbytes)
+    return res
+
+
+def snapshot():
+    """Copy of recorded data.
+
+    Returns:
+        (dict): {'operations': {backend: {op: counters}},
+                 'subprocesses': {backend: count}} where counters is a
+                dict with keys 'calls', 'errors', 'bytes',
+                'latency_sum' and 'buckets', a list of (bound, count)
+                non cumulative
+    """
+    with _lock:
+        ops = {}
+        for (backend, op), st in _stats.items():
+            cnt = dict(st, buckets=list(zip(BUCKETS, st['buckets'])))
+            ops.setdefault(backend, {})[op] = cnt
+
+        return dict(operations=ops, subprocesses=dict(_subprocesses))
+
+
+def _fmt_bound(bound):
+    if bound == float('inf'):
+        return "+Inf"
+    return repr(bound)
+
+
+def to_prometheus(prefix="ura"):
+    """Export recorded data in the Prometheus text exposition format.
+
+    Args:
+        prefix: (str) prefix of metric names
+
+    Returns:
+        (str)
+    """
+    snap = snapshot()
+    items = sorted((backend, op, st)
+                   for backend, ops in snap['operations'].items()
+                   for op, st in ops.items())
+
+    lines = []
+    for metric, key, help_txt in (("calls_total", 'calls', "Number of operations"),
+                                  ("errors_total", 'errors', "Number of failed operations"),
+                                  ("bytes_total", 'bytes', "Number of bytes moved")):
+        name = "%s_%s" % (prefix, metric)
+        lines.append("# HELP %s %s" % (name, help_txt))
+        lines.append("# TYPE %s counter" % name)
+        for backend, op, st in items:
+            lines.append('%s{backend="%s",op="%s"} %d' % (name, backend, op, st[key]))
+
+    name = "%s_latency_seconds" % prefix
+    lines.append("# HELP %s Duration of operations" % name)
+    lines.append("# TYPE %s histogram" % name)
+    for backend, op, st in items:
+        labels = 'backend="%s",op="%s"' % (backend, op)
+        total = 0
+        for bound, count in st['buckets']:
+            total += count
+            lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, _fmt_bound(bound), total))
+        lines.append('%s_sum{%s} %r' % (name, labels, st['latency_sum']))
+        lines.append('%s_count{%s} %d' % (name, labels, st['calls']))
+
+    name = "%s_subprocesses_total" % prefix
+    lines.append("# HELP %s Number of subprocesses spawned" % name)
+    lines.append("# TYPE %s counter" % name)
+    for backend, count in sorted(snap['subprocesses'].items()):
+        lines.append('%s{backend="%s"} %d' % (name, backend, count))
+
+    return "\n".join(lines) + "\n"
@@ -1,8 +1,112 @@
 """This file contains the common api to access resources
 """
+from email.utils import mktime_tz, parsedate_tz
+from threading import Lock
+from urllib2 import HTTPError, URLError
+
 import requests
-from requests.exceptions import ConnectionError, InvalidSchema
-from urllib2 import URLError
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, InvalidSchema, Timeout
+
+from . import timeouts
+from .stream import DEFAULT_CHUNK_SIZE, iter_chunks
+
+_session = [None]
+_session_lock = Lock()
+
+
+def _timeout():
+    """Connect and read timeouts of a new request.
+
+    Raises: URLError if current deadline has expired
+
+    Returns:
+        (float, float): see timeouts.get
+    """
+    return timeouts.get('connect'), timeouts.get('read')
+
+
+def _status_error(url, resp, msg="url does not exists"):
+    """Error reporting an unexpected http status.
+
+    The status code is kept in the 'code' attribute.
+
+    Returns:
+        (HTTPError): subclass of URLError
+    """
+    return HTTPError(url.geturl(), resp.status_code, msg, resp.headers, None)
+
+
+def create_session(pool_connections=10, pool_maxsize=10, pool_block=False):
+    """Create a session with keep-alive connection pools.
+
+    Args:
+        pool_connections: (int) number of hosts for which a pool is kept
+        pool_maxsize: (int) max number of connections kept per host
+        pool_block: (Bool) whether to wait for a free connection instead
+                    of opening extra ones when a pool is exhausted
+
+    Returns:
+        (requests.Session)
+    """
+    session = requests.Session()
+    for prefix in ("http://", "https://"):
+        session.mount(prefix, HTTPAdapter(pool_connections=pool_connections,
+                                          pool_maxsize=pool_maxsize,
+                                          pool_block=pool_block))
+
+    return session
+
+
+def set_session(session):
+    """Set the session shared by all calls of this module.
+
+    Args:
+        session: (requests.Session) session to use, None to go back
+                 to a default session created on next call
+
+    Returns:
+        None
+    """
+    with _session_lock:
+        old = _session[0]
+        _session[0] = session
+
+    if old is not None and old is not session:
+        old.close()
+
+
+def configure_session(pool_connections=10, pool_maxsize=10, pool_block=False):
+    """Replace the shared session by one with the given pool sizing.
+
+    Args:
+        pool_connections: (int) number of hosts for which a pool is kept
+        pool_maxsize: (int) max number of connections kept per host
+        pool_block: (Bool) whether to wait for a free connection instead
+                    of opening extra ones when a pool is exhausted
+
+    Returns:
+        None
+    """
+    set_session(create_session(pool_connections, pool_maxsize, pool_block))
+
+
+def get_session():
+    """Access the session shared by all calls of this module.
+
+    Connections are kept alive and reused between calls and threads.
+
+    Returns:
+        (requests.Session)
+    """
+    session = _session[0]
+    if session is None:
+        with _session_lock:
+            if _session[0] is None:
+                _session[0] = create_session()
+            session = _session[0]
+
+    return session
 
 
 def ls(url):
@@ -21,6 +125,32 @@ def ls(url):
     raise NotImplementedError
 
 
+def _head(url):
+    """Fetch headers of a resource without transferring its body.
+
+    Use a HEAD request or a single byte ranged GET if the server
+    refuses HEAD.
+
+    Raises: URLError if url is not valid
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+
+    Returns:
+        (requests.Response): response with no body
+    """
+    try:
+        resp = get_session().head(url.geturl(), allow_redirects=True, timeout=_timeout())
+        if resp.status_code in (405, 501):  # HEAD not supported
+            resp = get_session().get(url.geturl(), headers={'Range': "bytes=0-0"},
+                                     stream=True, timeout=_timeout())
+            resp.close()
+    except (ConnectionError, InvalidSchema, Timeout) as e:
+        raise URLError(e)
+
+    return resp
+
+
 def exists(url):
     """Check the existence of a resource.
 
@@ -30,12 +160,43 @@ def exists(url):
     Returns:
         (Bool): True if resource is accessible
     """
-    try:
-        resp = requests.get(url.geturl())
-    except InvalidSchema as e:
-        raise URLError(e)
+    return _head(url).status_code < 400
+
+
+def stat(url):
+    """Fetch metadata associated to a resource.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
 
-    return resp.status_code < 400
+    Returns:
+        (dict): with keys 'size' (int), 'mtime' (float, seconds since
+                epoch) and 'etag' (str), None if server do not provide
+                this information
+    """
+    resp = _head(url)
+    if resp.status_code >= 400:
+        raise _status_error(url, resp)
+
+    headers = resp.headers
+    size = None
+    if resp.status_code == 206:
+        rng = headers.get('Content-Range', "")
+        total = rng.rpartition("/")[2]
+        if total.isdigit():
+            size = int(total)
+    elif 'Content-Length' in headers:
+        size = int(headers['Content-Length'])
+
+    mtime = None
+    if 'Last-Modified' in headers:
+        date = parsedate_tz(headers['Last-Modified'])
+        if date is not None:
+            mtime = float(mktime_tz(date))
+
+    return dict(size=size, mtime=mtime, etag=headers.get('ETag'))
 
 
 def touch(url):
@@ -82,12 +243,12 @@ def read(url, binary=False):
         (string|ByteArray): content of the resource
     """
     try:
-        resp = requests.get(url.geturl())
-    except InvalidSchema as e:
+        resp = get_session().get(url.geturl(), timeout=_timeout())
+    except (ConnectionError, InvalidSchema, Timeout) as e:
         raise URLError(e)
 
     if resp.status_code >= 400:
-        raise URLError("url does not exists")
+        raise _status_error(url, resp)
 
     if binary:
         return resp.content
@@ -95,7 +256,171 @@ def read(url, binary=False):
         return resp.text
 
 
-def write(url, content, binary=False):
+def fetch_if_none_match(url, local_pth, etag=None):
+    """Download a resource in a local file unless it has not changed.
+
+    Use a conditional GET with an If-None-Match header.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        local_pth: (str) path of local file to write
+        etag: (str) ETag of the version already known, None to
+              always download the resource
+
+    Returns:
+        (Bool, str, str): whether the resource has been downloaded,
+                          its current ETag and its text encoding
+    """
+    headers = {}
+    if etag is not None:
+        headers['If-None-Match'] = etag
+
+    try:
+        resp = get_session().get(url.geturl(), headers=headers, stream=True,
+                                 timeout=_timeout())
+    except (ConnectionError, InvalidSchema, Timeout) as e:
+        raise URLError(e)
+
+    try:
+        if resp.status_code == 304:
+            return False, etag, resp.encoding
+
+        if resp.status_code >= 400:
+            raise _status_error(url, resp)
+
+        try:
+            with open(local_pth, 'wb') as f:
+                for chunk in resp.iter_content(DEFAULT_CHUNK_SIZE):
+                    f.write(chunk)
+        except IOError as e:
+            raise URLError(e)
+
+        return True, resp.headers.get('ETag'), resp.encoding
+    finally:
+        resp.close()
+
+
+def read_range(url, offset, length=None, binary=False):
+    """Read part of the content of a resource.
+
+    Use http Range requests. If the server ignores the range and
+    sends the whole content, the response is streamed and only the
+    requested part is kept.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        offset: (int) position of first byte to read
+        length: (int) max number of bytes to read, None means
+                up to the end of the resource
+        binary: (Bool) whether to open the resource as a binary file
+
+    Returns:
+        (string|ByteArray): requested part of the content
+    """
+    if length is None:
+        rng = "bytes=%d-" % offset
+    elif length <= 0:
+        return ""
+    else:
+        rng = "bytes=%d-%d" % (offset, offset + length - 1)
+
+    try:
+        resp = get_session().get(url.geturl(), headers={'Range': rng}, stream=True,
+                                 timeout=_timeout())
+    except (ConnectionError, InvalidSchema, Timeout) as e:
+        raise URLError(e)
+
+    try:
+        if resp.status_code == 416:  # range not satisfiable
+            return ""
+
+        if resp.status_code >= 400:
+            raise _status_error(url, resp)
+
+        if resp.status_code == 206:
+            cnt = resp.content
+        else:  # server ignored range, skip unwanted bytes
+            chunks = []
+            pos = 0
+            for chunk in resp.iter_content(DEFAULT_CHUNK_SIZE):
+                end = pos + len(chunk)
+                if end > offset:
+                    chunks.append(chunk[max(0, offset - pos):])
+                pos = end
+                if length is not None and pos >= offset + length:
+                    break
+
+            cnt = b"".join(chunks)
+            if length is not None:
+                cnt = cnt[:length]
+    finally:
+        resp.close()
+
+    if binary or resp.encoding is None:
+        return cnt
+    else:
+        return cnt.decode(resp.encoding, 'replace')
+
+
+def _iter_response(resp, binary, chunk_size):
+    """Iterate over the body of a streamed response.
+
+    Args:
+        resp: (requests.Response) response opened with stream=True
+        binary: (Bool) whether to decode content as text
+        chunk_size: (int) max size of each chunk
+
+    Returns:
+        (iter of string|ByteArray): chunks of content
+    """
+    try:
+        for chunk in resp.iter_content(chunk_size, decode_unicode=not binary):
+            if chunk:
+                yield chunk
+    finally:
+        resp.close()
+
+
+def open_read(url, binary=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read the content of a resource chunk by chunk.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        binary: (Bool) whether to open the resource as a binary file
+        chunk_size: (int) max size of each chunk
+
+    Returns:
+        (iter of string|ByteArray): successive chunks of content
+    """
+    try:
+        resp = get_session().get(url.geturl(), stream=True, timeout=_timeout())
+    except (ConnectionError, InvalidSchema, Timeout) as e:
+        raise URLError(e)
+
+    if resp.status_code >= 400:
+        resp.close()
+        raise _status_error(url, resp)
+
+    return _iter_response(resp, binary, chunk_size)
+
+
+def _headers(content_encoding):
+    """Headers sent along with some content.
+    """
+    headers = {'content-type': 'application/json'}
+    if content_encoding is not None:
+        headers['content-encoding'] = content_encoding
+
+    return headers
+
+
+def write(url, content, binary=False, content_encoding=None):
     """Write the content in a resource.
 
     Warnings: content must be some json data
@@ -106,15 +431,97 @@ def write(url, content, binary=False):
         url: (urlparse.SplitResult) Resource locator
         content: (string|ByteArray) conte of the resource
         binary: (Bool) whether to write the resource as a binary file
+        content_encoding: (str) value of Content-Encoding header if
+                          content is already compressed, e.g. 'gzip'
+
+    Returns:
+        (None)
+    """
+    del binary
+    try:
+        ret = get_session().post(url.geturl(), content,
+                                 headers=_headers(content_encoding),
+                                 timeout=_timeout())
+        if ret.status_code > 400:
+            raise _status_error(url, ret, "unable to send data")
+    except (ConnectionError, InvalidSchema, Timeout) as e:
+        raise URLError(e)
+
+
+def write_stream(url, content, binary=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                 content_encoding=None):
+    """Write content provided chunk by chunk in a resource.
+
+    Content is sent using chunked transfer encoding.
+
+    Warnings: content must be some json data
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        content: (file|iter of string|ByteArray) either a file like
+                 object opened for reading or an iterable of chunks
+        binary: (Bool) whether to write the resource as a binary file
+        chunk_size: (int) max size of chunks read from file like objects
+        content_encoding: (str) value of Content-Encoding header if
+                          content is already compressed, e.g. 'gzip'
 
     Returns:
         (None)
     """
     del binary
     try:
-        ret = requests.post(url.geturl(), content,
-                            headers={'content-type': 'application/json'})
+        ret = get_session().post(url.geturl(), iter_chunks(content, chunk_size),
+                                 headers=_headers(content_encoding),
+                                 timeout=_timeout())
         if ret.status_code > 400:
-            raise URLError("unable to send data: %s" % ret.status_code)
-    except (ConnectionError, InvalidSchema) as e:
+            raise _status_error(url, ret, "unable to send data")
+    except (ConnectionError, InvalidSchema, Timeout) as e:
+        raise URLError(e)
+
+
+def upload(local_pth, url, content_encoding=None):
+    """Send the content of a local file without loading it in memory.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        local_pth: (str) path to local file
+        url: (urlparse.SplitResult) Resource locator
+        content_encoding: (str) value of Content-Encoding header if
+                          file is already compressed, e.g. 'gzip'
+
+    Returns:
+        (None)
+    """
+    try:
+        f = open(local_pth, 'rb')
+    except IOError as e:
         raise URLError(e)
+
+    with f:
+        try:
+            ret = get_session().post(url.geturl(), f,
+                                     headers=_headers(content_encoding),
+                                     timeout=_timeout())
+        except (ConnectionError, InvalidSchema, Timeout) as e:
+            raise URLError(e)
+
+    if ret.status_code > 400:
+        raise _status_error(url, ret, "unable to send data")
+
+
+def download(url, local_pth):
+    """Stream the content of a resource into a local file.
+
+    Raises: URLError if resource is not accessible
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+        local_pth: (str) path to local file, overwritten if it exists
+
+    Returns:
+        None
+    """
+    fetch_if_none_match(url, local_pth)
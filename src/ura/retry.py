@@ -0,0 +1,247 @@
+"""This file contains retry policies applied to remote operations
+
+A policy is associated to each url scheme (by default http, https and
+dirac) and used by the api front end for every dispatched operation:
+
+ - transient failures (connection errors, failed dirac-dms processes,
+   http 408/429/5xx) are retried after a jittered exponential backoff
+ - only idempotent operations (ls, walk, exists, stat, read, read_range,
+   open_read, download and batch exists_many, read_many) are retried by
+   default, writes (touch, write, upload, remove, copy and batch
+   write_many, remove_many) only if the policy allows it. write_stream
+   and move are never retried since they can not be replayed
+ - reads can be hedged: if an attempt takes longer than a threshold, a
+   duplicate is issued and the first successful answer is kept
+
+Errors meaning the resource does not exist or is not accessible are
+never retried, neither are attempts that would start after the current
+deadline (see timeouts module).
+"""
+import errno
+import random
+from Queue import Empty, Queue
+from subprocess import CalledProcessError
+from threading import Lock, Thread
+from time import sleep
+from urllib2 import HTTPError, URLError
+
+from . import timeouts
+
+IDEMPOTENT = ('ls', 'walk', 'exists', 'stat', 'read', 'read_range',
+              'open_read', 'download', 'exists_many', 'read_many')
+WRITES = ('touch', 'write', 'upload', 'remove', 'copy',
+          'write_many', 'remove_many')
+HEDGEABLE = ('exists', 'stat', 'read', 'read_range')
+
+TRANSIENT_STATUS = (408, 429, 500, 502, 503, 504)
+PERMANENT_ERRNO = (errno.ENOENT, errno.EACCES, errno.EPERM,
+                   errno.EISDIR, errno.ENOTDIR, errno.EEXIST)
+
+
+def is_transient(error):
+    """Check whether an error might not happen again.
+
+    Args:
+        error: (Exception) error raised by an operation
+
+    Returns:
+        (Bool)
+    """
+    if isinstance(error, HTTPError):
+        return error.code in TRANSIENT_STATUS
+
+    if isinstance(error, URLError):
+        error = error.reason
+        if not isinstance(error, Exception):  # message of backend
+            return False
+
+    if isinstance(error, CalledProcessError):
+        return True
+
+    if isinstance(error, EnvironmentError):
+        return error.errno not in PERMANENT_ERRNO
+
+    return False
+
+
+class RetryPolicy(object):
+    """Describe how operations are retried.
+
+    Args:
+        max_attempts: (int) max number of attempts, 1 means no retry
+        base_delay: (float) delay in seconds before first retry
+        max_delay: (float) max delay in seconds between two attempts
+        multiplier: (float) growth factor of delay between attempts
+        jitter: (Bool) whether to draw each delay uniformly between
+                zero and its nominal value (full jitter)
+        retry_writes: (Bool) whether writes are safe to retry for this
+                      backend, e.g. because they overwrite
+        hedge_after: (float) delay in seconds after which a duplicate
+                     of a pending read is issued, None for no hedging
+        retry_on: (callable) predicate telling whether an error can be
+                  retried, default is_transient
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.1, max_delay=5., multiplier=2.,
+                 jitter=True, retry_writes=False, hedge_after=None, retry_on=is_transient):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retry_writes = retry_writes
+        self.hedge_after = hedge_after
+        self.retry_on = retry_on
+
+    def delay(self, attempt):
+        """Delay to wait before a new attempt.
+
+        Args:
+            attempt: (int) number of attempts already made
+
+        Returns:
+            (float): delay in seconds
+        """
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        if self.jitter:
+            return random.uniform(0, delay)
+
+        return delay
+
+    def retries(self, op):
+        """Check whether an operation can be retried.
+
+        Args:
+            op: (str) name of operation
+
+        Returns:
+            (Bool)
+        """
+        if op in IDEMPOTENT:
+            return True
+
+        return self.retry_writes and op in WRITES
+
+    def wrap(self, op, func):
+        """Apply policy to a backend operation.
+
+        Args:
+            op: (str) name of operation
+            func: (callable) operation of backend
+
+        Returns:
+            (callable): func itself if the policy does not apply
+        """
+        hedge = self.hedge_after is not None and op in HEDGEABLE
+        retry = self.max_attempts > 1 and self.retries(op)
+        if not (hedge or retry):
+            return func
+
+        if hedge:
+            call = self._hedged(func)
+        else:
+            call = func
+
+        if not retry:
+            return call
+
+        def retried(*args):
+            attempt = 1
+            while True:
+                delay = self.delay(attempt)
+                try:
+                    return call(*args)
+                except Exception as e:
+                    if (attempt >= self.max_attempts or not self.retry_on(e)
+                            or not _before_deadline(delay)):
+                        raise
+                sleep(delay)
+                attempt += 1
+
+        return retried
+
+    def _hedged(self, func):
+        """Issue a duplicate call if the first one is too slow.
+        """
+        def run(queue, call, args):
+            try:
+                queue.put((True, call(*args)))
+            except Exception as e:
+                queue.put((False, e))
+
+        def hedged(*args):
+            queue = Queue()
+            call = timeouts.propagate(func)
+            _start(run, queue, call, args)
+            try:
+                ok, res = queue.get(timeout=self.hedge_after)
+                pending = 0
+            except Empty:
+                _start(run, queue, call, args)
+                ok, res = queue.get()
+                pending = 1
+
+            if not ok and pending > 0:
+                ok, res = queue.get()
+
+            if ok:
+                return res
+            raise res
+
+        return hedged
+
+
+def _before_deadline(delay):
+    """Check whether a new attempt can start after delay.
+    """
+    try:
+        left = timeouts.remaining()
+    except URLError:
+        return False
+
+    return left is None or delay < left
+
+
+def _start(target, *args):
+    """Run a function in a daemon thread.
+    """
+    th = Thread(target=target, args=args)
+    th.daemon = True
+    th.start()
+
+
+_policies = {
+    "http": RetryPolicy(),
+    "https": RetryPolicy(),
+    "dirac": RetryPolicy(),
+}
+_lock = Lock()
+
+
+def get_policy(scheme):
+    """Access the policy used for a url scheme.
+
+    Args:
+        scheme: (str) url scheme
+
+    Returns:
+        (RetryPolicy): None if operations are not retried
+    """
+    return _policies.get(scheme)
+
+
+def set_policy(scheme, policy):
+    """Set the policy used for a url scheme.
+
+    Args:
+        scheme: (str) url scheme, e.g. 'http'
+        policy: (RetryPolicy) policy to use, None to never retry
+
+    Returns:
+        None
+    """
+    with _lock:
+        if policy is None:
+            _policies.pop(scheme.lower(), None)
+        else:
+            _policies[scheme.lower()] = policy
@@ -0,0 +1,56 @@
+"""This file contains helpers to handle content as a stream of chunks
+"""
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def iter_file(f, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Iterate over the content of an opened file.
+
+    Warnings: file will be closed once exhausted.
+
+    Args:
+        f: (file) opened file like object
+        chunk_size: (int) max size of each chunk
+
+    Returns:
+        (iter of string|ByteArray): chunks of content
+    """
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        f.close()
+
+
+def iter_chunks(content, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Iterate over some content provided in various forms.
+
+    Warnings: file like objects are not closed by this function.
+
+    Args:
+        content: (string|ByteArray|file|iter) either some raw content,
+                 a file like object opened for reading or an iterable
+                 of chunks of content
+        chunk_size: (int) max size of each chunk read from file like
+                    objects
+
+    Returns:
+        (iter of string|ByteArray): chunks of content
+    """
+    if isinstance(content, (basestring, bytearray)):
+        if len(content) > 0:
+            yield content
+    elif hasattr(content, 'read'):
+        while True:
+            chunk = content.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        for chunk in content:
+            if chunk:
+                yield chunk
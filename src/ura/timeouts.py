@@ -0,0 +1,199 @@
+"""This file contains timeouts and deadlines of remote operations
+
+Three kinds of timeouts are used by backends:
+
+ - 'connect': max delay to open a connection (requests_api)
+ - 'read': max delay between two packets received (requests_api)
+ - 'subprocess': max duration of a dirac-dms-* process (dirac_engines),
+   no limit by default besides the current deadline
+
+Global defaults are set with set_defaults and can be overridden for
+the calls made in a block with limits. A deadline bounds the total
+duration of all the calls made in a block: each timeout is shortened
+to the time remaining and calls fail with a URLError once it expires.
+
+Limits and deadlines are local to a thread. Bulk, asynchronous and
+recursive operations propagate those of the calling thread to their
+workers (see propagate).
+
+Examples:
+    with timeouts.deadline(30.):
+        for url, cnt, err in bulk.read_many(urls):
+            ...
+"""
+from contextlib import contextmanager
+from threading import local, Lock
+from time import time
+from urllib2 import URLError
+
+KINDS = ('connect', 'read', 'subprocess')
+
+# no default limit on dirac-dms-* processes, large transfers take long
+_defaults = dict(connect=10., read=60., subprocess=None)
+_lock = Lock()
+
+_state = local()
+
+
+class DeadlineExceeded(URLError):
+    """Raised when an operation starts or runs past its deadline.
+    """
+
+    def __init__(self):
+        URLError.__init__(self, "deadline exceeded")
+
+
+def set_defaults(**kwds):
+    """Set global timeouts.
+
+    Args:
+        kwds: (dict of str: float) timeout in seconds for each kind
+              among KINDS, None means no timeout
+
+    Returns:
+        None
+    """
+    for kind in kwds:
+        if kind not in KINDS:
+            raise ValueError("unknown timeout '%s'" % kind)
+
+    with _lock:
+        _defaults.update(kwds)
+
+
+def get_defaults():
+    """Access global timeouts.
+
+    Returns:
+        (dict of str: float): timeout in seconds for each kind
+    """
+    with _lock:
+        return dict(_defaults)
+
+
+def _limits():
+    return getattr(_state, 'limits', None)
+
+
+def _deadline():
+    return getattr(_state, 'deadline', None)
+
+
+@contextmanager
+def limits(**kwds):
+    """Override global timeouts for calls made in a block.
+
+    Args:
+        kwds: (dict of str: float) timeout in seconds for each kind
+              among KINDS, None means no timeout
+
+    Returns:
+        (context manager)
+    """
+    for kind in kwds:
+        if kind not in KINDS:
+            raise ValueError("unknown timeout '%s'" % kind)
+
+    old = _limits()
+    _state.limits = dict(old or {}, **kwds)
+    try:
+        yield
+    finally:
+        _state.limits = old
+
+
+@contextmanager
+def deadline(seconds):
+    """Bound the total duration of calls made in a block.
+
+    Nested deadlines can only shorten the enclosing one.
+
+    Args:
+        seconds: (float) delay from now
+
+    Returns:
+        (context manager)
+    """
+    old = _deadline()
+    expire = time() + seconds
+    if old is not None:
+        expire = min(expire, old)
+
+    _state.deadline = expire
+    try:
+        yield
+    finally:
+        _state.deadline = old
+
+
+def remaining():
+    """Time left before the current deadline.
+
+    Raises: DeadlineExceeded if deadline has expired
+
+    Returns:
+        (float): delay in seconds, None if there is no deadline
+    """
+    expire = _deadline()
+    if expire is None:
+        return None
+
+    left = expire - time()
+    if left <= 0:
+        raise DeadlineExceeded()
+
+    return left
+
+
+def get(kind):
+    """Effective timeout for a new call.
+
+    Raises: DeadlineExceeded if deadline has expired
+
+    Args:
+        kind: (str) one of KINDS
+
+    Returns:
+        (float): timeout in seconds, None means no timeout
+    """
+    lim = _limits()
+    if lim is not None and kind in lim:
+        value = lim[kind]
+    else:
+        value = _defaults[kind]
+
+    left = remaining()
+    if left is None:
+        return value
+    if value is None:
+        return left
+
+    return min(value, left)
+
+
+def propagate(func):
+    """Bind limits and deadline of the calling thread to a function.
+
+    Used to run the function in a worker thread under the same
+    constraints.
+
+    Args:
+        func: (callable) function to wrap
+
+    Returns:
+        (callable): func itself if there is nothing to propagate
+    """
+    lim = _limits()
+    expire = _deadline()
+    if lim is None and expire is None:
+        return func
+
+    def bound(*args, **kwds):
+        old = _limits(), _deadline()
+        _state.limits, _state.deadline = lim, expire
+        try:
+            return func(*args, **kwds)
+        finally:
+            _state.limits, _state.deadline = old
+
+    return bound
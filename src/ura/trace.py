@@ -0,0 +1,221 @@
+"""This file contains tools to record and replay workloads
+
+A recorder logs every operation dispatched by the api front end
+(backend, operation, url, bytes moved, timing and outcome) to a trace
+file, one compact JSON object per line, gzipped if the path ends with
+'.gz'. It relies on the metrics module, enabled while recording.
+
+A trace can then be replayed against any backend, urls being optionally
+rewritten, either at original speed, accelerated or with no delay
+between operations (max concurrency). Written content is replaced by
+dummy bytes of the recorded size and batch operations (e.g. exists_many)
+are replayed as a single operation on the first url of the batch.
+
+Examples:
+    with trace.Recorder("job.trace.gz"):
+        run_job()
+
+    trace.replay("job.trace.gz", speed=10.,
+                 url_map=lambda url: url.replace("dirac:///vo", "/tmp/vo"))
+"""
+import gzip
+import json
+import os
+from tempfile import mkstemp
+from threading import BoundedSemaphore, Lock
+from time import sleep, time
+
+from . import api, bulk, metrics
+
+VERSION = 1
+MAX_WORKERS = 16
+
+
+def _open(pth, mode):
+    if pth.endswith(".gz"):
+        return gzip.open(pth, mode)
+
+    return open(pth, mode)
+
+
+class Recorder(object):
+    """Record operations in a trace file while active.
+
+    Args:
+        pth: (str) path to trace file, overwritten
+    """
+
+    def __init__(self, pth):
+        self.pth = pth
+        self.count = 0
+        self._f = None
+        self._t0 = None
+        self._was_enabled = False
+        self._lock = Lock()
+
+    def start(self):
+        """Start recording.
+
+        Returns:
+            None
+        """
+        self._t0 = time()
+        self._f = _open(self.pth, 'wb')
+        self._f.write(json.dumps(dict(version=VERSION, start=self._t0)) + "\n")
+        self._was_enabled = metrics.is_enabled()
+        metrics.add_callback(self._on_event)
+        metrics.enable()
+
+    def stop(self):
+        """Stop recording and close trace file.
+
+        Returns:
+            None
+        """
+        metrics.remove_callback(self._on_event)
+        if not self._was_enabled:
+            metrics.disable()
+
+        with self._lock:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _on_event(self, event):
+        """Write a single operation in trace file.
+        """
+        rec = dict(t=round(event['start'] - self._t0, 6),
+                   b=event['backend'],
+                   op=event['op'],
+                   url=event['url'],
+                   d=round(event['duration'], 6),
+                   n=event['bytes'])
+        if event['error'] is not None:
+            rec['e'] = event['error']
+
+        line = json.dumps(rec, separators=(',', ':')) + "\n"
+        with self._lock:
+            if self._f is not None:
+                self._f.write(line)
+                self.count += 1
+
+
+def load(pth):
+    """Read operations recorded in a trace file.
+
+    Raises: ValueError if file is not a trace
+
+    Args:
+        pth: (str) path to trace file
+
+    Returns:
+        (iter of dict): operations sorted by start time, with keys
+                        't' (start time relative to beginning of
+                        recording), 'b' (backend), 'op', 'url', 'd'
+                        (duration), 'n' (bytes) and optionally 'e'
+                        (error message)
+    """
+    with _open(pth, 'rb') as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get('version') != VERSION:
+            raise ValueError("'%s' is not a trace file" % pth)
+
+        events = [json.loads(line) for line in f if line.strip()]
+
+    events.sort(key=lambda ev: ev['t'])
+    return iter(events)
+
+
+def _consume(chunks):
+    for chunk in chunks:
+        pass
+
+
+def _download(url):
+    fid, pth = mkstemp()
+    os.close(fid)
+    try:
+        api.download(url, pth)
+    finally:
+        os.remove(pth)
+
+
+def _issue(op, url, nbytes):
+    """Issue an operation similar to a recorded one.
+    """
+    if op.endswith("_many"):  # only first url of batch is recorded
+        op = op[:-len("_many")]
+
+    if op in ('read', 'exists', 'stat', 'ls', 'touch', 'remove'):
+        getattr(api, op)(url)
+    elif op == 'read_range':
+        api.read_range(url, 0, nbytes, True)
+    elif op == 'open_read':
+        _consume(api.open_read(url, True))
+    elif op == 'walk':
+        _consume(api.walk(url))
+    elif op in ('write', 'write_stream', 'upload'):
+        api.write(url, b"\0" * nbytes, True)
+    elif op == 'download':
+        _download(url)
+    else:
+        raise ValueError("unable to replay operation '%s'" % op)
+
+
+def _replay_one(args):
+    """Replay a single operation and time it.
+    """
+    ev, url, t0 = args
+    start = time()
+    try:
+        _issue(ev['op'], url, ev['n'])
+        error = None
+    except Exception as e:
+        error = str(e)
+
+    return dict(op=ev['op'], url=url,
+                t=start - t0, d=time() - start,
+                recorded_d=ev['d'],
+                e=error, recorded_e=ev.get('e'))
+
+
+def replay(pth, speed=1., url_map=None, max_workers=MAX_WORKERS):
+    """Issue again the operations recorded in a trace.
+
+    Args:
+        pth: (str) path to trace file
+        speed: (float) acceleration factor of original timing, e.g. 2.
+               means twice faster, None means no delay between
+               operations (only bounded by max_workers)
+        url_map: (callable) function rewriting recorded urls to target
+                 another location or backend, None to keep them
+        max_workers: (int) max number of concurrent operations
+
+    Returns:
+        (list of dict): one entry per operation, in order of issue, with
+                        keys 'op', 'url', 't' (start time), 'd'
+                        (duration), 'recorded_d', 'e' (error message or
+                        None) and 'recorded_e'
+    """
+    pool = bulk.get_pool()
+    slots = BoundedSemaphore(max_workers)
+    t0 = time()
+    pending = []
+    for ev in load(pth):
+        if speed:
+            delay = t0 + ev['t'] / speed - time()
+            if delay > 0:
+                sleep(delay)
+
+        url = ev['url'] if url_map is None else url_map(ev['url'])
+        slots.acquire()
+        pending.append(pool.apply_async(_replay_one, ((ev, url, t0),),
+                                        callback=lambda res: slots.release()))
+
+    return [res.get() for res in pending]
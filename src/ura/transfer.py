@@ -0,0 +1,169 @@
+"""This file contains functions to copy and move resources between backends
+
+The cheapest route is chosen for each pair of schemes:
+
+ - same backend: backend own copy/move if any (e.g. os.rename or hard
+   links for local files, catalog rename for DIRAC)
+ - local source: upload of the file, no read in memory
+ - local destination: download in the file, no read in memory
+ - otherwise: content is streamed chunk by chunk
+
+Directory like resources are handled recursively, files being
+transferred concurrently. A source is removed only once its destination
+has been successfully written.
+"""
+import os
+import posixpath
+from urllib2 import URLError
+
+from . import api, bulk, local_api
+
+MAX_WORKERS = 8
+
+
+def _is_local(url):
+    """Check whether url is handled by local_api.
+    """
+    return api.get_backend(url) is local_api
+
+
+def _is_dir(url):
+    """Check whether url is a directory like resource.
+    """
+    if _is_local(url):
+        return os.path.isdir(url.path)
+
+    return url.path.endswith("/")
+
+
+def _join(url, name):
+    """Url of a child of a directory like resource.
+    """
+    return url._replace(path=posixpath.join(url.path, name))
+
+
+def _walk_files(url):
+    """Recursively list files below a directory like resource.
+
+    Args:
+        url: (urlparse.SplitResult) Resource locator
+
+    Returns:
+        (iter of str): path of files relative to url
+    """
+    root = url.path.rstrip("/") + "/"
+    for pth, isdir in api.walk(url):
+        if not isdir:
+            yield pth[len(root):]
+
+
+def _check(res, url):
+    """Raise if a backend reported a failure.
+
+    Raises: URLError if res is False
+    """
+    if res is False:
+        raise URLError("unable to transfer '%s'" % url.geturl())
+
+
+def _transfer_file(src, dst, move):
+    """Copy or move a single file like resource.
+
+    Raises: URLError if resource can not be transferred
+
+    Args:
+        src: (urlparse.SplitResult) Resource locator of source
+        dst: (urlparse.SplitResult) Resource locator of destination
+        move: (Bool) whether to remove source afterward
+
+    Returns:
+        None
+    """
+    backend = api.get_backend(src)
+    op = "move" if move else "copy"
+    if hasattr(backend, op) and backend is api.get_backend(dst):
+        _check(api._call(op, src, (src, dst)), src)
+        return
+
+    if _is_local(src):
+        res = api.upload(src.path, dst)
+    elif _is_local(dst):
+        local_api._ensure_dir(dst.path)
+        res = api.download(src, dst.path)
+    else:
+        res = api.write_stream(dst, api.open_read(src, binary=True), binary=True)
+
+    _check(res, src)
+    if move:
+        _check(api.remove(src), src)
+
+
+def _safe_transfer(args):
+    """Transfer a file and catch errors.
+    """
+    src, dst, move = args
+    try:
+        _transfer_file(src, dst, move)
+        return src, None
+    except Exception as e:
+        return src, e
+
+
+def _transfer(src, dst, move, max_workers):
+    """Copy or move a resource, recursively for directories.
+    """
+    src = api._split(src)
+    dst = api._split(dst)
+    if not _is_dir(src):
+        _transfer_file(src, dst, move)
+        return
+
+    if move and _is_local(src) and _is_local(dst):
+        local_api.move(src, dst)
+        return
+
+    jobs = [(_join(src, rel), _join(dst, rel), move) for rel in _walk_files(src)]
+    if len(jobs) == 0:
+        return
+
+    errors = [(url, err) for url, err in bulk.imap_unordered(_safe_transfer, jobs, max_workers)
+              if err is not None]
+
+    if len(errors) > 0:
+        raise URLError("unable to transfer %d files, first: %s (%s)"
+                       % (len(errors), errors[0][0].geturl(), errors[0][1]))
+
+    if move and _is_local(src):
+        local_api.remove(src)
+
+
+def copy(src, dst, max_workers=MAX_WORKERS):
+    """Copy a resource, recursively for directories.
+
+    Raises: URLError if some resource can not be copied
+
+    Args:
+        src: (urlparse.SplitResult) Resource locator of source
+        dst: (urlparse.SplitResult) Resource locator of destination
+        max_workers: (int) max number of files copied concurrently
+
+    Returns:
+        None
+    """
+    _transfer(src, dst, False, max_workers)
+
+
+def move(src, dst, max_workers=MAX_WORKERS):
+    """Move a resource, recursively for directories.
+
+    Raises: URLError if some resource can not be moved
+
+    Args:
+        src: (urlparse.SplitResult) Resource locator of source
+        dst: (urlparse.SplitResult) Resource locator of destination
+        max_workers: (int) max number of files moved concurrently
+
+    Returns:
+        None
+    """
+    _transfer(src, dst, True, max_workers)
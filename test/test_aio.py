@@ -0,0 +1,40 @@
+from nose.tools import assert_raises
+from threading import Event
+from urlparse import urlsplit
+
+from ura import aio
+from ura.api import URLError
+
+
+def test_aio_ops_return_results_asynchronously():
+    url = urlsplit("test/toto/doofus.txt")
+    res = aio.exists(url)
+    assert res.get(5)
+    assert aio.read(url).get(5).strip() == "lorem ipsum"
+
+
+def test_aio_errors_raised_when_result_is_fetched():
+    url = urlsplit("test/tugudu/touch.txt")
+    res = aio.read(url)
+    assert_raises(URLError, lambda: res.get(5))
+
+
+def test_aio_callback_called_with_result():
+    done = Event()
+    results = []
+
+    def cb(res):
+        results.append(res)
+        done.set()
+
+    aio.ls(urlsplit("test/toto"), callback=cb)
+    done.wait(5)
+    assert ("test/toto/doofus.txt", False) in results[0]
+
+
+def test_aio_write_then_remove():
+    url = urlsplit("test/toto/testwrite.txt")
+    aio.write(url, "toto was here").get(5)
+    assert aio.read(url).get(5) == "toto was here"
+    aio.remove(url).get(5)
+    assert not aio.exists(url).get(5)
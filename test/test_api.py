@@ -0,0 +1,53 @@
+import sys
+from nose.tools import assert_raises
+from types import ModuleType
+from urlparse import urlsplit
+
+from ura import api, local_api
+from ura.api import exists, get_backend, ls, read, register_backend, URLError
+
+
+def test_get_backend_dispatch_on_scheme():
+    assert get_backend(urlsplit("test/toto")) is local_api
+    assert get_backend(urlsplit("file:///tmp/toto")) is local_api
+
+
+def test_get_backend_raise_error_if_unknown_scheme():
+    url = urlsplit("takapouet://toto/doofus.txt")
+    assert_raises(URLError, lambda: get_backend(url))
+
+
+def test_backend_imported_lazily():
+    mod = ModuleType("ura_fake_backend")
+    mod.read = lambda url, binary=False: "fake %s" % url.path
+    sys.modules["ura_fake_backend"] = mod
+    try:
+        register_backend("fake", "ura_fake_backend")
+        assert "fake" not in api._resolved
+        assert read("fake:///doofus.txt") == "fake /doofus.txt"
+        assert api._resolved["fake"] is mod
+    finally:
+        del sys.modules["ura_fake_backend"]
+        del api._backends["fake"]
+        del api._resolved["fake"]
+
+
+def test_register_backend_replace_resolved_backend():
+    url = urlsplit("fake:///doofus.txt")
+    mod1 = ModuleType("fake1")
+    mod1.exists = lambda url: True
+    mod2 = ModuleType("fake2")
+    mod2.exists = lambda url: False
+    try:
+        register_backend("fake", mod1)
+        assert exists(url)
+        register_backend("fake", mod2)
+        assert not exists(url)
+    finally:
+        del api._backends["fake"]
+        del api._resolved["fake"]
+
+
+def test_front_end_accept_string_urls():
+    assert exists("test/toto/doofus.txt")
+    assert set(ls("test/toto")) == set(ls(urlsplit("test/toto")))
@@ -0,0 +1,104 @@
+from nose.tools import assert_raises
+from threading import Lock
+from time import sleep
+from types import ModuleType
+from urlparse import urlsplit
+
+from ura import api, bulk
+from ura.api import register_backend, URLError
+from ura.bulk import exists_many, read_many, remove_many, write_many
+from ura.local_api import exists, remove, touch
+
+
+def test_exists_many_returns_results_in_order():
+    pths = ["test/toto/doofus.txt", "takapouet", "test/toto/sub"]
+    urls = [urlsplit(pth) for pth in pths]
+    res = list(exists_many(urls, max_workers=2))
+    assert res == [(urls[0], True, None),
+                   (urls[1], False, None),
+                   (urls[2], True, None)]
+
+
+def test_read_many_report_errors_per_item():
+    urls = [urlsplit(pth) for pth in ("test/toto/doofus.txt",
+                                      "test/tugudu/touch.txt",
+                                      "test/toto/sub/doofus.txt")]
+    res = list(read_many(urls, ordered=False))
+    assert len(res) == 3
+    errors = dict((url, err) for url, cnt, err in res)
+    assert errors[urls[0]] is None
+    assert isinstance(errors[urls[1]], URLError)
+    assert errors[urls[2]] is None
+
+
+def test_write_many_write_all_items():
+    items = [(urlsplit("test/toto/testwrite%d.txt" % i), "toto %d" % i)
+             for i in range(5)]
+    res = list(write_many(items, max_workers=3))
+    assert all(err is None for url, ret, err in res)
+    for url, cnt, err in read_many(url for url, cnt in items):
+        assert cnt.startswith("toto")
+        remove(url)
+
+
+def test_bulk_accept_empty_lists():
+    assert list(exists_many([])) == []
+
+
+def test_remove_many_remove_all_items():
+    urls = [urlsplit("test/toto/testremove%d.txt" % i) for i in range(3)]
+    for url in urls:
+        touch(url)
+    res = list(remove_many(urls + [urlsplit("takapouet")]))
+    assert [err is None for url, ret, err in res] == [True, True, True, False]
+    assert not any(exists(url) for url in urls)
+
+
+def test_bulk_report_unknown_schemes_per_item():
+    urls = [urlsplit("takapouet://toto"), urlsplit("test/toto")]
+    res = list(exists_many(urls))
+    assert isinstance(res[0][2], URLError)
+    assert res[1] == (urls[1], True, None)
+
+
+def test_bulk_use_batch_functions_of_backends():
+    calls = []
+    mod = ModuleType("fake")
+    mod.BATCH_SIZE = 2
+    mod.exists = lambda url: True
+
+    def fake_exists_many(urls):
+        calls.append(urls)
+        return [(url, url.path.endswith("1"), None) for url in urls]
+
+    mod.exists_many = fake_exists_many
+
+    register_backend("fake", mod)
+    try:
+        urls = [urlsplit("fake:///%d" % i) for i in range(5)]
+        res = list(exists_many(urls, max_workers=2))
+        assert [flag for url, flag, err in res] == [False, True, False, False, False]
+        assert sorted(len(batch) for batch in calls) == [1, 2, 2]
+    finally:
+        del api._backends["fake"]
+        del api._resolved["fake"]
+
+
+def test_imap_unordered_bound_concurrency_and_reraise():
+    running = [0, 0]
+    lock = Lock()
+
+    def job(i):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        sleep(0.01)
+        with lock:
+            running[0] -= 1
+        if i == 7:
+            raise UserWarning("oops")
+        return i
+
+    assert sorted(bulk.imap_unordered(job, range(7), max_workers=2)) == range(7)
+    assert running[1] <= 2
+    assert_raises(UserWarning, lambda: list(bulk.imap_unordered(job, range(8))))
@@ -0,0 +1,130 @@
+import os
+from nose.tools import assert_raises
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import sleep
+from urlparse import urlsplit
+
+from ura import api, bulk, dirac_api, local_api
+from ura.api import URLError
+from ura.cache import CachedBackend
+from ura.dirac_engines import LocalEngine
+
+
+def test_cache_memoize_exists_including_negative_results():
+    cache = CachedBackend(local_api)
+    url = urlsplit("test/toto/doofus.txt")
+    assert cache.exists(url)
+    assert cache.exists(url)
+    assert not cache.exists(urlsplit("takapouet"))
+    assert not cache.exists(urlsplit("takapouet"))
+    assert cache.stats() == dict(hits=2, misses=2, size=2)
+
+
+def test_cache_memoize_errors():
+    cache = CachedBackend(local_api)
+    url = urlsplit("takapouet")
+    assert_raises(URLError, lambda: cache.stat(url))
+    assert_raises(URLError, lambda: cache.stat(url))
+    assert cache.stats()['hits'] == 1
+
+
+def test_cache_entries_expire():
+    cache = CachedBackend(local_api, ttl=10., ttls={"": 0.01})
+    url = urlsplit("test/toto/doofus.txt")
+    cache.exists(url)
+    sleep(0.02)
+    cache.exists(url)
+    assert cache.stats()['misses'] == 2
+
+
+def test_cache_evict_least_recently_used_entries():
+    cache = CachedBackend(local_api, maxsize=2)
+    urls = [urlsplit(pth) for pth in ("test", "test/toto", "test/toto/sub")]
+    cache.exists(urls[0])
+    cache.exists(urls[1])
+    cache.exists(urls[0])
+    cache.exists(urls[2])  # evict urls[1]
+    assert cache.stats()['size'] == 2
+    cache.exists(urls[0])
+    assert cache.stats()['hits'] == 2
+    cache.exists(urls[1])
+    assert cache.stats()['misses'] == 4
+
+
+def test_cache_invalidated_by_writes():
+    cache = CachedBackend(local_api)
+    url = urlsplit("test/toto/touch.txt")
+    assert not cache.exists(url)
+    assert ("test/toto/touch.txt", False) not in cache.ls(urlsplit("test/toto"))
+    cache.touch(url)
+    assert cache.exists(url)
+    assert ("test/toto/touch.txt", False) in cache.ls(urlsplit("test/toto"))
+    cache.remove(url)
+    assert not cache.exists(url)
+
+
+def test_cache_forward_other_operations():
+    cache = CachedBackend(local_api)
+    assert cache.read(urlsplit("test/toto/doofus.txt")).strip() == "lorem ipsum"
+
+
+def test_cache_invalidated_by_transfers():
+    cache = CachedBackend(local_api)
+    src = urlsplit("test/toto/doofus.txt")
+    dst = urlsplit("test/toto/doofus_copy.txt")
+    moved = urlsplit("test/toto/doofus_moved.txt")
+    assert not cache.exists(dst)
+    assert not cache.exists(moved)
+    try:
+        cache.copy(src, dst)
+        assert cache.exists(dst)
+        cache.move(dst, moved)
+        assert not cache.exists(dst)
+        assert cache.exists(moved)
+        cache.download(moved, dst.path)
+        assert cache.exists(dst)
+        cache.remove(dst)
+        cache.upload(moved.path, dst)
+        assert cache.exists(dst)
+    finally:
+        for url in (dst, moved):
+            if local_api.exists(url):
+                local_api.remove(url)
+
+
+def test_cache_invalidate_all_ancestors_but_not_siblings():
+    root = mkdtemp()
+    try:
+        cache = CachedBackend(local_api)
+        pth = os.path.join(root, "a/b/c.txt")
+        assert not cache.exists(urlsplit(os.path.join(root, "a")))
+        cache.exists(urlsplit(root + "/foobar"))
+        cache.touch(urlsplit(pth))
+        assert cache.exists(urlsplit(os.path.join(root, "a")))
+        misses = cache.stats()['misses']
+        cache.invalidate(urlsplit(root + "/foo"))
+        cache.exists(urlsplit(root + "/foobar"))
+        assert cache.stats()['misses'] == misses
+    finally:
+        rmtree(root)
+
+
+def test_cache_wrap_batch_functions():
+    root = mkdtemp()
+    dirac_api.set_engine(LocalEngine(root))
+    api.register_backend("dirac", CachedBackend(dirac_api))
+    try:
+        urls = [urlsplit("dirac:///vo/toto%d.txt" % i) for i in range(3)]
+        list(bulk.write_many((url, "lorem") for url in urls[:2]))
+        assert [flag for url, flag, err in bulk.exists_many(urls)] == [True, True, False]
+        assert api.exists(urls[0])
+
+        list(bulk.remove_many(urls[:1]))
+        assert not api.exists(urls[0])
+        list(bulk.write_many([(urls[2], "ipsum")]))
+        assert api.exists(urls[2])
+    finally:
+        api.register_backend("dirac", "ura.dirac_api")
+        dirac_api.set_engine(None)
+        rmtree(root)
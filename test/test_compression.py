@@ -0,0 +1,127 @@
+import gzip
+import os
+import tempfile
+from nose.tools import assert_raises
+from shutil import rmtree
+from tempfile import mkdtemp
+from urlparse import urlsplit
+
+from urllib2 import URLError
+
+from ura import compression, local_api, metrics, requests_api
+from ura.compression import get_codec, open_read, read, upload, write, write_stream
+
+
+def test_get_codec_use_suffix_or_name():
+    assert get_codec(urlsplit("toto.json.gz")).name == "gzip"
+    assert get_codec(urlsplit("toto.bz2")).name == "bz2"
+    assert get_codec(urlsplit("toto.json")) is None
+    assert get_codec(urlsplit("toto.json"), "zlib").name == "zlib"
+    assert get_codec(urlsplit("toto.json.gz"), None) is None
+    assert_raises(ValueError, lambda: get_codec(urlsplit("toto"), "takapouet"))
+
+
+def test_write_read_roundtrip_all_codecs():
+    root = mkdtemp()
+    cnt = "lorem ipsum " * 1000
+    try:
+        for suffix in (".gz", ".zz", ".bz2"):
+            url = urlsplit(os.path.join(root, "toto.txt" + suffix))
+            write(url, cnt)
+            assert len(local_api.read(url, binary=True)) < len(cnt)
+            assert read(url) == cnt
+
+            write_stream(url, ["lorem ", "ipsum"])
+            assert "".join(open_read(url, chunk_size=3)) == "lorem ipsum"
+    finally:
+        rmtree(root)
+
+
+def test_gzip_files_are_standard():
+    root = mkdtemp()
+    try:
+        pth = os.path.join(root, "toto.txt.gz")
+        write(urlsplit(pth), "lorem ipsum")
+        assert gzip.open(pth).read() == "lorem ipsum"
+
+        src = os.path.join(root, "src.txt")
+        local_api.write(urlsplit(src), "dolor sit amet")
+        upload(src, urlsplit(pth))
+        assert gzip.open(pth).read() == "dolor sit amet"
+    finally:
+        rmtree(root)
+
+
+def test_read_raise_error_on_invalid_content():
+    url = urlsplit("test/toto/doofus.txt")
+    assert_raises(URLError, lambda: read(url, codec="gzip"))
+
+
+def test_read_raise_error_on_truncated_content():
+    root = mkdtemp()
+    cnt = os.urandom(10000)
+    try:
+        for suffix in (".gz", ".zz", ".bz2"):
+            url = urlsplit(os.path.join(root, "toto.bin" + suffix))
+            write(url, cnt, binary=True)
+            data = local_api.read(url, binary=True)
+            for size in (len(data) // 2, len(data) - 1):
+                local_api.write(url, data[:size], binary=True)
+                assert_raises(URLError, lambda: read(url, binary=True))
+    finally:
+        rmtree(root)
+
+
+def test_upload_remove_temporary_file_on_error():
+    root = mkdtemp()
+    old = tempfile.tempdir
+    tempfile.tempdir = root
+    try:
+        assert_raises(URLError, lambda: upload(os.path.join(root, "missing.txt"),
+                                               urlsplit(os.path.join(root, "dst.txt.gz"))))
+        assert os.listdir(root) == []
+    finally:
+        tempfile.tempdir = old
+        rmtree(root)
+
+
+class FakeSession(object):
+    def __init__(self):
+        self.posts = []
+
+    def post(self, url, data, headers=None, timeout=None):
+        if not isinstance(data, str):
+            data = "".join(data)
+        self.posts.append((url, data, headers))
+        return FakeResponse()
+
+    def close(self):
+        pass
+
+
+class FakeResponse(object):
+    status_code = 200
+
+
+def test_http_explicit_codec_set_content_encoding():
+    session = FakeSession()
+    requests_api.set_session(session)
+    try:
+        write("http://localhost/toto", "lorem ipsum", codec="gzip")
+        url, data, headers = session.posts[0]
+        assert headers['content-encoding'] == "gzip"
+        assert "".join(compression.get_codec(None, "gzip").decompress([data])) == "lorem ipsum"
+
+        write("http://localhost/toto.gz", "lorem ipsum")
+        url, data, headers = session.posts[1]
+        assert 'content-encoding' not in headers
+
+        metrics.reset()
+        metrics.enable()
+        write_stream("http://localhost/toto", ["lorem ", "ipsum"], codec="gzip")
+        assert session.posts[2][2]['content-encoding'] == "gzip"
+        assert metrics.snapshot()['operations']['requests_api']['write_stream']['calls'] == 1
+    finally:
+        metrics.disable()
+        metrics.reset()
+        requests_api.set_session(None)
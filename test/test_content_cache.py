@@ -0,0 +1,76 @@
+import os
+from shutil import rmtree
+from tempfile import gettempdir, mkdtemp
+from time import time
+from urlparse import urlsplit
+
+from ura import content_cache, local_api
+from ura.content_cache import ContentCache
+
+
+def test_content_cache_serve_and_revalidate_content():
+    root = mkdtemp()
+    try:
+        cache = ContentCache(os.path.join(root, "cache"))
+        url = urlsplit(os.path.join(root, "doofus.txt"))
+        local_api.write(url, "lorem ipsum")
+        assert cache.read(url) == "lorem ipsum"
+        assert len(os.listdir(cache.root)) == 1
+        assert cache.read(url) == "lorem ipsum"
+
+        local_api.write(url, "toto was here")
+        os.utime(url.path, (time() + 10, time() + 10))
+        assert cache.read(url) == "toto was here"
+        assert len(os.listdir(cache.root)) == 1
+    finally:
+        rmtree(root)
+
+
+def test_content_cache_evict_entries_above_max_size():
+    root = mkdtemp()
+    try:
+        cache = ContentCache(os.path.join(root, "cache"), max_size=250)
+        for i in range(5):
+            url = urlsplit(os.path.join(root, "doofus%d.txt" % i))
+            local_api.write(url, "a" * 100)
+            assert cache.read(url) == "a" * 100
+
+        assert 0 < len(os.listdir(cache.root)) < 3
+        cache.clear()
+        assert len(os.listdir(cache.root)) == 0
+    finally:
+        rmtree(root)
+
+
+def test_content_cache_default_root_is_private():
+    cache = ContentCache()
+    assert cache.root != os.path.join(gettempdir(), "ura_cache")
+    assert os.stat(cache.root).st_mode & 0o077 == 0
+
+
+def test_content_cache_read_directly_if_cache_not_usable():
+    root = mkdtemp()
+    try:
+        url = urlsplit(os.path.join(root, "doofus.txt"))
+        local_api.write(url, "lorem ipsum")
+        cache = ContentCache(url.path)  # a file, not a directory
+        assert cache.read(url) == "lorem ipsum"
+    finally:
+        rmtree(root)
+
+
+def test_content_cache_do_not_trust_default_root_open_to_others():
+    root = mkdtemp()
+    old = content_cache._default_root
+    content_cache._default_root = lambda: os.path.join(root, "cache")
+    try:
+        os.mkdir(os.path.join(root, "cache"))
+        os.chmod(os.path.join(root, "cache"), 0o777)
+        url = urlsplit(os.path.join(root, "doofus.txt"))
+        local_api.write(url, "lorem ipsum")
+        cache = ContentCache()
+        assert cache.read(url) == "lorem ipsum"
+        assert os.listdir(cache.root) == []
+    finally:
+        content_cache._default_root = old
+        rmtree(root)
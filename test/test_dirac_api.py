@@ -0,0 +1,299 @@
+import os
+import stat
+import sys
+from datetime import datetime
+from nose.tools import assert_raises, with_setup
+from shutil import rmtree
+from tempfile import mkdtemp
+from urlparse import urlsplit
+
+from ura import api, bulk, dirac_api, retry, timeouts
+from ura.dirac_api import (download, exists, exists_many, ls, read,
+                           read_many, read_range, remove, touch, upload,
+                           URLError, walk, write)
+from ura.dirac_engines import _parse_result, CliEngine, LocalEngine
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "benchmark"))
+import fake_dirac  # noqa: E402
+
+_root = [None]
+_environ = [None]
+
+
+def setup_engine():
+    _root[0] = mkdtemp()
+    dirac_api.set_engine(LocalEngine(_root[0]))
+    write(urlsplit("dirac:///vo/toto/doofus.txt"), "lorem ipsum")
+    write(urlsplit("dirac:///vo/toto/sub/doofus.txt"), "lorem ipsum")
+
+
+def teardown_engine():
+    dirac_api.set_engine(None)
+    rmtree(_root[0])
+
+
+def setup_cli_engine():
+    _root[0] = mkdtemp()
+    bin_dir = os.path.join(_root[0], "bin")
+    store = os.path.join(_root[0], "store")
+    os.mkdir(bin_dir)
+    os.mkdir(store)
+
+    _environ[0] = dict(os.environ)
+    os.environ.update(fake_dirac.install(bin_dir))
+    os.environ["URA_FAKE_DIRAC_ROOT"] = store
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+    dirac_api.set_engine(CliEngine())
+    write(urlsplit("dirac:///vo/toto/doofus.txt"), "lorem ipsum")
+
+
+def teardown_cli_engine():
+    os.environ.clear()
+    os.environ.update(_environ[0])
+    dirac_api.set_engine(None)
+    rmtree(_root[0])
+
+
+def _fake_command(cmd, script):
+    """Replace a fake dirac-dms-* command by a shell script.
+    """
+    pth = os.path.join(_root[0], "bin", cmd)
+    with open(pth, 'w') as f:
+        f.write("#!/bin/sh\n" + script)
+    os.chmod(pth, os.stat(pth).st_mode | stat.S_IEXEC)
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_ls_list_all_elms_in_dir():
+    elms = ls(urlsplit("dirac:///vo/toto"))
+    assert set(elms) == {("sub", True), ("doofus.txt", False)}
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_exists_on_files_and_dirs():
+    assert exists(urlsplit("dirac:///vo/toto/doofus.txt"))
+    assert not exists(urlsplit("dirac:///vo/toto/takapouet.txt"))
+    assert exists(urlsplit("dirac:///vo/toto/sub/"))
+    assert not exists(urlsplit("dirac:///vo/toto/takapouet/"))
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_touch_create_file():
+    url = urlsplit("dirac:///vo/toto/touch.txt")
+    assert not exists(url)
+    assert touch(url)
+    assert exists(url)
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_remove_file():
+    url = urlsplit("dirac:///vo/toto/doofus.txt")
+    assert remove(url)
+    assert not exists(url)
+    assert not remove(url)
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_read_raises_error_if_file_do_not_exists():
+    url = urlsplit("dirac:///vo/toto/takapouet.txt")
+    assert_raises(URLError, lambda: read(url))
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_read_returns_file_content():
+    url = urlsplit("dirac:///vo/toto/doofus.txt")
+    assert read(url) == "lorem ipsum"
+    assert read_range(url, 6, 5) == "ipsum"
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_write_overwrite_existing_file():
+    url = urlsplit("dirac:///vo/toto/doofus.txt")
+    assert write(url, "toto was here")
+    assert read(url) == "toto was here"
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_batch_operations_report_per_lfn_results():
+    urls = [urlsplit("dirac:///vo/toto/doofus.txt"),
+            urlsplit("dirac:///vo/toto/takapouet.txt"),
+            urlsplit("dirac:///vo/toto/sub/doofus.txt")]
+    assert [flag for url, flag, err in exists_many(urls)] == [True, False, True]
+
+    res = read_many(urls)
+    assert res[0] == (urls[0], "lorem ipsum", None)
+    assert isinstance(res[1][2], URLError)
+    assert res[2] == (urls[2], "lorem ipsum", None)
+
+
+class CountingEngine(LocalEngine):
+    def __init__(self, root):
+        LocalEngine.__init__(self, root)
+        self.nb_find = 0
+
+    def find_lfns(self, path):
+        self.nb_find += 1
+        return LocalEngine.find_lfns(self, path)
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_ls_reuse_subtree_listing():
+    engine = CountingEngine(_root[0])
+    dirac_api.set_engine(engine)
+    write(urlsplit("dirac:///vo/toto/sub/subsub/doofus.txt"), "lorem ipsum")
+
+    assert set(ls(urlsplit("dirac:///vo"))) == {("toto", True)}
+    assert set(ls(urlsplit("dirac:///vo/toto/sub/"))) == {("doofus.txt", False),
+                                                          ("subsub", True)}
+    assert exists(urlsplit("dirac:///vo/toto/sub/subsub/"))
+    assert exists(urlsplit("dirac:///vo/toto/doofus.txt"))
+    assert not exists(urlsplit("dirac:///vo/toto/takapouet.txt"))
+    assert engine.nb_find == 1
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_ls_see_modifications():
+    url = urlsplit("dirac:///vo/toto")
+    assert ("touch.txt", False) not in ls(url)
+    touch(urlsplit("dirac:///vo/toto/touch.txt"))
+    assert ("touch.txt", False) in ls(url)
+    remove(urlsplit("dirac:///vo/toto/touch.txt"))
+    assert ("touch.txt", False) not in ls(url)
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_write_overwrite_in_a_single_engine_call():
+    calls = []
+    engine = dirac_api.get_engine()
+    add_files = engine.add_files
+    engine.add_files = lambda *args: calls.append(args) or add_files(*args)
+    for name in ("metadata", "remove_files"):
+        setattr(engine, name, None)
+
+    url = urlsplit("dirac:///vo/toto/doofus.txt")
+    assert write(url, "toto was here")
+    assert len(calls) == 1
+    assert not write(url, "toto was here", overwrite=False)
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_upload_download_local_files():
+    url = urlsplit("dirac:///vo/toto/uploaded.txt")
+    assert_raises(URLError, lambda: upload("takapouet.txt", url))
+    assert upload("test/toto/doofus.txt", url)
+    assert read(url) == open("test/toto/doofus.txt").read()
+
+    pth = os.path.join(_root[0], "downloaded.txt")
+    download(url, pth)
+    assert open(pth).read() == open("test/toto/doofus.txt").read()
+    assert_raises(URLError, lambda: download(urlsplit("dirac:///vo/takapouet"), pth))
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_walk_visit_all_tree():
+    elms = list(walk(urlsplit("dirac:///vo")))
+    assert elms == [("/vo/toto", True),
+                    ("/vo/toto/doofus.txt", False),
+                    ("/vo/toto/sub", True),
+                    ("/vo/toto/sub/doofus.txt", False)]
+
+    assert list(walk(urlsplit("dirac:///vo"), max_depth=2)) == elms[:3]
+    assert list(walk(urlsplit("dirac:///vo"), pattern="*.txt")) == [elms[1], elms[3]]
+
+
+@with_setup(setup_engine, teardown_engine)
+def test_bulk_exists_many_handle_dirs():
+    urls = ["dirac:///vo/toto/doofus.txt", "dirac:///vo/toto/sub/",
+            "dirac:///vo/toto/takapouet/"]
+    res = [found for url, found, err in bulk.exists_many(urls)]
+    assert res == [True, True, False]
+
+
+def test_parse_result_of_real_dirac_output():
+    res = """Getting metadata of 2 files
+{'Failed': {'/vo/takapouet.txt': 'No such file or directory'},
+ 'Successful': {'/vo/toto.txt': {'Checksum': '1c8c04a2',
+                                 'ChecksumType': 'Adler32',
+                                 'CreationDate': datetime.datetime(2017, 3, 1, 10, 20, 30),
+                                 'GUID': '5A3D2C1B-0000-0000-0000-000000000000',
+                                 'Mode': 509,
+                                 'ModificationDate': datetime.datetime(2017, 3, 2, 11, 0),
+                                 'Size': 11L,
+                                 'Status': 'AprioriGood'}}}
+"""
+    successful, failed = _parse_result(res)
+    assert failed == {'/vo/takapouet.txt': 'No such file or directory'}
+    meta = successful['/vo/toto.txt']
+    assert meta['Size'] == 11
+    assert meta['ModificationDate'] == datetime(2017, 3, 2, 11, 0)
+
+    assert_raises(URLError, lambda: _parse_result("{'Failed': __import__('os')}"))
+    assert_raises(URLError, lambda: _parse_result("no dict"))
+
+
+def test_local_engine_add_files_concurrently_in_new_dir():
+    root = mkdtemp()
+    try:
+        engine = LocalEngine(os.path.join(root, "se"))
+        src = os.path.join(root, "src.txt")
+        with open(src, 'w') as f:
+            f.write("lorem ipsum")
+
+        items = [("/vo/new%d/sub/f%d.txt" % (i % 2, i), src) for i in range(40)]
+        res = list(bulk.imap_unordered(lambda item: engine.add_files([item], "SE"), items, 16))
+        assert all(len(failed) == 0 for successful, failed in res)
+    finally:
+        rmtree(root)
+
+
+@with_setup(setup_cli_engine, teardown_cli_engine)
+def test_cli_read_do_not_trust_files_of_failed_get_file():
+    url = urlsplit("dirac:///vo/toto/doofus.txt")
+    assert read(url) == "lorem ipsum"
+    assert read_many([url]) == [(url, "lorem ipsum", None)]
+
+    _fake_command("dirac-dms-get-file", "printf partial > doofus.txt\nsleep 5\n")
+    with timeouts.limits(subprocess=0.5):
+        assert_raises(URLError, lambda: read(url))
+
+    _fake_command("dirac-dms-get-file", "printf partial > doofus.txt\nexit 1\n")
+    assert_raises(URLError, lambda: read(url))
+    assert isinstance(read_many([url])[0][2], URLError)
+
+
+@with_setup(setup_cli_engine, teardown_cli_engine)
+def test_cli_overwrite_only_replace_existing_files():
+    url = urlsplit("dirac:///vo/toto/doofus.txt")
+    assert write(url, "toto was here")
+    assert read(url) == "toto was here"
+
+    pth = os.path.join(_root[0], "new.txt")
+    with open(pth, 'w') as f:
+        f.write("new content")
+    _fake_command("dirac-dms-add-file", "echo 'ERROR Failed to upload: SE unavailable'\nexit 1\n")
+    successful, failed = CliEngine().add_files([(url.path, pth)], dirac_api.SE, overwrite=True)
+    assert url.path in failed
+    dirac_api.invalidate()
+    assert exists(url)
+    assert read(url) == "toto was here"
+
+
+@with_setup(setup_cli_engine, teardown_cli_engine)
+def test_cli_transient_failures_are_retried():
+    flag = os.path.join(_root[0], "failed_once")
+    _fake_command("dirac-dms-get-file",
+                  'if [ ! -f "%s" ]; then touch "%s"; exit 1; fi\n'
+                  'exec "%s" "%s" dirac-dms-get-file "$@"\n'
+                  % (flag, flag, sys.executable, fake_dirac.__file__.replace(".pyc", ".py")))
+    old = retry.get_policy("dirac")
+    retry.set_policy("dirac", retry.RetryPolicy(base_delay=0.001))
+    try:
+        assert api.read("dirac:///vo/toto/doofus.txt") == "lorem ipsum"
+    finally:
+        retry.set_policy("dirac", old)
+
+    _fake_command("dirac-dms-add-file", "echo 'ERROR Failed to upload: SE unavailable'\nexit 1\n")
+    with assert_raises(URLError) as cm:
+        write(urlsplit("dirac:///vo/toto/new.txt"), "lorem ipsum")
+    assert retry.is_transient(cm.exception)
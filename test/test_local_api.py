@@ -1,8 +1,12 @@
+import os
 from nose.tools import assert_raises
 from shutil import rmtree
 from urlparse import urlsplit
 
-from ura.local_api import exists, ls, touch, read, remove, URLError, write
+from ura.local_api import (ATOMIC, download, exists, FSYNC, group_commit,
+                           iter_ls, ls, open_read, touch, read, read_mmap,
+                           read_range, remove, stat, upload, URLError, walk,
+                           write, write_stream)
 
 
 def test_ls_raise_error_if_pth_not_exists():
@@ -159,3 +163,173 @@ def test_write_binary_content():
     assert read(url, binary=True) == "toto was here"
     remove(url)
 
+
+def test_open_read_raises_error_if_file_do_not_exists():
+    url = urlsplit("test/tugudu/touch.txt")
+    assert_raises(URLError, lambda: open_read(url))
+
+
+def test_open_read_returns_content_by_chunks():
+    url = urlsplit("test/toto/doofus.txt")
+    chunks = list(open_read(url, chunk_size=4))
+    assert all(len(chunk) <= 4 for chunk in chunks)
+    assert "".join(chunks) == read(url)
+
+    chunks = list(open_read(url, binary=True, chunk_size=4))
+    assert "".join(chunks) == read(url, binary=True)
+
+
+def test_write_stream_accept_iterables():
+    url = urlsplit("test/toto/testwrite.txt")
+    assert not exists(url)
+    write_stream(url, (word for word in ("toto", " was", " here")))
+    assert read(url) == "toto was here"
+    remove(url)
+
+
+def test_write_stream_accept_file_objects():
+    url = urlsplit("test/toto/testwrite.txt")
+    assert not exists(url)
+    with open("test/toto/doofus.txt", 'rb') as f:
+        write_stream(url, f, binary=True, chunk_size=4)
+    assert read(url) == read(urlsplit("test/toto/doofus.txt"))
+    remove(url)
+
+
+def test_read_mmap_raises_error_if_file_do_not_exists():
+    url = urlsplit("test/tugudu/touch.txt")
+    assert_raises(URLError, lambda: read_mmap(url))
+
+
+def test_read_mmap_returns_read_only_view_on_content():
+    url = urlsplit("test/toto/doofus.txt")
+    view = read_mmap(url)
+    assert view[:] == read(url, binary=True)
+    assert_raises(TypeError, lambda: view.write("toto"))
+    view.close()
+
+
+def test_read_mmap_handle_empty_files():
+    url = urlsplit("test/toto/touch.txt")
+    touch(url)
+    assert len(read_mmap(url)) == 0
+    remove(url)
+
+
+def test_read_range_raises_error_if_file_do_not_exists():
+    url = urlsplit("test/tugudu/touch.txt")
+    assert_raises(URLError, lambda: read_range(url, 0, 4))
+
+
+def test_read_range_returns_part_of_content():
+    url = urlsplit("test/toto/doofus.txt")
+    cnt = read(url, binary=True)
+    assert read_range(url, 0, 5, binary=True) == cnt[:5]
+    assert read_range(url, 6, 5) == cnt[6:11]
+    assert read_range(url, 6) == cnt[6:]
+    assert read_range(url, len(cnt) + 10, 5) == ""
+
+
+def test_stat_raises_error_if_file_do_not_exists():
+    url = urlsplit("test/tugudu/touch.txt")
+    assert_raises(URLError, lambda: stat(url))
+
+
+def test_stat_returns_size_and_modification_time():
+    url = urlsplit("test/toto/doofus.txt")
+    st = stat(url)
+    assert st['size'] == len(read(url, binary=True))
+    assert st['mtime'] > 0
+    assert st['etag'] is None
+
+
+def test_upload_download_copy_files():
+    url = urlsplit("test/toto/testwrite.txt")
+    upload("test/toto/doofus.txt", url)
+    assert read(url) == read(urlsplit("test/toto/doofus.txt"))
+    download(url, "test/toto/testdownload.txt")
+    assert read(urlsplit("test/toto/testdownload.txt")) == read(url)
+    remove(url)
+    remove(urlsplit("test/toto/testdownload.txt"))
+    assert_raises(URLError, lambda: download(url, "test/toto/testdownload.txt"))
+
+
+def test_iter_ls_is_lazy_version_of_ls():
+    url = urlsplit("test/toto")
+    assert set(iter_ls(url)) == set(ls(url))
+    assert_raises(URLError, lambda: iter_ls(urlsplit("takapouet")))
+
+
+def test_walk_visit_all_tree():
+    elms = list(walk(urlsplit("test/toto")))
+    assert set(elms) == {("test/toto/sub", True),
+                         ("test/toto/doofus.txt", False),
+                         ("test/toto/sub/doofus.txt", False),
+                         ("test/toto/sub/subdoofus.txt", False)}
+
+
+def test_walk_accept_max_depth_and_pattern():
+    elms = list(walk(urlsplit("test/toto"), max_depth=1))
+    assert set(elms) == set(ls(urlsplit("test/toto")))
+
+    elms = list(walk(urlsplit("test/toto"), pattern="sub*"))
+    assert set(elms) == {("test/toto/sub", True),
+                         ("test/toto/sub/subdoofus.txt", False)}
+
+
+def test_write_durability_modes():
+    url = urlsplit("test/toto/testdurable.txt")
+    for durability in (ATOMIC, FSYNC):
+        write(url, "lorem %s" % durability, durability=durability)
+        assert read(url) == "lorem %s" % durability
+        write_stream(url, ["ipsum", durability], durability=durability)
+        assert read(url) == "ipsum%s" % durability
+
+    touch(url, durability=FSYNC)
+    assert read(url) == ""
+    remove(url)
+    assert not [name for name in os.listdir("test/toto") if name.endswith(".tmp")]
+
+    assert_raises(URLError, lambda: write(urlsplit("takapouet/toto.txt"), "",
+                                          durability=ATOMIC))
+
+
+def test_write_durability_modes_keep_file_permissions():
+    url = urlsplit("test/toto/testdurable.txt")
+    ref = urlsplit("test/toto/testnone.txt")
+    try:
+        write(ref, "lorem")
+        write(url, "lorem", durability=ATOMIC)
+        assert os.stat(url.path).st_mode == os.stat(ref.path).st_mode
+
+        os.chmod(url.path, 0o640)
+        write(url, "ipsum", durability=FSYNC)
+        assert os.stat(url.path).st_mode & 0o777 == 0o640
+    finally:
+        remove(ref)
+        remove(url)
+
+
+def test_group_commit_publish_files_on_exit():
+    urls = [urlsplit("test/toto/testgroup%d.txt" % i) for i in range(3)]
+    with group_commit():
+        for i, url in enumerate(urls):
+            write(url, "lorem %d" % i, durability=FSYNC)
+        assert not any(exists(url) for url in urls)
+
+    for i, url in enumerate(urls):
+        assert read(url) == "lorem %d" % i
+        remove(url)
+
+
+def test_group_commit_discard_files_on_error():
+    url = urlsplit("test/toto/testgroup.txt")
+
+    def failing():
+        with group_commit():
+            write(url, "lorem", durability=ATOMIC)
+            raise UserWarning("oops")
+
+    assert_raises(UserWarning, failing)
+    assert not exists(url)
+    assert not [name for name in os.listdir("test/toto") if name.endswith(".tmp")]
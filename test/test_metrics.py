@@ -0,0 +1,98 @@
+import os
+from nose.tools import assert_raises, with_setup
+from shutil import rmtree
+from tempfile import mkdtemp
+from urllib2 import URLError
+
+from ura import api, metrics
+
+
+def setup_metrics():
+    metrics.reset()
+    metrics.enable()
+
+
+def teardown_metrics():
+    metrics.disable()
+    metrics.reset()
+
+
+def test_nothing_recorded_when_disabled():
+    metrics.reset()
+    assert not metrics.is_enabled()
+    api.exists("test/toto/doofus.txt")
+    assert metrics.snapshot()['operations'] == {}
+
+
+@with_setup(setup_metrics, teardown_metrics)
+def test_operations_are_counted_per_backend():
+    root = mkdtemp()
+    try:
+        pth = os.path.join(root, "toto.txt")
+        api.write(pth, "lorem ipsum")
+        assert api.read(pth) == "lorem ipsum"
+        assert "".join(api.open_read(pth, chunk_size=2)) == "lorem ipsum"
+        api.write_stream(pth, ["lorem", "ipsum"])
+        assert_raises(URLError, lambda: api.read(os.path.join(root, "takapouet")))
+    finally:
+        rmtree(root)
+
+    ops = metrics.snapshot()['operations']['local_api']
+    assert ops['write']['calls'] == 1
+    assert ops['write']['bytes'] == 11
+    assert ops['read']['calls'] == 2
+    assert ops['read']['errors'] == 1
+    assert ops['read']['bytes'] == 11
+    assert ops['open_read']['bytes'] == 11
+    assert ops['write_stream']['bytes'] == 10
+    assert sum(count for bound, count in ops['read']['buckets']) == 2
+
+
+@with_setup(setup_metrics, teardown_metrics)
+def test_callbacks_receive_events():
+    events = []
+    metrics.add_callback(events.append)
+    try:
+        api.exists("test/toto/doofus.txt")
+    finally:
+        metrics.remove_callback(events.append)
+
+    api.exists("test/toto/doofus.txt")
+    assert len(events) == 1
+    assert events[0]['backend'] == "local_api"
+    assert events[0]['op'] == "exists"
+    assert events[0]['url'] == "test/toto/doofus.txt"
+    assert events[0]['error'] is None
+
+
+@with_setup(setup_metrics, teardown_metrics)
+def test_prometheus_export():
+    api.exists("test/toto/doofus.txt")
+    metrics.count_subprocess("dirac_api")
+    txt = metrics.to_prometheus()
+    assert 'ura_calls_total{backend="local_api",op="exists"} 1' in txt
+    assert 'ura_latency_seconds_bucket{backend="local_api",op="exists",le="+Inf"} 1' in txt
+    assert 'ura_subprocesses_total{backend="dirac_api"} 1' in txt
+
+
+@with_setup(setup_metrics, teardown_metrics)
+def test_batch_and_transfer_operations_are_counted():
+    from ura import bulk, dirac_api, transfer
+    from ura.dirac_engines import LocalEngine
+
+    root = mkdtemp()
+    dirac_api.set_engine(LocalEngine(root))
+    try:
+        urls = ["dirac:///vo/toto%d.txt" % i for i in range(3)]
+        for url in urls:
+            api.write(url, "lorem ipsum")
+        assert all(err is None for url, cnt, err in bulk.read_many(urls))
+        transfer.copy(urls[0], "dirac:///vo/titi.txt")
+    finally:
+        dirac_api.set_engine(None)
+        rmtree(root)
+
+    ops = metrics.snapshot()['operations']['dirac_api']
+    assert ops['read_many']['calls'] == 1
+    assert ops['read_many']['bytes'] == 33
+    assert ops['copy']['calls'] == 1
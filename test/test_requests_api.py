@@ -0,0 +1,127 @@
+import os
+import sys
+from nose.tools import assert_raises, with_setup
+from urllib2 import HTTPError
+from shutil import rmtree
+from tempfile import mkdtemp
+from urlparse import urlsplit
+
+from ura import requests_api
+from ura.requests_api import (download, exists, open_read, read, read_range,
+                              stat, upload, URLError, write, write_stream)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "benchmark"))
+from http_server import Handler, LocalHTTPServer  # noqa: E402
+
+
+class NoHeadHandler(Handler):
+    def do_HEAD(self):
+        self._empty(405)
+
+
+class NoRangeHandler(Handler):
+    def do_GET(self):
+        if "Range" in self.headers:
+            del self.headers["Range"]
+        self._serve(True)
+
+
+class UnavailableHandler(Handler):
+    def do_POST(self):
+        for chunk in self._iter_body():
+            pass
+        self._empty(503)
+
+
+_server = [None]
+
+
+def _start(handler=Handler):
+    root = mkdtemp()
+    with open(os.path.join(root, "doofus.txt"), 'wb') as f:
+        f.write("lorem ipsum")
+    _server[0] = LocalHTTPServer(root, handler).__enter__()
+
+
+def _stop():
+    server = _server[0]
+    server.__exit__(None, None, None)
+    rmtree(server.root)
+    requests_api.set_session(None)
+
+
+def _url(name):
+    return urlsplit("%s/%s" % (_server[0].url, name))
+
+
+@with_setup(_start, _stop)
+def test_exists_stat_read():
+    assert exists(_url("doofus.txt"))
+    assert not exists(_url("takapouet.txt"))
+
+    st = stat(_url("doofus.txt"))
+    assert st['size'] == 11
+    assert abs(st['mtime'] - os.path.getmtime(os.path.join(_server[0].root, "doofus.txt"))) < 1
+    assert st['etag'] is not None
+    assert_raises(URLError, lambda: stat(_url("takapouet.txt")))
+
+    assert read(_url("doofus.txt")) == "lorem ipsum"
+    assert "".join(open_read(_url("doofus.txt"), chunk_size=3)) == "lorem ipsum"
+    assert_raises(URLError, lambda: read(_url("takapouet.txt")))
+    assert_raises(URLError, lambda: open_read(_url("takapouet.txt")))
+
+
+@with_setup(_start, _stop)
+def test_read_range():
+    assert read_range(_url("doofus.txt"), 6, binary=True) == "ipsum"
+    assert read_range(_url("doofus.txt"), 2, 3, binary=True) == "rem"
+    assert read_range(_url("doofus.txt"), 20, binary=True) == ""
+
+
+@with_setup(lambda: _start(NoRangeHandler), _stop)
+def test_read_range_when_server_ignores_range():
+    assert read_range(_url("doofus.txt"), 6, binary=True) == "ipsum"
+    assert read_range(_url("doofus.txt"), 2, 3, binary=True) == "rem"
+
+
+@with_setup(lambda: _start(NoHeadHandler), _stop)
+def test_exists_stat_fall_back_to_ranged_get():
+    assert exists(_url("doofus.txt"))
+    assert not exists(_url("takapouet.txt"))
+    st = stat(_url("doofus.txt"))
+    assert st['size'] == 11
+    assert st['mtime'] is not None
+
+
+@with_setup(_start, _stop)
+def test_write_upload_download():
+    write(_url("sub/toto.txt"), "lorem ipsum")
+    assert read(_url("sub/toto.txt")) == "lorem ipsum"
+    write_stream(_url("sub/toto.txt"), ["lorem", " ", "dolor"])
+    assert read(_url("sub/toto.txt")) == "lorem dolor"
+
+    pth = os.path.join(_server[0].root, "local.txt")
+    download(_url("doofus.txt"), pth)
+    with open(pth) as f:
+        assert f.read() == "lorem ipsum"
+    upload(pth, _url("sub/uploaded.txt"))
+    assert read(_url("sub/uploaded.txt")) == "lorem ipsum"
+
+
+def test_connection_refused_raise_url_error():
+    url = urlsplit("http://127.0.0.1:1/toto")
+    try:
+        for func in (exists, stat, read, open_read):
+            assert_raises(URLError, lambda: func(url))
+    finally:
+        requests_api.set_session(None)
+
+
+@with_setup(lambda: _start(UnavailableHandler), _stop)
+def test_upload_keep_http_status_of_errors():
+    pth = os.path.join(_server[0].root, "doofus.txt")
+    with assert_raises(HTTPError) as cm:
+        upload(pth, _url("sub/uploaded.txt"))
+    assert cm.exception.code == 503
+    assert_raises(URLError, lambda: upload(pth + ".missing", _url("sub/uploaded.txt")))
@@ -0,0 +1,98 @@
+from nose.tools import assert_raises
+from subprocess import CalledProcessError
+from time import sleep, time
+from urllib2 import HTTPError, URLError
+
+from ura import api, retry
+from ura.retry import is_transient, RetryPolicy
+
+
+class FlakyBackend(object):
+    """Fail a given number of times before answering.
+    """
+
+    def __init__(self, failures, error):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def _answer(self, value):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return value
+
+    def read(self, url, binary=False):
+        return self._answer("lorem ipsum")
+
+    def write(self, url, content, binary=False):
+        return self._answer(None)
+
+
+def test_is_transient():
+    assert is_transient(URLError(CalledProcessError(1, "dirac-dms-get-file")))
+    assert is_transient(URLError(IOError("connection reset")))
+    assert is_transient(HTTPError("http://toto", 503, "", {}, None))
+    assert not is_transient(HTTPError("http://toto", 404, "", {}, None))
+    assert not is_transient(URLError("url does not exists"))
+    assert not is_transient(URLError(IOError(2, "No such file or directory")))
+
+
+def test_policy_delays_grow_and_are_bounded():
+    policy = RetryPolicy(base_delay=1., max_delay=3., jitter=False)
+    assert [policy.delay(i) for i in (1, 2, 3, 4)] == [1., 2., 3., 3.]
+    policy = RetryPolicy(base_delay=1.)
+    assert all(0 <= policy.delay(1) <= 1. for i in range(10))
+
+
+def test_api_retry_reads_but_not_writes():
+    error = URLError(IOError("connection reset"))
+    backend = FlakyBackend(2, error)
+    api.register_backend("flaky", backend)
+    retry.set_policy("flaky", RetryPolicy(base_delay=0.001))
+    try:
+        assert api.read("flaky://toto") == "lorem ipsum"
+        assert backend.calls == 3
+
+        backend.calls = 0
+        assert_raises(URLError, lambda: api.write("flaky://toto", ""))
+        assert backend.calls == 1
+
+        retry.set_policy("flaky", RetryPolicy(base_delay=0.001, retry_writes=True))
+        backend.calls = 0
+        api.write("flaky://toto", "")
+        assert backend.calls == 3
+
+        backend.calls = 0
+        backend.failures = 10
+        assert_raises(URLError, lambda: api.read("flaky://toto"))
+        assert backend.calls == 3
+    finally:
+        retry.set_policy("flaky", None)
+        del api._backends["flaky"]
+        api._resolved.pop("flaky", None)
+
+
+def test_permanent_errors_are_not_retried():
+    func = FlakyBackend(2, URLError("url does not exists")).read
+    policy = RetryPolicy(base_delay=0.001)
+    assert_raises(URLError, lambda: policy.wrap("read", func)(None))
+    assert func.im_self.calls == 1
+
+
+def test_hedged_read_return_first_answer():
+    calls = []
+
+    def read(url, binary=False):
+        calls.append(url)
+        if len(calls) == 1:
+            sleep(0.5)
+            return "slow"
+        return "fast"
+
+    policy = RetryPolicy(max_attempts=1, hedge_after=0.01)
+    start = time()
+    assert policy.wrap("read", read)("toto") == "fast"
+    assert time() - start < 0.4
+    assert len(calls) == 2
+    assert policy.wrap("write", read) is read
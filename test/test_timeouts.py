@@ -0,0 +1,86 @@
+import os
+from nose.tools import assert_raises
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import sleep, time
+
+from ura import api, bulk, dirac_engines, timeouts
+from ura.dirac_engines import _check_output, TimeoutExpired
+from ura.timeouts import deadline, DeadlineExceeded, limits
+
+
+class SlowBackend(object):
+    def exists(self, url):
+        sleep(0.05)
+        return True
+
+
+def test_limits_override_defaults_in_block():
+    default = timeouts.get_defaults()['read']
+    assert timeouts.get('read') == default
+    with limits(read=1.):
+        assert timeouts.get('read') == 1.
+        with limits(connect=2.):
+            assert timeouts.get('read') == 1.
+            assert timeouts.get('connect') == 2.
+    assert timeouts.get('read') == default
+    assert_raises(ValueError, lambda: timeouts.set_defaults(takapouet=1.))
+
+
+def test_deadline_shorten_timeouts_and_expire():
+    assert timeouts.remaining() is None
+    with deadline(0.5):
+        assert timeouts.get('read') <= 0.5
+        with deadline(10.):
+            assert timeouts.remaining() <= 0.5
+        with limits(read=None):
+            assert timeouts.get('read') <= 0.5
+
+    with deadline(0.01):
+        sleep(0.02)
+        assert_raises(DeadlineExceeded, timeouts.remaining)
+        assert_raises(DeadlineExceeded, lambda: api.exists("test/toto/doofus.txt"))
+
+
+def test_deadline_is_propagated_to_bulk_workers():
+    api.register_backend("slow", SlowBackend())
+    try:
+        urls = ["slow://toto%d" % i for i in range(6)]
+        with deadline(0.12):
+            res = list(bulk.exists_many(urls, max_workers=1))
+        assert res[0][1] is True
+        assert isinstance(res[-1][2], DeadlineExceeded)
+    finally:
+        del api._backends["slow"]
+        api._resolved.pop("slow", None)
+
+
+def test_subprocess_killed_after_timeout():
+    assert _check_output(["echo", "lorem"]).strip() == "lorem"
+
+    start = time()
+    with limits(subprocess=0.2):
+        assert_raises(TimeoutExpired, lambda: _check_output(["sh", "-c", "sleep 5; echo"]))
+    assert time() - start < 2.
+
+
+def test_subprocess_terminated_with_grace_period():
+    assert timeouts.get_defaults()['subprocess'] is None
+
+    root = mkdtemp()
+    grace = dirac_engines.KILL_GRACE
+    dirac_engines.KILL_GRACE = 0.3
+    try:
+        flag = os.path.join(root, "cleaned")
+        with limits(subprocess=0.2):
+            assert_raises(TimeoutExpired, lambda: _check_output(
+                ["sh", "-c", "trap 'touch %s; exit 1' TERM; sleep 5 & wait" % flag]))
+            assert os.path.exists(flag)
+
+            start = time()
+            assert_raises(TimeoutExpired, lambda: _check_output(
+                ["sh", "-c", "trap '' TERM; sleep 5 & wait; sleep 5"]))
+            assert time() - start < 2.
+    finally:
+        dirac_engines.KILL_GRACE = grace
+        rmtree(root)
@@ -0,0 +1,44 @@
+import os
+from nose.tools import assert_raises
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from ura import api, metrics, trace
+
+
+def test_record_and_replay_local_operations():
+    root = mkdtemp()
+    try:
+        src = os.path.join(root, "src")
+        dst = os.path.join(root, "dst")
+        os.mkdir(src)
+        os.mkdir(dst)
+        trace_pth = os.path.join(root, "job.trace.gz")
+
+        with trace.Recorder(trace_pth) as rec:
+            api.write(os.path.join(src, "toto.txt"), "lorem ipsum")
+            assert api.read(os.path.join(src, "toto.txt")) == "lorem ipsum"
+            assert not api.exists(os.path.join(src, "takapouet.txt"))
+            assert_raises(IOError, lambda: api.read(os.path.join(src, "takapouet.txt")))
+
+        assert not metrics.is_enabled()
+        api.exists(os.path.join(src, "toto.txt"))  # not recorded
+        assert rec.count == 4
+
+        events = list(trace.load(trace_pth))
+        assert [ev['op'] for ev in events] == ["write", "read", "exists", "read"]
+        assert events[0]['n'] == 11
+        assert 'e' in events[3]
+
+        res = trace.replay(trace_pth, speed=None, max_workers=1,
+                           url_map=lambda url: url.replace(src, dst))
+        assert len(res) == 4
+        assert api.read(os.path.join(dst, "toto.txt"), binary=True) == "\0" * 11
+        assert res[0]['e'] is None
+        assert res[3]['e'] is not None
+    finally:
+        rmtree(root)
+
+
+def test_load_reject_other_files():
+    assert_raises(ValueError, lambda: list(trace.load("test/toto/doofus.txt")))
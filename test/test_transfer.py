@@ -0,0 +1,96 @@
+import os
+from nose.tools import assert_raises
+from shutil import rmtree
+from tempfile import mkdtemp
+from types import ModuleType
+from urlparse import urlsplit
+
+from ura import api, dirac_api, local_api
+from ura.api import URLError
+from ura.dirac_engines import LocalEngine
+from ura.transfer import copy, move
+
+
+def test_copy_move_local_files():
+    root = mkdtemp()
+    try:
+        src = urlsplit(os.path.join(root, "src.txt"))
+        dst = urlsplit(os.path.join(root, "sub/dst.txt"))
+        local_api.write(src, "lorem ipsum")
+        copy(src, dst)
+        assert local_api.read(dst) == "lorem ipsum"
+        move(dst, urlsplit(os.path.join(root, "moved.txt")))
+        assert not local_api.exists(dst)
+        assert local_api.read(urlsplit(os.path.join(root, "moved.txt"))) == "lorem ipsum"
+    finally:
+        rmtree(root)
+
+
+def test_copy_local_dir_recursively():
+    root = mkdtemp()
+    try:
+        dst = urlsplit(os.path.join(root, "toto"))
+        copy(urlsplit("test/toto"), dst)
+        assert local_api.read(urlsplit(os.path.join(root, "toto/sub/subdoofus.txt"))) \
+            == local_api.read(urlsplit("test/toto/sub/subdoofus.txt"))
+    finally:
+        rmtree(root)
+
+
+def test_copy_move_between_backends():
+    root = mkdtemp()
+    dirac_api.set_engine(LocalEngine(os.path.join(root, "dirac")))
+    try:
+        copy(urlsplit("test/toto"), urlsplit("dirac:///vo/toto"))
+        assert dirac_api.read(urlsplit("dirac:///vo/toto/sub/doofus.txt")) \
+            == local_api.read(urlsplit("test/toto/sub/doofus.txt"))
+
+        move(urlsplit("dirac:///vo/toto/"), urlsplit("dirac:///vo/titi/"))
+        assert not dirac_api.exists(urlsplit("dirac:///vo/toto/"))
+        assert dirac_api.exists(urlsplit("dirac:///vo/titi/sub/doofus.txt"))
+
+        dst = urlsplit(os.path.join(root, "titi"))
+        move(urlsplit("dirac:///vo/titi/"), dst)
+        assert local_api.read(urlsplit(os.path.join(root, "titi/doofus.txt"))) \
+            == local_api.read(urlsplit("test/toto/doofus.txt"))
+        assert not dirac_api.exists(urlsplit("dirac:///vo/titi/"))
+    finally:
+        dirac_api.set_engine(None)
+        rmtree(root)
+
+
+class FailingEngine(LocalEngine):
+    def add_files(self, items, se, overwrite=False):
+        return {}, dict((lfn, "no space left") for lfn, pth in items)
+
+
+def test_move_keep_source_if_destination_not_written():
+    root = mkdtemp()
+    dirac_api.set_engine(FailingEngine(os.path.join(root, "dirac")))
+    try:
+        src = urlsplit(os.path.join(root, "toto"))
+        copy(urlsplit("test/toto"), src)
+        assert_raises(URLError, lambda: move(urlsplit(os.path.join(root, "toto/doofus.txt")),
+                                             urlsplit("dirac:///vo/doofus.txt")))
+        assert_raises(URLError, lambda: move(src, urlsplit("dirac:///vo/toto")))
+        assert local_api.exists(urlsplit(os.path.join(root, "toto/doofus.txt")))
+        assert local_api.exists(urlsplit(os.path.join(root, "toto/sub/subdoofus.txt")))
+    finally:
+        dirac_api.set_engine(None)
+        rmtree(root)
+
+
+def test_copy_stream_if_backend_has_no_copy():
+    root = mkdtemp()
+    mod = ModuleType("fake")
+    mod.open_read = lambda url, binary=False, chunk_size=None: iter(["lorem ", "ipsum"])
+    mod.write_stream = lambda url, content, binary=False, chunk_size=None: \
+        local_api.write(urlsplit(os.path.join(root, url.path.lstrip("/"))), "".join(content))
+    api.register_backend("fake", mod)
+    try:
+        copy(urlsplit("fake:///src.txt"), urlsplit("fake:///dst.txt"))
+        assert local_api.read(urlsplit(os.path.join(root, "dst.txt"))) == "lorem ipsum"
+    finally:
+        del api._backends["fake"]
+        api._resolved.pop("fake", None)
+        rmtree(root)